@@ -2,20 +2,31 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
+import math
 import os
+import random
 from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, AsyncIterator, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple
 
 from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
+from redis.exceptions import WatchError
+
+from src.snapshot_codec import decode_snapshot
+from src.ttl_cache import TTLCache
 
 try:  # pragma: no cover - optional dependency for collector constants
     from collector.config import (
         CHAIN_SET_KEY,
         LATEST_STRATEGIES_KEY,
         PROTOCOL_SET_KEY,
+        SNAPSHOT_KEY_PREFIX,
+        SNAPSHOT_POINTER_KEY,
         STRATEGY_ITEM_HASH,
         STRATEGY_TVL_PREFIX,
     )
@@ -25,12 +36,43 @@ except Exception:  # noqa: BLE001 - fallback when collector package not availabl
     CHAIN_SET_KEY = "strategies:chains"
     STRATEGY_ITEM_HASH = "strategies:items"
     STRATEGY_TVL_PREFIX = "strategies:tvl"
+    SNAPSHOT_KEY_PREFIX = "strategies:v"
+    SNAPSHOT_POINTER_KEY = "strategies:current"
+
+# Части опубликованного поколения и их ключи до версионирования
+_LEGACY_SNAPSHOT_KEYS = {
+    "latest": LATEST_STRATEGIES_KEY,
+    "items": STRATEGY_ITEM_HASH,
+    "protocols": PROTOCOL_SET_KEY,
+    "chains": CHAIN_SET_KEY,
+}
 
 
+logger = logging.getLogger(__name__)
+
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 CACHE_PREFIX = os.getenv("STRATEGY_CACHE_PREFIX", "defi:strategies")
 DEFAULT_TTL_SECONDS = int(os.getenv("STRATEGY_CACHE_TTL_SECONDS", "600"))
 REFRESH_QUEUE_SUFFIX = os.getenv("STRATEGY_REFRESH_QUEUE_SUFFIX", "refresh-queue")
+# Сколько секунд воркер владеет ключом, прежде чем тот вернётся в очередь
+REFRESH_LEASE_SECONDS = int(os.getenv("STRATEGY_REFRESH_LEASE_SECONDS", "300"))
+# Каждый повторный запрос того же ключа продвигает его в очереди на столько секунд
+REFRESH_REQUEST_WEIGHT_SECONDS = float(os.getenv("STRATEGY_REFRESH_REQUEST_WEIGHT_SECONDS", "30"))
+# Потолок форы за устаревание; отсутствующие в кэше ключи получают её целиком
+REFRESH_MAX_STALENESS_BONUS_SECONDS = float(os.getenv("STRATEGY_REFRESH_MAX_STALENESS_BONUS_SECONDS", "3600"))
+# Как часто воркер проверяет пустую очередь, пока ждёт первый запрос
+REFRESH_POLL_INTERVAL_SECONDS = float(os.getenv("STRATEGY_REFRESH_POLL_INTERVAL_SECONDS", "0.5"))
+# Статистика воркера очереди пропадает, если воркер перестал её обновлять
+REFRESH_STATS_TTL_SECONDS = int(os.getenv("STRATEGY_REFRESH_STATS_TTL_SECONDS", "300"))
+# L1: ответы по ключам стратегий в памяти процесса API перед Redis (L2)
+STRATEGY_L1_MAX_ENTRIES = int(os.getenv("STRATEGY_L1_MAX_ENTRIES", "1024"))
+# Страховка на случай потерянного сообщения об инвалидации
+STRATEGY_L1_TTL_SECONDS = int(os.getenv("STRATEGY_L1_TTL_SECONDS", "30"))
+# XFetch: чем больше beta и время пересчёта, тем раньше ключ уходит на обновление
+XFETCH_BETA = float(os.getenv("STRATEGY_XFETCH_BETA", "1.0"))
+XFETCH_DEFAULT_DELTA_SECONDS = float(os.getenv("STRATEGY_XFETCH_DEFAULT_DELTA_SECONDS", "5"))
+INVALIDATION_CHANNEL = f"{CACHE_PREFIX}:invalidate"
+INVALIDATION_RETRY_SECONDS = float(os.getenv("STRATEGY_INVALIDATION_RETRY_SECONDS", "5"))
 
 
 def _utcnow() -> datetime:
@@ -61,11 +103,73 @@ class StrategyCacheEntry:
     data: Dict[str, Any]
     updated_at: datetime
     expires_at: datetime
+    # Сколько секунд занял расчёт значения (0 — неизвестно)
+    delta: float = 0.0
 
     @property
     def is_expired(self) -> bool:
         return _utcnow() >= self.expires_at
 
+    def should_refresh(
+        self,
+        stale_after: timedelta,
+        *,
+        beta: float = XFETCH_BETA,
+        now: Optional[datetime] = None,
+        rand: Callable[[], float] = random.random,
+    ) -> bool:
+        """XFetch probabilistic early refresh against ``updated_at + stale_after``.
+
+        A refresh is requested once ``now - delta * beta * ln(U)`` passes the
+        deadline, so entries that are slow to compute go early and hot keys
+        written together spread their refreshes out instead of all going
+        stale at the same instant.
+        """
+        now = now or _utcnow()
+        if now >= self.expires_at:
+            return True
+        delta = self.delta or XFETCH_DEFAULT_DELTA_SECONDS
+        # 1 - random() лежит в (0, 1], логарифм конечен
+        head_start = -delta * beta * math.log(1.0 - rand())
+        return now + timedelta(seconds=head_start) >= self.updated_at + stale_after
+
+
+@dataclass
+class _SnapshotMemo:
+    version: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    # Тело снимка без версии (старый коллектор): сравниваем байты вместо повторного декодирования
+    raw: Optional[bytes] = None
+
+
+# Декодированный снимок текущего поколения, общий для всех запросов процесса
+_latest_snapshot = _SnapshotMemo()
+
+_strategy_l1: TTLCache[str, StrategyCacheEntry] = TTLCache(
+    "api.strategy_entries",
+    ttl=timedelta(seconds=STRATEGY_L1_TTL_SECONDS),
+    max_entries=STRATEGY_L1_MAX_ENTRIES,
+)
+
+
+def _encode_entry(data: Dict[str, Any], updated_iso: str, expires_iso: str, delta: Optional[float]) -> str:
+    payload: Dict[str, Any] = {"data": data, "updated_at": updated_iso, "expires_at": expires_iso}
+    if delta:
+        payload["delta"] = round(delta, 3)
+    return json.dumps(payload)
+
+
+def apply_invalidation(raw: Any) -> int:
+    """Drop L1 entries named in an invalidation message; return how many were dropped."""
+    try:
+        message = json.loads(raw)
+    except (TypeError, json.JSONDecodeError):
+        return 0
+    keys = message.get("keys") if isinstance(message, dict) else None
+    if not isinstance(keys, list):
+        return 0
+    return sum(_strategy_l1.pop(key) is not None for key in keys)
+
 
 class StrategyCache:
     """High-level helper for storing and retrieving strategy payloads."""
@@ -73,14 +177,23 @@ class StrategyCache:
     def __init__(self, redis: Redis, ttl_seconds: int = DEFAULT_TTL_SECONDS) -> None:
         self._redis = redis
         self._ttl_seconds = ttl_seconds
-        self._queue_key = f"{CACHE_PREFIX}:{REFRESH_QUEUE_SUFFIX}"
+        # Очередь обновлений: ключи по приоритету, тела запросов и аренды воркеров
+        self._queue_key = f"{CACHE_PREFIX}:{REFRESH_QUEUE_SUFFIX}:pending"
+        self._payloads_key = f"{CACHE_PREFIX}:{REFRESH_QUEUE_SUFFIX}:payloads"
+        self._leases_key = f"{CACHE_PREFIX}:{REFRESH_QUEUE_SUFFIX}:leases"
         self._tokens_key = f"{CACHE_PREFIX}:tokens"
+        self._refresh_stats_key = f"{CACHE_PREFIX}:refresh-stats"
 
     @property
     def redis(self) -> Redis:
         return self._redis
 
     async def get_strategy(self, key: str) -> Optional[StrategyCacheEntry]:
+        """Return the cached entry, from process memory if possible, else from Redis."""
+        entry = _strategy_l1.get(key)
+        if entry is not None and not entry.is_expired:
+            return entry
+
         raw = await self._redis.get(key)
         if not raw:
             return None
@@ -102,12 +215,17 @@ class StrategyCache:
         except ValueError:
             return None
 
-        return StrategyCacheEntry(
+        entry = StrategyCacheEntry(
             key=key,
             data=data,
             updated_at=updated_at,
             expires_at=expires_at,
+            delta=float(payload.get("delta") or 0.0),
         )
+        remaining = (expires_at - _utcnow()).total_seconds()
+        if remaining > 0:
+            _strategy_l1.set(key, entry, ttl=timedelta(seconds=min(remaining, STRATEGY_L1_TTL_SECONDS)))
+        return entry
 
     async def set_strategy(
         self,
@@ -115,25 +233,34 @@ class StrategyCache:
         data: Dict[str, Any],
         *,
         ttl_seconds: Optional[int] = None,
+        compute_seconds: Optional[float] = None,
     ) -> StrategyCacheEntry:
         now = _utcnow()
         ttl = ttl_seconds or self._ttl_seconds
         expires_at = now + timedelta(seconds=ttl)
 
-        payload = {
-            "data": data,
-            "updated_at": now.isoformat(),
-            "expires_at": expires_at.isoformat(),
-        }
-        await self._redis.set(key, json.dumps(payload), ex=ttl)
-        return StrategyCacheEntry(
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, _encode_entry(data, now.isoformat(), expires_at.isoformat(), compute_seconds), ex=ttl)
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps({"updated_at": now.isoformat(), "keys": [key]}))
+            await pipe.execute()
+        entry = StrategyCacheEntry(
             key=key,
             data=data,
             updated_at=now,
             expires_at=expires_at,
+            delta=compute_seconds or 0.0,
         )
+        _strategy_l1.set(key, entry)
+        return entry
 
-    async def set_many(self, items: Dict[str, Dict[str, Any]], ttl_seconds: Optional[int] = None) -> None:
+    async def set_many(
+        self,
+        items: Dict[str, Dict[str, Any]],
+        ttl_seconds: Optional[int] = None,
+        *,
+        compute_seconds: Optional[Mapping[str, float]] = None,
+    ) -> None:
+        """Write entries in one transaction and tell every API process to drop their L1 copies."""
         if not items:
             return
         async with self._redis.pipeline(transaction=True) as pipe:
@@ -142,28 +269,132 @@ class StrategyCache:
             expires_at = now + timedelta(seconds=ttl)
             expires_iso = expires_at.isoformat()
             updated_iso = now.isoformat()
+            deltas = compute_seconds or {}
             for key, data in items.items():
-                payload = {
-                    "data": data,
-                    "updated_at": updated_iso,
-                    "expires_at": expires_iso,
-                }
-                pipe.set(key, json.dumps(payload), ex=ttl)
+                pipe.set(key, _encode_entry(data, updated_iso, expires_iso, deltas.get(key)), ex=ttl)
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps({"updated_at": updated_iso, "keys": list(items)}))
             await pipe.execute()
 
-    async def enqueue_refresh(self, payload: Dict[str, Any]) -> None:
-        await self._redis.lpush(self._queue_key, json.dumps(payload))
-
-    async def pop_refresh_request(self, timeout: int = 0) -> Optional[Dict[str, Any]]:
-        if timeout > 0:
-            result = await self._redis.blpop(self._queue_key, timeout=timeout)
-            if result is None:
-                return None
-            _, raw = result
+    async def enqueue_refresh(self, payload: Dict[str, Any], *, staleness_seconds: Optional[float] = None) -> bool:
+        """Queue a refresh of ``payload["key"]``; return ``True`` if the key was not queued yet.
+
+        Keys are unique in the queue and ordered by score, lowest first: the
+        time of the request minus a bonus for staleness (``None`` means
+        missing from the cache, which gets the full bonus), lowered again by
+        every repeated request. A repeated request only ever raises the
+        priority (``ZADD LT``). The first request's payload is kept, except
+        that a ``force_refresh`` request replaces it, so the flag sticks.
+        Keys a worker is processing right now are skipped.
+        """
+        key = payload["key"]
+        if await self._redis.zscore(self._leases_key, key) is not None:
+            return False
+        if staleness_seconds is None:
+            bonus = REFRESH_MAX_STALENESS_BONUS_SECONDS
         else:
-            raw = await self._redis.rpop(self._queue_key)
-            if raw is None:
-                return None
+            bonus = min(max(staleness_seconds, 0.0), REFRESH_MAX_STALENESS_BONUS_SECONDS)
+        forced = bool((payload.get("request") or {}).get("force_refresh"))
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self._queue_key, {key: _utcnow().timestamp() - bonus}, lt=True)
+            pipe.zincrby(self._queue_key, -REFRESH_REQUEST_WEIGHT_SECONDS, key)
+            # Остальные поля запроса для ключа одинаковы (воркер берёт только параметры ключа)
+            if forced:
+                pipe.hset(self._payloads_key, key, json.dumps(payload))
+            else:
+                pipe.hsetnx(self._payloads_key, key, json.dumps(payload))
+            added, _, _ = await pipe.execute()
+        return bool(added)
+
+    async def requeue_expired_leases(self) -> int:
+        """Return keys whose worker lease ran out (e.g. the worker died) to the queue."""
+        now = _utcnow().timestamp()
+        expired = await self._redis.zrangebyscore(self._leases_key, "-inf", now)
+        if not expired:
+            return 0
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(self._queue_key, {key: now for key in expired}, nx=True)
+            pipe.zrem(self._leases_key, *expired)
+            await pipe.execute()
+        return len(expired)
+
+    async def claim_refresh_requests(
+        self,
+        count: int,
+        *,
+        timeout: int = 0,
+        lease_seconds: int = REFRESH_LEASE_SECONDS,
+    ) -> List[Dict[str, Any]]:
+        """Take up to ``count`` highest-priority requests and lease them to the caller.
+
+        With ``timeout`` waits that long for the first request. Claimed keys
+        must be released with :meth:`ack_refresh_requests`; otherwise they are
+        requeued once the lease expires.
+        """
+        await self.requeue_expired_leases()
+        loop = asyncio.get_running_loop()
+        wait_until = loop.time() + timeout
+        keys, raw_payloads = await self._claim(count, lease_seconds)
+        while not keys and loop.time() < wait_until:
+            await asyncio.sleep(min(REFRESH_POLL_INTERVAL_SECONDS, wait_until - loop.time()))
+            keys, raw_payloads = await self._claim(count, lease_seconds)
+        if not keys:
+            return []
+
+        claims: List[Dict[str, Any]] = []
+        orphans: List[str] = []
+        for key, raw in zip(keys, raw_payloads):
+            try:
+                payload = json.loads(raw) if raw else None
+            except json.JSONDecodeError:
+                payload = None
+            if isinstance(payload, dict):
+                claims.append(payload)
+            else:
+                orphans.append(key)
+        if orphans:
+            await self.ack_refresh_requests(orphans)
+        return claims
+
+    async def _claim(self, count: int, lease_seconds: int) -> Tuple[List[str], List[Optional[str]]]:
+        """Move the first ``count`` keys from the queue to the leases in one transaction."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # Снятие из очереди и аренда атомарны: падение между ними не теряет ключи
+                    await pipe.watch(self._queue_key)
+                    keys = await pipe.zrange(self._queue_key, 0, count - 1)
+                    if not keys:
+                        await pipe.reset()
+                        return [], []
+                    deadline = _utcnow().timestamp() + lease_seconds
+                    pipe.multi()
+                    pipe.zrem(self._queue_key, *keys)
+                    pipe.zadd(self._leases_key, {key: deadline for key in keys})
+                    pipe.hmget(self._payloads_key, keys)
+                    _, _, raw_payloads = await pipe.execute()
+                    return list(keys), raw_payloads
+                except WatchError:
+                    continue
+
+    async def ack_refresh_requests(self, keys: List[str]) -> None:
+        """Release leases of processed keys and drop their payloads."""
+        if not keys:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self._leases_key, *keys)
+            pipe.hdel(self._payloads_key, *keys)
+            await pipe.execute()
+
+    async def refresh_queue_length(self) -> int:
+        return int(await self._redis.zcard(self._queue_key) or 0)
+
+    async def set_refresh_stats(self, stats: Dict[str, Any], ttl_seconds: int = REFRESH_STATS_TTL_SECONDS) -> None:
+        await self._redis.set(self._refresh_stats_key, json.dumps(stats), ex=ttl_seconds)
+
+    async def get_refresh_stats(self) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self._refresh_stats_key)
+        if not raw:
+            return None
         try:
             return json.loads(raw)
         except json.JSONDecodeError:
@@ -189,23 +420,53 @@ class StrategyCache:
         }
         await self._redis.set(self._tokens_key, json.dumps(payload), ex=ttl)
 
+    async def get_snapshot_version(self) -> Optional[str]:
+        """Return the published generation the pointer refers to, if any."""
+        version = await self._redis.get(SNAPSHOT_POINTER_KEY)
+        return str(version) if version else None
+
+    @staticmethod
+    def _versioned_key(version: Optional[str], part: str) -> str:
+        if not version:
+            return _LEGACY_SNAPSHOT_KEYS[part]
+        return f"{SNAPSHOT_KEY_PREFIX}:{version}:{part}"
+
+    async def _snapshot_key(self, part: str) -> str:
+        """Resolve a snapshot part through the published-generation pointer."""
+        return self._versioned_key(await self.get_snapshot_version(), part)
+
     async def get_latest_strategies(self) -> Optional[Dict[str, Any]]:
-        raw = await self._redis.get(LATEST_STRATEGIES_KEY)
+        """Return the current snapshot, decoding it only when the published version changes.
+
+        The decoded snapshot is shared between requests of this process and
+        must not be mutated by callers.
+        """
+        version = await self.get_snapshot_version()
+        if version is not None and _latest_snapshot.version == version:
+            return _latest_snapshot.data
+
+        # Снимок бинарный (или JSON от старого коллектора), поэтому читаем без декодирования строк
+        key = self._versioned_key(version, "latest")
+        raw = await self._redis.execute_command("GET", key, **{NEVER_DECODE: True})
         if not raw:
             return None
+        if version is None and _latest_snapshot.version is None and raw == _latest_snapshot.raw:
+            return _latest_snapshot.data
         try:
-            data = json.loads(raw)
-        except json.JSONDecodeError:
-            return None
-        if not isinstance(data, dict):
+            data = decode_snapshot(raw)
+        except ValueError:
             return None
         items = data.get("items")
         if not isinstance(items, list):
             data["items"] = []
+        # Без указателя (старый коллектор) версии нет — такой снимок узнаём по его байтам
+        _latest_snapshot.version = version
+        _latest_snapshot.data = data
+        _latest_snapshot.raw = raw if version is None else None
         return data
 
-    async def get_strategy(self, strategy_id: str) -> Optional[Dict[str, Any]]:
-        raw = await self._redis.hget(STRATEGY_ITEM_HASH, strategy_id)
+    async def get_strategy_item(self, strategy_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.hget(await self._snapshot_key("items"), strategy_id)
         if not raw:
             return None
         try:
@@ -214,13 +475,13 @@ class StrategyCache:
             return None
 
     async def get_protocols(self) -> List[str]:
-        values = await self._redis.smembers(PROTOCOL_SET_KEY)
+        values = await self._redis.smembers(await self._snapshot_key("protocols"))
         if not values:
             return []
         return sorted(values)
 
     async def get_chains(self) -> List[str]:
-        values = await self._redis.smembers(CHAIN_SET_KEY)
+        values = await self._redis.smembers(await self._snapshot_key("chains"))
         if not values:
             return []
         return sorted(values)
@@ -261,6 +522,47 @@ async def get_cache(ttl_seconds: int = DEFAULT_TTL_SECONDS) -> AsyncIterator[Str
         pass
 
 
+async def listen_for_invalidations(redis: Redis) -> None:
+    """Keep L1 in sync with writes from workers; resubscribes after connection errors."""
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Пока подписки не было, сообщения могли потеряться
+            _strategy_l1.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    apply_invalidation(message.get("data"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001 - Redis outage: retry, L1 TTL bounds staleness
+            logger.warning("Strategy invalidation listener failed: %s", exc)
+            _strategy_l1.clear()
+            await asyncio.sleep(INVALIDATION_RETRY_SECONDS)
+        finally:
+            await pubsub.close()
+
+
+_invalidation_task: Optional[asyncio.Task[None]] = None
+
+
+async def start_invalidation_listener() -> None:
+    global _invalidation_task
+    if _invalidation_task is None or _invalidation_task.done():
+        _invalidation_task = asyncio.create_task(listen_for_invalidations(await get_redis()))
+
+
+async def stop_invalidation_listener() -> None:
+    global _invalidation_task
+    task, _invalidation_task = _invalidation_task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
 async def close_redis() -> None:
     global _redis_instance
     if _redis_instance is not None:
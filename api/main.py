@@ -2,13 +2,18 @@
 
 from __future__ import annotations
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.pool_index import start_preload_index
+from src.async_http import UPSTREAM_HTTP
+from src.executors import executor_stats
+from src.leaderboards import NEW_POOL_LEADERBOARDS
+from src.pool_index import POOL_INDEX, start_preload_index
+from src.ttl_cache import cache_stats
 
-from .cache import close_redis
+from .cache import StrategyCache, close_redis, start_invalidation_listener, stop_invalidation_listener
+from .dependencies import get_strategy_cache
 from .routers import aggregator, strategies
 from .routers import cmc_cache
 
@@ -54,11 +59,40 @@ async def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/health/pool-index")
+async def pool_index_health() -> dict[str, object]:
+    return POOL_INDEX.status()
+
+
+@app.get("/health/leaderboards")
+async def leaderboards_health() -> dict[str, object]:
+    return NEW_POOL_LEADERBOARDS.status()
+
+
+@app.get("/health/caches")
+async def caches_health() -> dict[str, object]:
+    return {"caches": cache_stats()}
+
+
+@app.get("/health/executors")
+async def executors_health() -> dict[str, object]:
+    return {"executors": executor_stats()}
+
+
+@app.get("/health/refresh-queue")
+async def refresh_queue_health(cache: StrategyCache = Depends(get_strategy_cache)) -> dict[str, object]:
+    return {"depth": await cache.refresh_queue_length(), "worker": await cache.get_refresh_stats()}
+
+
 @app.on_event("startup")
 async def startup_event() -> None:
+    NEW_POOL_LEADERBOARDS.start()
     start_preload_index()
+    await start_invalidation_listener()
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
+    await UPSTREAM_HTTP.aclose()
+    await stop_invalidation_listener()
     await close_redis()
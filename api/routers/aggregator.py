@@ -3,14 +3,17 @@
 from __future__ import annotations
 
 import asyncio
+import threading
 from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Path, Query
 
+from collector.jobs import COLLECTION_JOBS
 from collector.pipeline import collect_and_store
 
 from ..cache import StrategyCache
 from ..dependencies import get_strategy_cache
+from ..strategy_index import index_for
 
 
 router = APIRouter()
@@ -23,32 +26,6 @@ def _parse_csv(value: Optional[str]) -> Optional[List[str]]:
     return parts or None
 
 
-def _apply_filters(items: List[Dict[str, Any]], *, chain: Optional[List[str]] = None, protocol: Optional[List[str]] = None, min_tvl: Optional[float] = None, min_apy: Optional[float] = None) -> List[Dict[str, Any]]:
-    result: List[Dict[str, Any]] = []
-    for item in items:
-        if chain and (item.get("chain") or "").strip().lower() not in {c.lower() for c in chain}:
-            continue
-        if protocol and (item.get("protocol") or "").strip().lower() not in {p.lower() for p in protocol}:
-            continue
-        if min_tvl is not None and float(item.get("tvl_usd") or 0.0) < min_tvl:
-            continue
-        if min_apy is not None and float(item.get("apy") or 0.0) < min_apy:
-            continue
-        result.append(item)
-    return result
-
-
-def _sort_items(items: List[Dict[str, Any]], sort: str) -> List[Dict[str, Any]]:
-    sort_map = {
-        "apy_desc": lambda x: (float(x.get("apy") or 0.0), float(x.get("tvl_usd") or 0.0)),
-        "tvl_desc": lambda x: (float(x.get("tvl_usd") or 0.0), float(x.get("apy") or 0.0)),
-        "ai_score_desc": lambda x: (float(x.get("ai_score") or 0.0), float(x.get("tvl_usd") or 0.0)),
-        "tvl_growth_desc": lambda x: (float(x.get("tvl_growth_24h") or 0.0), float(x.get("apy") or 0.0)),
-    }
-    key_func = sort_map.get(sort, sort_map["ai_score_desc"])
-    return sorted(items, key=key_func, reverse=True)
-
-
 @router.get("/strategies")
 async def list_strategies(
     chain: Optional[str] = Query(None, description="Filter by chain, comma separated"),
@@ -64,20 +41,19 @@ async def list_strategies(
     if not snapshot:
         raise HTTPException(status_code=503, detail="Нет данных. Запусти обновление и попробуй снова.")
 
-    items = snapshot.get("items", [])
-    filtered = _apply_filters(
-        items,
+    sliced, total = index_for(snapshot).query(
         chain=_parse_csv(chain),
         protocol=_parse_csv(protocol),
         min_tvl=min_tvl,
         min_apy=min_apy,
+        sort=sort,
+        offset=offset,
+        limit=limit,
     )
-    sorted_items = _sort_items(filtered, sort)
-    sliced = sorted_items[offset : offset + limit]
 
     return {
         "updated_at": snapshot.get("updated_at"),
-        "total": len(sorted_items),
+        "total": total,
         "limit": limit,
         "offset": offset,
         "items": sliced,
@@ -92,8 +68,7 @@ async def top_strategies(
     snapshot = await cache.get_latest_strategies()
     if not snapshot:
         raise HTTPException(status_code=503, detail="Нет данных." )
-    items = snapshot.get("items", [])
-    sorted_items = _sort_items(items, "ai_score_desc")[:limit]
+    sorted_items, _ = index_for(snapshot).query(sort="ai_score_desc", limit=limit)
     return {
         "updated_at": snapshot.get("updated_at"),
         "items": sorted_items,
@@ -112,10 +87,31 @@ async def list_chains(cache: StrategyCache = Depends(get_strategy_cache)) -> Dic
     return {"count": len(chains), "items": chains}
 
 
-@router.get("/refresh")
+@router.get("/refresh", status_code=202)
 async def refresh_data() -> Dict[str, Any]:
-    stats = await asyncio.to_thread(collect_and_store)
-    return {"status": "ok", "details": stats}
+    # Сбор идёт минутами: отвечаем сразу, параллельные вызовы присоединяются к текущему запуску
+    job_id, created = await asyncio.to_thread(COLLECTION_JOBS.submit)
+    if created:
+        threading.Thread(
+            target=COLLECTION_JOBS.run,
+            args=(job_id, collect_and_store),
+            name=f"collect-{job_id[:8]}",
+            daemon=True,
+        ).start()
+    return {
+        "status": "accepted" if created else "running",
+        "job_id": job_id,
+        "attached": not created,
+        "status_url": f"/refresh/{job_id}",
+    }
+
+
+@router.get("/refresh/{job_id}")
+async def refresh_status(job_id: str = Path(..., description="Collection job identifier")) -> Dict[str, Any]:
+    job = await asyncio.to_thread(COLLECTION_JOBS.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача обновления не найдена")
+    return job
 
 
 @router.get("/strategies/{strategy_id}")
@@ -124,7 +120,7 @@ async def strategy_details(
     history_limit: int = Query(96, ge=1, le=288, description="Number of TVL points to return"),
     cache: StrategyCache = Depends(get_strategy_cache),
 ) -> Dict[str, Any]:
-    item = await cache.get_strategy(strategy_id)
+    item = await cache.get_strategy_item(strategy_id)
     if not item:
         raise HTTPException(status_code=404, detail="Стратегия не найдена")
     history = await cache.get_tvl_history(strategy_id, limit=history_limit)
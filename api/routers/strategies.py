@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Dict, List, Optional, TypeVar
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import JSONResponse
 
+from src.executors import TOKENS_EXECUTOR, ExecutorBusyError
+from src.leaderboards import NEW_POOL_LEADERBOARDS
+
 from ..cache import StrategyCache, StrategyCacheEntry, strategy_cache_key
 from ..dependencies import get_strategy_cache
 from ..schemas import PreferencesModel, StrategyRequest, StrategyResponse, STALE_AFTER
@@ -15,6 +19,8 @@ from ..schemas import PreferencesModel, StrategyRequest, StrategyResponse, STALE
 
 router = APIRouter()
 
+T = TypeVar("T")
+
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
@@ -33,10 +39,8 @@ def _normalize_token(value: str) -> str:
 def _needs_refresh(entry: Optional[StrategyCacheEntry]) -> bool:
     if not entry:
         return True
-    if entry.is_expired:
-        return True
-    age = _now() - entry.updated_at
-    return age >= STALE_AFTER
+    # Истёкшие и устаревшие записи обновляем всегда, горячие — с вероятностью, растущей к STALE_AFTER
+    return entry.should_refresh(STALE_AFTER, now=_now())
 
 
 def _cache_headers(entry: Optional[StrategyCacheEntry]) -> Dict[str, str]:
@@ -52,9 +56,19 @@ def _cache_headers(entry: Optional[StrategyCacheEntry]) -> Dict[str, str]:
     return headers
 
 
-def _refresh_payload(key: str, request_payload: StrategyRequest) -> Dict[str, str]:
+async def _await_upstream(call: Awaitable[T]) -> T:
+    """Map executor admission and timeout failures to 503/504."""
+    try:
+        return await call
+    except ExecutorBusyError:
+        raise HTTPException(status_code=503, detail="Сервис перегружен, повторите запрос позже")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Источник данных не ответил вовремя")
+
+
+def _refresh_payload(key: str, request_payload: StrategyRequest) -> Dict[str, Any]:
     body = request_payload.model_dump()
-    return {"key": key, "request": body}
+    return {"key": key, "request": body, "enqueued_at": _now().isoformat()}
 
 
 @router.get("/tokens")
@@ -75,7 +89,7 @@ async def tokens_list(
     # Import lazily so monkeypatching `src.api.get_top_market_tokens` keeps working.
     from src.api import get_top_market_tokens as fetch_tokens
 
-    tokens = fetch_tokens(limit=limit, force_refresh=force)
+    tokens = await _await_upstream(TOKENS_EXECUTOR.run(fetch_tokens, limit=limit, force_refresh=force))
     payload = {"tokens": tokens}
     await cache.set_tokens(tokens)
 
@@ -105,7 +119,9 @@ async def get_strategies(
 
     if _needs_refresh(entry) or payload.force_refresh:
         refresh_payload = _refresh_payload(cache_key, payload)
-        await cache.enqueue_refresh(refresh_payload)
+        # Отсутствующие и принудительные обновления идут с максимальным приоритетом
+        staleness = None if entry is None or payload.force_refresh else (_now() - entry.updated_at).total_seconds()
+        await cache.enqueue_refresh(refresh_payload, staleness_seconds=staleness)
 
     if entry is None:
         headers = _cache_headers(entry)
@@ -137,15 +153,30 @@ async def analytics_new_pools(
     limit: int = Query(50, ge=1, le=200),
     force_refresh: bool = False,
 ) -> Dict[str, Any]:
-    from src.api import get_new_pools as fetch_new_pools
-
-    data = fetch_new_pools(
-        period,
-        min_tvl=min_tvl,
-        symbols=symbols,
-        chains=chains or (),
-        sort=sort,
-        limit=limit,
-        force_refresh=force_refresh,
+    if not force_refresh:
+        # Готовые лидерборды по текущей генерации индекса — без графиков и пересчёта
+        data = NEW_POOL_LEADERBOARDS.query(
+            period,
+            min_tvl=min_tvl,
+            symbols=symbols,
+            chains=chains or (),
+            sort=sort,
+            limit=limit,
+        )
+        if data is not None:
+            return data
+
+    from src.api import get_new_pools_async as fetch_new_pools
+
+    data = await _await_upstream(
+        fetch_new_pools(
+            period,
+            min_tvl=min_tvl,
+            symbols=symbols,
+            chains=chains or (),
+            sort=sort,
+            limit=limit,
+            force_refresh=force_refresh,
+        )
     )
     return data
@@ -0,0 +1,168 @@
+"""Query index over the published strategies snapshot.
+
+Built once per snapshot version: every supported sort order is precomputed,
+and per-chain / per-protocol posting lists are kept in each of those orders.
+A request merges the postings of the requested chains (or protocols), cuts
+``min_tvl`` / ``min_apy`` with a binary search when the order is by that
+field, and reads only up to the requested page. Only filters that cannot be
+answered by a posting list or a cut are checked item by item.
+"""
+
+from __future__ import annotations
+
+import heapq
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+SortKey = Callable[[Dict[str, Any]], Tuple[float, float]]
+
+SORT_KEYS: Dict[str, SortKey] = {
+    "apy_desc": lambda x: (float(x.get("apy") or 0.0), float(x.get("tvl_usd") or 0.0)),
+    "tvl_desc": lambda x: (float(x.get("tvl_usd") or 0.0), float(x.get("apy") or 0.0)),
+    "ai_score_desc": lambda x: (float(x.get("ai_score") or 0.0), float(x.get("tvl_usd") or 0.0)),
+    "tvl_growth_desc": lambda x: (float(x.get("tvl_growth_24h") or 0.0), float(x.get("apy") or 0.0)),
+}
+DEFAULT_SORT = "ai_score_desc"
+# Порядок, в котором поле не возрастает, позволяет отсечь минимум бинарным поиском
+_RANGE_SORTS = {"tvl": "tvl_desc", "apy": "apy_desc"}
+
+
+def _normalize(value: Any) -> str:
+    return (value or "").strip().lower()
+
+
+def _cut(postings: Sequence[int], values: Sequence[float], minimum: float) -> int:
+    """Length of the prefix of ``postings`` (non-increasing in ``values``) with value >= ``minimum``."""
+    low, high = 0, len(postings)
+    while low < high:
+        middle = (low + high) // 2
+        if values[postings[middle]] >= minimum:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class StrategyIndex:
+    """Immutable posting lists and sort orders for one snapshot's items."""
+
+    def __init__(self, items: List[Dict[str, Any]]) -> None:
+        self.items = items
+        self._chain = [_normalize(item.get("chain")) for item in items]
+        self._protocol = [_normalize(item.get("protocol")) for item in items]
+        self._values = {
+            "tvl": [float(item.get("tvl_usd") or 0.0) for item in items],
+            "apy": [float(item.get("apy") or 0.0) for item in items],
+        }
+        self._orders: Dict[str, List[int]] = {}
+        self._ranks: Dict[str, List[int]] = {}
+        self._by_chain: Dict[str, Dict[str, List[int]]] = {}
+        self._by_protocol: Dict[str, Dict[str, List[int]]] = {}
+        for sort, key in SORT_KEYS.items():
+            # sorted(..., reverse=True) как в прежнем _sort_items, включая порядок равных
+            order = sorted(range(len(items)), key=lambda position: key(items[position]), reverse=True)
+            ranks = [0] * len(items)
+            by_chain: Dict[str, List[int]] = {}
+            by_protocol: Dict[str, List[int]] = {}
+            for rank, position in enumerate(order):
+                ranks[position] = rank
+                by_chain.setdefault(self._chain[position], []).append(position)
+                by_protocol.setdefault(self._protocol[position], []).append(position)
+            self._orders[sort] = order
+            self._ranks[sort] = ranks
+            self._by_chain[sort] = by_chain
+            self._by_protocol[sort] = by_protocol
+
+    def query(
+        self,
+        *,
+        chain: Optional[Sequence[str]] = None,
+        protocol: Optional[Sequence[str]] = None,
+        min_tvl: Optional[float] = None,
+        min_apy: Optional[float] = None,
+        sort: str = DEFAULT_SORT,
+        offset: int = 0,
+        limit: int = 200,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Return one page of matching items in ``sort`` order and the total number of matches."""
+        sort = sort if sort in SORT_KEYS else DEFAULT_SORT
+        chains = {value.lower() for value in chain} if chain else None
+        protocols = {value.lower() for value in protocol} if protocol else None
+
+        # Ведущий список — самый короткий из фильтров по chain/protocol, второй проверяем поштучно
+        lists: List[Sequence[int]] = [self._orders[sort]]
+        residual: List[Callable[[int], bool]] = []
+        if chains is not None or protocols is not None:
+            chain_lists = self._postings(self._by_chain[sort], chains)
+            protocol_lists = self._postings(self._by_protocol[sort], protocols)
+            if chain_lists is not None and (
+                protocol_lists is None or sum(map(len, chain_lists)) <= sum(map(len, protocol_lists))
+            ):
+                lists = chain_lists
+                if protocols is not None:
+                    residual.append(lambda position: self._protocol[position] in protocols)
+            else:
+                assert protocol_lists is not None
+                lists = protocol_lists
+                if chains is not None:
+                    residual.append(lambda position: self._chain[position] in chains)
+
+        for field, minimum in (("tvl", min_tvl), ("apy", min_apy)):
+            if minimum is None:
+                continue
+            values = self._values[field]
+            if _RANGE_SORTS[field] == sort:
+                lists = [postings[: _cut(postings, values, minimum)] for postings in lists]
+            else:
+                residual.append(lambda position, values=values, minimum=minimum: values[position] >= minimum)
+
+        stream = self._merge(lists, self._ranks[sort])
+        if residual:
+            matches = [position for position in stream if all(check(position) for check in residual)]
+            return [self.items[position] for position in matches[offset : offset + limit]], len(matches)
+
+        total = sum(len(postings) for postings in lists)
+        page = islice(stream, offset, offset + limit)
+        return [self.items[position] for position in page], total
+
+    @staticmethod
+    def _postings(index: Dict[str, List[int]], wanted: Optional[Iterable[str]]) -> Optional[List[List[int]]]:
+        if wanted is None:
+            return None
+        return [index[value] for value in wanted if value in index]
+
+    @staticmethod
+    def _merge(lists: Sequence[Sequence[int]], ranks: List[int]) -> Iterator[int]:
+        if len(lists) == 1:
+            return iter(lists[0])
+        return heapq.merge(*lists, key=ranks.__getitem__)
+
+
+_memo: Tuple[Any, Optional[List[Dict[str, Any]]], Optional[StrategyIndex]] = (None, None, None)
+
+
+def index_for(snapshot: Dict[str, Any]) -> StrategyIndex:
+    """Return the index for ``snapshot``, reusing the last one built for the same version and items.
+
+    Snapshots without a version (legacy path) are recognized by the identity
+    of their ``items`` list, which the API keeps while the snapshot is unchanged.
+    """
+    global _memo
+    items = snapshot.get("items") or []
+    version = snapshot.get("version")
+    cached_version, cached_items, cached_index = _memo
+    if cached_index is not None and version == cached_version and items is cached_items:
+        return cached_index
+    index = StrategyIndex(items)
+    _memo = (version, items, index)
+    return index
@@ -22,17 +22,40 @@ COINGECKO_PER_PAGE: Final[int] = int(os.getenv("COINGECKO_PER_PAGE", "250"))
 COINGECKO_PAGES: Final[int] = int(os.getenv("COINGECKO_PAGES", "2"))
 
 REDIS_URL: Final[str] = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Размер партии команд на один round-trip (HMGET / pipeline)
+REDIS_BATCH_SIZE: Final[int] = int(os.getenv("COLLECTOR_REDIS_BATCH_SIZE", "1000"))
 
 DEFAULT_ICON_URL: Final[str] = os.getenv("DEFAULT_PROTOCOL_ICON", "https://icons.llama.fi/icons/unknown.png")
 
 # Redis keys
+# Unversioned snapshot keys written before versioned publication; the API falls back to them
+# only while no SNAPSHOT_POINTER_KEY exists, and the first versioned publish deletes them.
 LATEST_STRATEGIES_KEY: Final[str] = "strategies:latest"
 STRATEGY_HISTORY_HASH: Final[str] = "strategies:last"
 STRATEGY_ITEM_HASH: Final[str] = "strategies:items"
 STRATEGY_TVL_PREFIX: Final[str] = "strategies:tvl"
 PROTOCOL_SET_KEY: Final[str] = "strategies:protocols"
 CHAIN_SET_KEY: Final[str] = "strategies:chains"
+# Versioned publication: each run writes "{SNAPSHOT_KEY_PREFIX}:{version}:{latest|items|protocols|chains}"
+# and then flips SNAPSHOT_POINTER_KEY to the new version in one SET.
+SNAPSHOT_KEY_PREFIX: Final[str] = "strategies:v"
+SNAPSHOT_POINTER_KEY: Final[str] = "strategies:current"
+SNAPSHOT_VERSION_SEQ_KEY: Final[str] = "strategies:version-seq"
+SNAPSHOT_GENERATIONS_KEY: Final[str] = "strategies:generations"
+# "binary" (src.snapshot_codec, zlib-compressed rows) or "json" for external readers of the latest key
+SNAPSHOT_ENCODING: Final[str] = os.getenv("STRATEGIES_SNAPSHOT_ENCODING", "binary")
+# Single-flight collection: the lock holds the running job id, job records keep stage progress
+COLLECT_LOCK_KEY: Final[str] = "strategies:collect:lock"
+COLLECT_JOB_PREFIX: Final[str] = "strategies:collect:job"
 
 # Timeouts
 HTTP_TIMEOUT_SECONDS: Final[int] = int(os.getenv("COLLECTOR_HTTP_TIMEOUT", "30"))
+# Deadline for a single source (all of its requests) and for fetching all sources together
+SOURCE_DEADLINE_SECONDS: Final[float] = float(os.getenv("COLLECTOR_SOURCE_DEADLINE", "45"))
+RUN_BUDGET_SECONDS: Final[float] = float(os.getenv("COLLECTOR_RUN_BUDGET", "90"))
 LATEST_TTL_SECONDS: Final[int] = int(os.getenv("STRATEGIES_CACHE_TTL", str(60 * 30)))  # 30 minutes
+# Сколько предыдущие поколения живут после переключения указателя (для читателей "на лету")
+SNAPSHOT_GC_GRACE_SECONDS: Final[int] = int(os.getenv("STRATEGIES_SNAPSHOT_GRACE", "120"))
+# Lock TTL is renewed at every stage, so it only has to outlive the slowest stage
+COLLECT_LOCK_TTL_SECONDS: Final[int] = int(os.getenv("COLLECTOR_LOCK_TTL", "300"))
+COLLECT_JOB_TTL_SECONDS: Final[int] = int(os.getenv("COLLECTOR_JOB_TTL", str(60 * 60 * 24)))
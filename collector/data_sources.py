@@ -3,9 +3,25 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, Iterable, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import asdict, dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from .config import (
     BEEFY_APY_URL,
@@ -14,22 +30,44 @@ from .config import (
     COINGECKO_PAGES,
     COINGECKO_PER_PAGE,
     COINGECKO_VS_CURRENCY,
-    DEFILLAMA_PROTOCOLS_URL,
     DEFILLAMA_YIELDS_URL,
     HTTP_TIMEOUT_SECONDS,
     MORPHO_GRAPHQL_URL,
     PENDLE_YIELD_URL,
+    RUN_BUDGET_SECONDS,
     SOMMELIER_VAULTS_URL,
+    SOURCE_DEADLINE_SECONDS,
     STAKEDAO_VAULTS_URL,
     YEARN_VAULTS_URL,
 )
 
 logger = logging.getLogger(__name__)
 
+Fetcher = Callable[[], List[Dict]]
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# requests.Session не гарантирует потокобезопасность: у каждого потока сбора свой пул keep-alive
+_sessions = threading.local()
+
+
+def _session() -> requests.Session:
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = _build_session()
+    return session
+
 
 def _safe_get(url: str) -> dict | list | None:
     try:
-        response = requests.get(url, timeout=HTTP_TIMEOUT_SECONDS)
+        response = _session().get(url, timeout=HTTP_TIMEOUT_SECONDS)
         response.raise_for_status()
         return response.json()
     except requests.RequestException as exc:
@@ -48,16 +86,12 @@ def fetch_defillama_pools() -> List[Dict]:
     return [item for item in data if isinstance(item, dict)]
 
 
-def fetch_defillama_protocols() -> List[Dict]:
-    payload = _safe_get(DEFILLAMA_PROTOCOLS_URL)
-    if not isinstance(payload, list):
-        return []
-    return [item for item in payload if isinstance(item, dict)]
-
-
 def fetch_beefy_data() -> List[Dict]:
-    vaults_payload = _safe_get(BEEFY_VAULTS_URL)
-    apy_payload = _safe_get(BEEFY_APY_URL)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="collector-beefy") as pool:
+        vaults_future = pool.submit(_safe_get, BEEFY_VAULTS_URL)
+        apy_future = pool.submit(_safe_get, BEEFY_APY_URL)
+        vaults_payload = vaults_future.result()
+        apy_payload = apy_future.result()
 
     if not isinstance(vaults_payload, list):
         vaults_payload = []
@@ -142,7 +176,7 @@ def fetch_morpho_markets() -> List[Dict]:
         "variables": {"limit": 200},
     }
     try:
-        response = requests.post(MORPHO_GRAPHQL_URL, json=query, timeout=HTTP_TIMEOUT_SECONDS)
+        response = _session().post(MORPHO_GRAPHQL_URL, json=query, timeout=HTTP_TIMEOUT_SECONDS)
         response.raise_for_status()
         payload = response.json()
     except requests.RequestException as exc:
@@ -160,35 +194,117 @@ def fetch_morpho_markets() -> List[Dict]:
     return result
 
 
+SOURCES: Tuple[Tuple[str, Fetcher], ...] = (
+    ("defillama", fetch_defillama_pools),
+    ("beefy", fetch_beefy_data),
+    ("yearn", fetch_yearn_vaults),
+    ("sommelier", fetch_sommelier_vaults),
+    ("pendle", fetch_pendle_yields),
+    ("stakedao", fetch_stakedao_vaults),
+    ("morpho", fetch_morpho_markets),
+)
+
+
+@dataclass
+class SourceReport:
+    """Outcome of one source in a collector run."""
+
+    source: str
+    status: str  # ok | error | timeout
+    records: int
+    seconds: float
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _timed(fetcher: Fetcher) -> Tuple[List[Dict], float]:
+    started = time.monotonic()
+    records = fetcher()
+    return records, time.monotonic() - started
+
+
+def fetch_concurrently(
+    fetchers: Sequence[Tuple[str, Fetcher]],
+    *,
+    deadlines: Optional[Mapping[str, float]] = None,
+    budget: float = RUN_BUDGET_SECONDS,
+) -> Tuple[Dict[str, List[Dict]], List[SourceReport]]:
+    """Run all fetchers in parallel and collect what finished in time.
+
+    Each source gets its own deadline (``SOURCE_DEADLINE_SECONDS`` unless
+    overridden) capped by the overall ``budget``. A source that misses it
+    contributes no records and is reported as ``timeout``; its thread is
+    abandoned rather than waited for.
+    """
+    started = time.monotonic()
+    pool = ThreadPoolExecutor(max_workers=max(1, len(fetchers)), thread_name_prefix="collector-source")
+    futures = [(name, pool.submit(_timed, fetcher)) for name, fetcher in fetchers]
+
+    results: Dict[str, List[Dict]] = {}
+    reports: List[SourceReport] = []
+    try:
+        for name, future in futures:
+            deadline = min((deadlines or {}).get(name, SOURCE_DEADLINE_SECONDS), budget)
+            remaining = max(0.0, started + deadline - time.monotonic())
+            try:
+                records, seconds = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning("Source %s missed its %.0fs deadline", name, deadline)
+                results[name] = []
+                reports.append(SourceReport(name, "timeout", 0, round(time.monotonic() - started, 3)))
+                continue
+            except Exception as exc:  # noqa: BLE001 - one broken source must not fail the run
+                logger.warning("Source %s failed: %s", name, exc)
+                results[name] = []
+                reports.append(SourceReport(name, "error", 0, round(time.monotonic() - started, 3), str(exc)))
+                continue
+            results[name] = records
+            reports.append(SourceReport(name, "ok", len(records), round(seconds, 3)))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, reports
+
+
 def iter_all_sources() -> Iterable[tuple[str, List[Dict]]]:
-    """Helper to iterate through all configured sources."""
-    yield "defillama", fetch_defillama_pools()
-    yield "beefy", fetch_beefy_data()
-    yield "yearn", fetch_yearn_vaults()
-    yield "sommelier", fetch_sommelier_vaults()
-    yield "pendle", fetch_pendle_yields()
-    yield "stakedao", fetch_stakedao_vaults()
-    yield "morpho", fetch_morpho_markets()
+    """Helper to iterate through all configured sources (fetched concurrently)."""
+    results, _ = fetch_concurrently(SOURCES)
+    for name, _fetcher in SOURCES:
+        yield name, results[name]
+
+
+def _fetch_coingecko_page(page: int) -> Optional[List[Dict]]:
+    params = {
+        "vs_currency": COINGECKO_VS_CURRENCY,
+        "order": "market_cap_desc",
+        "per_page": str(COINGECKO_PER_PAGE),
+        "page": str(page),
+        "sparkline": "false",
+        "price_change_percentage": "24h,7d",
+    }
+    try:
+        response = _session().get(COINGECKO_MARKET_URL, params=params, timeout=HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        payload = response.json()
+    except requests.RequestException as exc:
+        logger.warning("Coingecko request failed (page %s): %s", page, exc)
+        return None
+    if not isinstance(payload, list):
+        return []
+    return [item for item in payload if isinstance(item, dict)]
 
 
 def fetch_coingecko_markets() -> List[Dict]:
+    pages = range(1, COINGECKO_PAGES + 1)
+    with ThreadPoolExecutor(max_workers=max(1, COINGECKO_PAGES), thread_name_prefix="collector-coingecko") as pool:
+        page_results = list(pool.map(_fetch_coingecko_page, pages))
+
     markets: List[Dict] = []
-    for page in range(1, COINGECKO_PAGES + 1):
-        params = {
-            "vs_currency": COINGECKO_VS_CURRENCY,
-            "order": "market_cap_desc",
-            "per_page": str(COINGECKO_PER_PAGE),
-            "page": str(page),
-            "sparkline": "false",
-            "price_change_percentage": "24h,7d",
-        }
-        try:
-            response = requests.get(COINGECKO_MARKET_URL, params=params, timeout=HTTP_TIMEOUT_SECONDS)
-            response.raise_for_status()
-            payload = response.json()
-            if isinstance(payload, list):
-                markets.extend(item for item in payload if isinstance(item, dict))
-        except requests.RequestException as exc:
-            logger.warning("Coingecko request failed (page %s): %s", page, exc)
+    for items in page_results:
+        # Как и раньше, после первой неудачной страницы остальные не учитываем
+        if items is None:
             break
+        markets.extend(items)
     return markets
@@ -0,0 +1,157 @@
+"""Single-flight collection jobs with progress records in Redis.
+
+Only one ``collect_and_store`` run may publish at a time, across API
+processes and the worker. A submit takes the Redis lock with ``SET NX``;
+the lock value is the job id, so a concurrent submit simply attaches to the
+running job. Each job keeps a record with its status, stage timings and
+result. The lock TTL is renewed at every stage and the lock is only
+released by its owner, so a crashed run cannot block collection for longer
+than ``COLLECT_LOCK_TTL_SECONDS``; its record is then reported as
+``abandoned``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import redis
+
+from .config import (
+    COLLECT_JOB_PREFIX,
+    COLLECT_JOB_TTL_SECONDS,
+    COLLECT_LOCK_KEY,
+    COLLECT_LOCK_TTL_SECONDS,
+    REDIS_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+Collector = Callable[..., Dict[str, Any]]
+
+_ACTIVE_STATUSES = ("queued", "running")
+
+
+def job_key(job_id: str) -> str:
+    return f"{COLLECT_JOB_PREFIX}:{job_id}"
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class CollectionJobs:
+    """Submits, runs and reports collection jobs guarded by one Redis lock."""
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        *,
+        redis_url: str = REDIS_URL,
+        lock_ttl: int = COLLECT_LOCK_TTL_SECONDS,
+        job_ttl: int = COLLECT_JOB_TTL_SECONDS,
+    ) -> None:
+        self._client = client
+        self._redis_url = redis_url
+        self._lock_ttl = lock_ttl
+        self._job_ttl = job_ttl
+
+    @property
+    def redis(self) -> redis.Redis:
+        # Клиент создаётся при первом обращении, импорт модуля не требует Redis
+        if self._client is None:
+            self._client = redis.Redis.from_url(self._redis_url, decode_responses=True)
+        return self._client
+
+    def submit(self) -> Tuple[str, bool]:
+        """Start a job or attach to the running one; return its id and whether it is new."""
+        for _ in range(3):
+            job_id = uuid.uuid4().hex
+            # Запись создаём до захвата блокировки, чтобы присоединившийся сразу видел статус
+            self._save({"job_id": job_id, "status": "queued", "created_at": _now_iso(), "stages": []})
+            if self.redis.set(COLLECT_LOCK_KEY, job_id, nx=True, ex=self._lock_ttl):
+                return job_id, True
+            self.redis.delete(job_key(job_id))
+            running = self.redis.get(COLLECT_LOCK_KEY)
+            if running:
+                return running, False
+        raise RuntimeError("Could not acquire or attach to the collection lock")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw, holder = self.redis.mget([job_key(job_id), COLLECT_LOCK_KEY])
+        if not raw:
+            return None
+        try:
+            record = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        # Процесс сбора умер: блокировка истекла, а запись так и осталась незавершённой
+        if record.get("status") in _ACTIVE_STATUSES and holder != job_id:
+            record["status"] = "abandoned"
+        return record
+
+    def running(self) -> Optional[str]:
+        return self.redis.get(COLLECT_LOCK_KEY)
+
+    def _save(self, record: Dict[str, Any]) -> None:
+        self.redis.set(job_key(record["job_id"]), json.dumps(record), ex=self._job_ttl)
+
+    def _if_owner(self, job_id: str, action: Callable[[Any], None]) -> bool:
+        """Apply ``action`` to the lock in a transaction only while ``job_id`` still holds it."""
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(COLLECT_LOCK_KEY)
+                if pipe.get(COLLECT_LOCK_KEY) != job_id:
+                    return False
+                pipe.multi()
+                action(pipe)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def run(self, job_id: str, collect: Collector) -> Dict[str, Any]:
+        """Run ``collect`` for a submitted job, recording stages, then release the lock."""
+        record = self.get(job_id) or {"job_id": job_id, "created_at": _now_iso(), "stages": []}
+        started = time.monotonic()
+        record.update(status="running", started_at=_now_iso(), stage=None, stages=[])
+        self._save(record)
+        stage_started = started
+
+        def close_stage() -> None:
+            if record["stages"]:
+                record["stages"][-1]["seconds"] = round(time.monotonic() - stage_started, 3)
+
+        def progress(stage: str) -> None:
+            nonlocal stage_started
+            close_stage()
+            stage_started = time.monotonic()
+            record["stage"] = stage
+            record["stages"].append({"name": stage, "started_at": _now_iso(), "seconds": None})
+            # Сбой Redis при записи прогресса не должен обрывать сам сбор
+            try:
+                self._save(record)
+                if not self._if_owner(job_id, lambda pipe: pipe.expire(COLLECT_LOCK_KEY, self._lock_ttl)):
+                    logger.warning("Collection job %s no longer holds the lock", job_id)
+            except redis.RedisError as exc:
+                logger.warning("Failed to record progress of collection job %s: %s", job_id, exc)
+
+        try:
+            result = collect(progress=progress)
+            record.update(status="succeeded", result=result)
+        except Exception as exc:  # noqa: BLE001 - the failure is reported through the job record
+            logger.exception("Collection job %s failed: %s", job_id, exc)
+            record.update(status="failed", error=str(exc))
+        finally:
+            close_stage()
+            record.update(stage=None, finished_at=_now_iso(), seconds=round(time.monotonic() - started, 3))
+            self._save(record)
+            self._if_owner(job_id, lambda pipe: pipe.delete(COLLECT_LOCK_KEY))
+        return record
+
+
+COLLECTION_JOBS = CollectionJobs()
@@ -5,44 +5,20 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import Dict, Iterable, List, Optional
 
-from .config import DEFAULT_ICON_URL
-from .data_sources import fetch_defillama_protocols
-
-# Cache protocol metadata to enhance normalized entries.
-_PROTOCOL_META: Dict[str, Dict] | None = None
-
+from src.protocols import PROTOCOL_DIRECTORY
 
-def _ensure_protocol_meta() -> Dict[str, Dict]:
-    global _PROTOCOL_META
-    if _PROTOCOL_META is None:
-        meta_list = fetch_defillama_protocols()
-        _PROTOCOL_META = {}
-        for item in meta_list:
-            slug = (item.get("slug") or item.get("name") or "").strip().lower()
-            if not slug:
-                continue
-            _PROTOCOL_META[slug] = item
-    return _PROTOCOL_META or {}
+from .config import DEFAULT_ICON_URL
 
 
 def _lookup_protocol_icon(protocol: str | None) -> str:
-    if not protocol:
+    meta = PROTOCOL_DIRECTORY.get(protocol)
+    if not meta:
         return DEFAULT_ICON_URL
-    meta = _ensure_protocol_meta()
-    slug_candidates = {protocol.strip().lower()}
-    icon = DEFAULT_ICON_URL
-    for slug in slug_candidates:
-        data = meta.get(slug)
-        if not data:
-            continue
-        symbol = data.get("symbol")
-        if symbol:
-            icon = f"https://icons.llama.fi/{symbol.lower()}?w=64&h=64"
-        logo = data.get("logo")
-        if logo:
-            icon = logo
-        break
-    return icon
+    if meta.logo:
+        return meta.logo
+    if meta.symbol:
+        return f"https://icons.llama.fi/{meta.symbol.lower()}?w=64&h=64"
+    return DEFAULT_ICON_URL
 
 
 def normalize_defillama_pool(item: Dict) -> Optional[Dict]:
@@ -4,11 +4,13 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime, timezone
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
-from .data_sources import fetch_coingecko_markets, iter_all_sources
+from src.protocols import PROTOCOL_DIRECTORY
+
+from .data_sources import SOURCES, fetch_coingecko_markets, fetch_concurrently
 from .normalizer import normalize
-from .storage import StrategyStorage, compute_growth
+from .storage import StrategyStorage, growth_from_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -83,8 +85,7 @@ def _build_ai_comment(strategy: Dict) -> str:
     )
 
 
-def _build_volatility_map() -> Dict[str, Dict[str, float]]:
-    markets = fetch_coingecko_markets()
+def _build_volatility_map(markets: List[Dict]) -> Dict[str, Dict[str, float]]:
     mapping: Dict[str, Dict[str, float]] = {}
     for item in markets:
         symbol = (item.get("symbol") or "").upper()
@@ -101,15 +102,29 @@ def _build_volatility_map() -> Dict[str, Dict[str, float]]:
     return mapping
 
 
-def collect_and_store() -> Dict[str, int]:
+def collect_and_store(progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Fetch, score and publish all strategies; ``progress`` is called with each stage name as it starts."""
+    report_stage = progress or (lambda stage: None)
     storage = StrategyStorage()
     aggregated: Dict[str, Dict] = {}
     now = datetime.now(timezone.utc)
     total_raw = 0
-    volatility_map = _build_volatility_map()
+
+    report_stage("fetch")
+    # Все источники и котировки CoinGecko грузим параллельно, время прогона ≈ самый медленный источник
+    fetched, reports = fetch_concurrently([*SOURCES, ("coingecko", fetch_coingecko_markets)])
+    for report in reports:
+        logger.info(
+            "Source %s: %s, %s records in %.2fs", report.source, report.status, report.records, report.seconds
+        )
+    volatility_map = _build_volatility_map(fetched.pop("coingecko"))
+    # Нормализация берёт иконки из каталога протоколов только из памяти — догружаем его здесь
+    PROTOCOL_DIRECTORY.ensure_loaded()
 
     try:
-        for source, records in iter_all_sources():
+        report_stage("normalize")
+        for source, _fetcher in SOURCES:
+            records = fetched[source]
             normalized = normalize(source, records)
             total_raw += len(records)
             logger.info("Fetched %s entries from %s (%s normalized)", len(records), source, len(normalized))
@@ -121,12 +136,18 @@ def collect_and_store() -> Dict[str, int]:
                     continue
                 aggregated[strategy_id] = item
 
+        report_stage("score")
+        # Redis: один HMGET-проход, пачка HSET и пачки TVL-точек вместо 3 запросов на стратегию
+        previous_snapshots = storage.load_previous_snapshots(list(aggregated))
+        snapshots: Dict[str, Dict] = {}
+        tvl_points: Dict[str, float] = {}
+
         strategies: List[Dict] = []
         for strategy_id, strategy in aggregated.items():
             tvl_usd = float(strategy.get("tvl_usd") or 0.0)
-            growth, snapshot = compute_growth(storage, strategy_id, tvl_usd, now)
-            storage.save_snapshot(strategy_id, snapshot)
-            storage.append_tvl_point(strategy_id, now, tvl_usd)
+            growth, snapshot = growth_from_snapshot(previous_snapshots.get(strategy_id), tvl_usd, now)
+            snapshots[strategy_id] = snapshot
+            tvl_points[strategy_id] = tvl_usd
 
             strategy["tvl_growth_24h"] = round(growth, 4)
             strategy["risk_index"] = round(_derive_risk_index(strategy, volatility_map), 4)
@@ -135,9 +156,16 @@ def collect_and_store() -> Dict[str, int]:
             strategy["ai_comment"] = _build_ai_comment(strategy)
             strategies.append(strategy)
 
+        report_stage("store")
+        storage.save_snapshots(snapshots)
+        storage.append_tvl_points(tvl_points, now)
         storage.save_latest(strategies)
 
         logger.info("Stored %s strategies (%s raw records)", len(strategies), total_raw)
-        return {"raw_records": total_raw, "strategies": len(strategies)}
+        return {
+            "raw_records": total_raw,
+            "strategies": len(strategies),
+            "sources": [report.as_dict() for report in reports],
+        }
     finally:
         storage.close()
@@ -4,21 +4,56 @@ from __future__ import annotations
 
 import json
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, TypeVar
 
 import redis
 
+from src.snapshot_codec import encode_snapshot
+
 from .config import (
     CHAIN_SET_KEY,
     LATEST_STRATEGIES_KEY,
     LATEST_TTL_SECONDS,
     PROTOCOL_SET_KEY,
+    REDIS_BATCH_SIZE,
     REDIS_URL,
+    SNAPSHOT_ENCODING,
+    SNAPSHOT_GC_GRACE_SECONDS,
+    SNAPSHOT_GENERATIONS_KEY,
+    SNAPSHOT_KEY_PREFIX,
+    SNAPSHOT_POINTER_KEY,
+    SNAPSHOT_VERSION_SEQ_KEY,
     STRATEGY_HISTORY_HASH,
     STRATEGY_ITEM_HASH,
     STRATEGY_TVL_PREFIX,
 )
 
+T = TypeVar("T")
+
+TVL_HISTORY_POINTS = 96  # ~24h at 15m intervals
+
+
+def _chunks(items: Sequence[T], size: int) -> Iterable[Sequence[T]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def snapshot_key(version: str, name: str) -> str:
+    """Key of one part (latest, items, protocols, chains) of a published generation."""
+    return f"{SNAPSHOT_KEY_PREFIX}:{version}:{name}"
+
+
+SNAPSHOT_PARTS = ("latest", "items", "protocols", "chains")
+
+
+def _decode_snapshot(raw: Optional[str]) -> Dict | None:
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+
 
 class StrategyStorage:
     """Lightweight helper around Redis for storing strategy snapshots."""
@@ -30,51 +65,120 @@ class StrategyStorage:
         self.redis.close()
 
     def load_previous_snapshot(self, strategy_id: str) -> Dict | None:
-        raw = self.redis.hget(STRATEGY_HISTORY_HASH, strategy_id)
-        if not raw:
-            return None
-        try:
-            return json.loads(raw)
-        except json.JSONDecodeError:
-            return None
+        return _decode_snapshot(self.redis.hget(STRATEGY_HISTORY_HASH, strategy_id))
+
+    def load_previous_snapshots(self, strategy_ids: Sequence[str]) -> Dict[str, Dict | None]:
+        """Bulk ``load_previous_snapshot``: one HMGET per ``REDIS_BATCH_SIZE`` ids."""
+        result: Dict[str, Dict | None] = {}
+        for chunk in _chunks(list(strategy_ids), REDIS_BATCH_SIZE):
+            for strategy_id, raw in zip(chunk, self.redis.hmget(STRATEGY_HISTORY_HASH, list(chunk))):
+                result[strategy_id] = _decode_snapshot(raw)
+        return result
 
     def save_snapshot(self, strategy_id: str, payload: Dict) -> None:
         self.redis.hset(STRATEGY_HISTORY_HASH, strategy_id, json.dumps(payload))
 
+    def save_snapshots(self, snapshots: Mapping[str, Dict]) -> None:
+        """Bulk ``save_snapshot``: pipelined multi-field HSETs of ``REDIS_BATCH_SIZE`` fields."""
+        items = [(strategy_id, json.dumps(payload)) for strategy_id, payload in snapshots.items()]
+        if not items:
+            return
+        with self.redis.pipeline(transaction=False) as pipe:
+            for chunk in _chunks(items, REDIS_BATCH_SIZE):
+                pipe.hset(STRATEGY_HISTORY_HASH, mapping=dict(chunk))
+            pipe.execute()
+
     def append_tvl_point(self, strategy_id: str, timestamp: datetime, tvl_usd: float) -> None:
-        key = tvl_key(strategy_id)
+        self.append_tvl_points({strategy_id: tvl_usd}, timestamp)
+
+    def append_tvl_points(self, points: Mapping[str, float], timestamp: datetime) -> None:
+        """Append one TVL point per strategy, executing a pipeline per ``REDIS_BATCH_SIZE`` strategies."""
         score = timestamp.timestamp()
-        value = json.dumps({"t": timestamp.isoformat(), "v": tvl_usd})
-        with self.redis.pipeline() as pipe:
-            pipe.zadd(key, {value: score})
-            pipe.zremrangebyrank(key, 0, -97)  # keep last 96 entries (~24h at 15m intervals)
-            pipe.expire(key, LATEST_TTL_SECONDS * 4)
-            pipe.execute()
+        moment = timestamp.isoformat()
+        for chunk in _chunks(list(points.items()), REDIS_BATCH_SIZE):
+            with self.redis.pipeline(transaction=False) as pipe:
+                for strategy_id, tvl_usd in chunk:
+                    key = tvl_key(strategy_id)
+                    pipe.zadd(key, {json.dumps({"t": moment, "v": tvl_usd}): score})
+                    pipe.zremrangebyrank(key, 0, -(TVL_HISTORY_POINTS + 1))
+                    pipe.expire(key, LATEST_TTL_SECONDS * 4)
+                pipe.execute()
 
-    def save_latest(self, strategies: List[Dict]) -> None:
+    def save_latest(self, strategies: List[Dict]) -> str:
+        """Publish ``strategies`` as a new generation and return its version.
+
+        Every part is written under version-specific keys first; readers only
+        switch to the new generation when the pointer key is flipped by a
+        single SET, so they never observe a half-written snapshot. Previous
+        generations are deleted once they have been superseded for longer
+        than the grace period, and the unversioned keys from before
+        versioning are dropped with the flip, so an expired pointer yields no
+        snapshot instead of frozen data.
+        """
+        version = str(self.redis.incr(SNAPSHOT_VERSION_SEQ_KEY))
+        published_at = datetime.now(timezone.utc)
         envelope = {
-            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "updated_at": published_at.isoformat(),
+            "version": version,
             "count": len(strategies),
             "items": strategies,
         }
-        self.redis.setex(LATEST_STRATEGIES_KEY, LATEST_TTL_SECONDS, json.dumps(envelope))
-
         protocols = {item["protocol"] for item in strategies if item.get("protocol")}
         chains = {item["chain"] for item in strategies if item.get("chain")}
+        # Поколение переживает указатель, поэтому читатель по указателю всегда находит данные
+        ttl = LATEST_TTL_SECONDS + SNAPSHOT_GC_GRACE_SECONDS
+
+        latest_key = snapshot_key(version, "latest")
+        items_key = snapshot_key(version, "items")
+        with self.redis.pipeline(transaction=False) as pipe:
+            encoded = json.dumps(envelope) if SNAPSHOT_ENCODING == "json" else encode_snapshot(envelope)
+            pipe.set(latest_key, encoded, ex=ttl)
+            if protocols:
+                pipe.sadd(snapshot_key(version, "protocols"), *protocols)
+                pipe.expire(snapshot_key(version, "protocols"), ttl)
+            if chains:
+                pipe.sadd(snapshot_key(version, "chains"), *chains)
+                pipe.expire(snapshot_key(version, "chains"), ttl)
+            for chunk in _chunks(strategies, REDIS_BATCH_SIZE):
+                pipe.hset(items_key, mapping={item["id"]: json.dumps(item) for item in chunk})
+            if strategies:
+                pipe.expire(items_key, ttl)
+            pipe.execute()
 
-        if protocols:
-            self.redis.delete(PROTOCOL_SET_KEY)
-            self.redis.sadd(PROTOCOL_SET_KEY, *protocols)
-        if chains:
-            self.redis.delete(CHAIN_SET_KEY)
-            self.redis.sadd(CHAIN_SET_KEY, *chains)
-
-        self.redis.delete(STRATEGY_ITEM_HASH)
-        if strategies:
-            with self.redis.pipeline() as pipe:
-                for item in strategies:
-                    pipe.hset(STRATEGY_ITEM_HASH, item["id"], json.dumps(item))
-                pipe.execute()
+        # Оценка поколения в наборе — момент, когда его сменило следующее; текущее живёт с +inf
+        superseded = [
+            previous
+            for previous in self.redis.zrangebyscore(SNAPSHOT_GENERATIONS_KEY, "+inf", "+inf")
+            if previous != version
+        ]
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(SNAPSHOT_POINTER_KEY, version, ex=LATEST_TTL_SECONDS)
+            pipe.zadd(SNAPSHOT_GENERATIONS_KEY, {version: float("inf")})
+            if superseded:
+                pipe.zadd(SNAPSHOT_GENERATIONS_KEY, dict.fromkeys(superseded, published_at.timestamp()))
+            # После первой версионной публикации их никто не обновляет (и items/наборы без TTL)
+            pipe.delete(LATEST_STRATEGIES_KEY, STRATEGY_ITEM_HASH, PROTOCOL_SET_KEY, CHAIN_SET_KEY)
+            pipe.execute()
+
+        self.collect_garbage(keep=version, now=published_at)
+        return version
+
+    def collect_garbage(self, keep: str, now: datetime) -> List[str]:
+        """Delete generations other than ``keep`` superseded before the grace period; return their versions."""
+        cutoff = now.timestamp() - SNAPSHOT_GC_GRACE_SECONDS
+        expired = [
+            version
+            for version in self.redis.zrangebyscore(SNAPSHOT_GENERATIONS_KEY, "-inf", cutoff)
+            if version != keep
+        ]
+        if not expired:
+            return []
+        with self.redis.pipeline(transaction=False) as pipe:
+            for version in expired:
+                pipe.delete(*(snapshot_key(version, part) for part in SNAPSHOT_PARTS))
+            pipe.zrem(SNAPSHOT_GENERATIONS_KEY, *expired)
+            pipe.execute()
+        return expired
 
     def get_top_by_score(self, strategies: Iterable[Dict], limit: int = 10) -> List[Dict]:
         sorted_items = sorted(
@@ -92,7 +196,15 @@ def compute_growth(
     now: datetime,
 ) -> Tuple[float, Dict[str, float]]:
     """Return TVL growth percentage and snapshot payload for persistence."""
-    previous = storage.load_previous_snapshot(strategy_id)
+    return growth_from_snapshot(storage.load_previous_snapshot(strategy_id), current_value, now)
+
+
+def growth_from_snapshot(
+    previous: Dict | None,
+    current_value: float,
+    now: datetime,
+) -> Tuple[float, Dict[str, float]]:
+    """Same as :func:`compute_growth` for an already loaded previous snapshot."""
     if not previous:
         snapshot = {"tvl_usd": current_value, "timestamp": now.isoformat()}
         return 0.0, snapshot
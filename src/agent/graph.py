@@ -12,6 +12,7 @@ from langgraph.graph import StateGraph
 from langgraph.runtime import Runtime
 from typing_extensions import TypedDict
 
+from src.pool_store import PoolStore
 from src.tools import APIError, analyze_strategies, get_opportunities, get_risk_description, discover_new_pools
 from src.utils.constants import DEFAULT_USER_PREFERENCES, SUPPORTED_RISK_LEVELS
 
@@ -101,6 +102,26 @@ def prepare_state(state: AgentState, runtime: Runtime[Context]) -> Dict[str, Any
     }
 
 
+def gather_opportunities(
+    token: str, *, limit: int = 200, force_refresh: bool = False, store: Optional[PoolStore] = None
+) -> List[Dict[str, Any]]:
+    """Лучшие пулы токена, дополненные новыми пулами, если обычный поиск дал мало."""
+    # Сначала пробуем обычный поиск
+    opportunities = get_opportunities(token, limit=limit, force_refresh=force_refresh, store=store)
+
+    # Если найдено мало результатов, используем агрессивный поиск новых пулов
+    if len(opportunities) < limit // 2:
+        new_pools = discover_new_pools(token, limit=limit, force_refresh=True, store=store)
+        # Объединяем результаты, убирая дубликаты
+        existing_ids = {pool.get("pool_id") for pool in opportunities}
+        for pool in new_pools:
+            if pool.get("pool_id") not in existing_ids:
+                opportunities.append(pool)
+                if len(opportunities) >= limit:
+                    break
+    return opportunities
+
+
 def fetch_opportunities(state: AgentState, runtime: Runtime[Context]) -> Dict[str, Any]:
     """Получает список доступных стратегий через DeFiLlama."""
     if state.get("error"):
@@ -111,22 +132,15 @@ def fetch_opportunities(state: AgentState, runtime: Runtime[Context]) -> Dict[st
     force_refresh = bool(context.get("force_refresh", False))
 
     try:
-        # Сначала пробуем обычный поиск
-        opportunities = get_opportunities(state["token"], limit=limit, force_refresh=force_refresh)
-        
-        # Если найдено мало результатов, используем агрессивный поиск новых пулов
-        if len(opportunities) < limit // 2:
-            new_pools = discover_new_pools(state["token"], limit=limit, force_refresh=True)
-            # Объединяем результаты, убирая дубликаты
-            existing_ids = {pool.get("pool_id") for pool in opportunities}
-            for pool in new_pools:
-                if pool.get("pool_id") not in existing_ids:
-                    opportunities.append(pool)
-                    if len(opportunities) >= limit:
-                        break
+        opportunities = gather_opportunities(state["token"], limit=limit, force_refresh=force_refresh)
     except APIError as exc:
         return {"error": str(exc)}
 
+    return attach_opportunities(state, opportunities)
+
+
+def attach_opportunities(state: AgentState, opportunities: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Обновление состояния с найденными пулами (и предупреждением, если их нет)."""
     warnings = list(state.get("warnings", []))
     if not opportunities:
         warnings.append("Для указанного токена не найдено активных стратегий")
@@ -2,127 +2,232 @@
 
 from __future__ import annotations
 
+import asyncio
+import logging
 import math
-from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
+import httpx
 import requests
 
+from src.async_http import UPSTREAM_HTTP
 from src.coins import get_top_market_tokens
+from src.executors import ANALYTICS_EXECUTOR
+from src.pool_index import MIN_TVL_USD as INDEX_MIN_TVL_USD
+from src.pool_index import POOL_INDEX
+from src.pool_store import PoolStore
+from src.protocols import PROTOCOL_DIRECTORY
+from src.singleflight import UPSTREAM_FLIGHTS, get_json
+from src.ttl_cache import TTLCache
 from src.utils.tokens import classify_pair, normalize_pair, parse_tokens
 
+logger = logging.getLogger(__name__)
+
 ALL_POOLS_URL = "https://yields.llama.fi/pools"
 CHART_URL_TEMPLATE = "https://yields.llama.fi/chart/{pool_id}"
-PROTOCOL_URL_TEMPLATE = "https://api.llama.fi/protocol/{slug}"
 CHART_CACHE_TTL = timedelta(minutes=30)
-PROJECT_URL_CACHE_TTL = timedelta(hours=1)
-CHART_FETCH_WORKERS = 8
+CHART_CACHE_MAX_ENTRIES = 5_000
+# Ограничение по суммарному числу точек графиков (≈ памяти), а не только по числу пулов
+CHART_CACHE_MAX_POINTS = 1_000_000
 CANDIDATE_MULTIPLIER = 4
+# Поле изменения APY (в п.п.) из payload пулов для каждого периода
+APY_PCT_FIELDS = {1: "apyPct1D", 7: "apyPct7D", 30: "apyPct30D"}
 TOKEN_SEARCH_CACHE_TTL = timedelta(minutes=5)
+TOKEN_SEARCH_CACHE_MAX_ENTRIES = 256
+
+PERIODS = {"24h": 1, "7d": 7, "30d": 30}
+# Ключ сортировки -> поле обогащённого пула
+SORT_FIELDS = {"momentum": "momentum", "tvl_change": "tvl_change_pct", "apy_change": "apy_change_pct"}
 
 MOMENTUM_TVL_WEIGHT = 0.6
 MOMENTUM_APY_WEIGHT = 0.4
 
-@dataclass
-class CacheEntry:
-    fetched_at: datetime
-    data: Any
+
+@dataclass(frozen=True)
+class ChartSeries:
+    """Pool chart as parallel arrays: epoch seconds (int64), TVL and APY (NaN if missing).
+
+    Timestamps are parsed once when the chart is fetched, so point-in-time
+    lookups are a binary search instead of an ISO parse per point.
+    """
+
+    timestamps: array = field(default_factory=lambda: array("q"))
+    tvl: array = field(default_factory=lambda: array("d"))
+    apy: array = field(default_factory=lambda: array("d"))
+
+    @classmethod
+    def from_points(cls, points: Iterable[Dict[str, Any]]) -> ChartSeries:
+        parsed: List[Tuple[int, float, float]] = []
+        for point in points:
+            if not isinstance(point, dict):
+                continue
+            epoch = _parse_epoch(point.get("timestamp"))
+            if epoch is None:
+                continue
+            parsed.append((epoch, _as_float(point.get("tvlUsd")), _as_float(point.get("apy"))))
+
+        if any(parsed[i][0] > parsed[i + 1][0] for i in range(len(parsed) - 1)):
+            parsed.sort(key=lambda item: item[0])
+
+        series = cls()
+        for epoch, tvl, apy in parsed:
+            series.timestamps.append(epoch)
+            series.tvl.append(tvl)
+            series.apy.append(apy)
+        return series
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def index_at(self, target_time: datetime) -> Optional[int]:
+        """Index of the latest point not newer than ``target_time``."""
+        position = bisect_right(self.timestamps, int(target_time.timestamp())) - 1
+        return position if position >= 0 else None
+
+    def tvl_at(self, index: int) -> Optional[float]:
+        value = self.tvl[index]
+        return None if math.isnan(value) else value
+
+    def apy_at(self, index: int) -> Optional[float]:
+        value = self.apy[index]
+        return None if math.isnan(value) else value
+
+    def time_at(self, index: int) -> datetime:
+        return datetime.fromtimestamp(self.timestamps[index], tz=timezone.utc)
+
+
+def _parse_epoch(value: Any) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _as_float(value: Any) -> float:
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
 
 
-_chart_cache: Dict[str, CacheEntry] = {}
-_project_url_cache: Dict[str, CacheEntry] = {}
-_token_search_cache: Dict[str, CacheEntry] = {}
+_chart_cache: TTLCache[str, ChartSeries] = TTLCache(
+    "analytics.charts",
+    ttl=CHART_CACHE_TTL,
+    max_entries=CHART_CACHE_MAX_ENTRIES,
+    max_weight=CHART_CACHE_MAX_POINTS,
+    weigher=lambda series: max(len(series), 1),
+)
+_token_search_cache: TTLCache[str, List[Dict[str, Any]]] = TTLCache(
+    "analytics.token_search",
+    ttl=TOKEN_SEARCH_CACHE_TTL,
+    max_entries=TOKEN_SEARCH_CACHE_MAX_ENTRIES,
+)
 
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def _fetch_chart(pool_id: str) -> List[Dict[str, Any]]:
-    response = requests.get(CHART_URL_TEMPLATE.format(pool_id=pool_id), timeout=30)
-    response.raise_for_status()
-    payload = response.json()
-    data = payload.get("data", [])
+def _chart_points(payload: Any) -> List[Dict[str, Any]]:
+    data = payload.get("data", []) if isinstance(payload, dict) else []
     if not isinstance(data, list):
         return []
     return data
 
 
-def get_chart(pool_id: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
+def _fetch_chart(pool_id: str) -> List[Dict[str, Any]]:
+    return _chart_points(get_json(CHART_URL_TEMPLATE.format(pool_id=pool_id), timeout=30))
+
+
+def get_chart(pool_id: str, force_refresh: bool = False) -> ChartSeries:
     """Return cached chart data for a pool."""
-    now = _utcnow()
-    entry = _chart_cache.get(pool_id)
-    if not force_refresh and entry and now - entry.fetched_at < CHART_CACHE_TTL:
-        return entry.data
+    if not force_refresh:
+        cached = _chart_cache.get(pool_id)
+        if cached is not None:
+            return cached
 
-    chart = _fetch_chart(pool_id)
-    _chart_cache[pool_id] = CacheEntry(fetched_at=now, data=chart)
+    chart = ChartSeries.from_points(_fetch_chart(pool_id))
+    _chart_cache.set(pool_id, chart)
     return chart
 
 
+def _decode_charts(payloads: Dict[str, Any]) -> Dict[str, ChartSeries]:
+    """Build (and cache) chart series from raw chart payloads; runs off the event loop."""
+    charts: Dict[str, ChartSeries] = {}
+    for pool_id, payload in payloads.items():
+        chart = ChartSeries.from_points(_chart_points(payload))
+        _chart_cache.set(pool_id, chart)
+        charts[pool_id] = chart
+    return charts
+
+
+async def fetch_charts(pool_ids: Sequence[str], force_refresh: bool = False) -> Dict[str, ChartSeries]:
+    """Return charts for ``pool_ids``, fetching missing ones concurrently over pooled connections.
+
+    Pools whose chart could not be fetched are left out of the result.
+    """
+    charts: Dict[str, ChartSeries] = {}
+    missing: List[str] = []
+    for pool_id in dict.fromkeys(pool_ids):
+        cached = None if force_refresh else _chart_cache.get(pool_id)
+        if cached is not None:
+            charts[pool_id] = cached
+        else:
+            missing.append(pool_id)
+
+    async def fetch(pool_id: str) -> Any:
+        url = CHART_URL_TEMPLATE.format(pool_id=pool_id)
+        try:
+            # Одновременные запросы одного графика (API и лидерборды) делят один вызов upstream
+            return await UPSTREAM_FLIGHTS.do_async(url, lambda: UPSTREAM_HTTP.get_json(url))
+        except (httpx.HTTPError, ValueError) as exc:
+            logger.warning("Failed to fetch chart for %s: %s", pool_id, exc)
+            return None
+
+    payloads = {
+        pool_id: payload
+        for pool_id, payload in zip(missing, await asyncio.gather(*(fetch(pool_id) for pool_id in missing)))
+        if payload is not None
+    }
+    if payloads:
+        # Разбор ISO-меток тысяч точек — CPU-работа, в event loop её не делаем
+        charts.update(await ANALYTICS_EXECUTOR.run(_decode_charts, payloads))
+    return charts
+
+
 def get_token_pools(symbol: str, force_refresh: bool = False) -> List[Dict[str, Any]]:
     token = symbol.upper()
-    now = _utcnow()
-    entry = _token_search_cache.get(token)
-    if entry and not force_refresh and now - entry.fetched_at < TOKEN_SEARCH_CACHE_TTL:
-        return entry.data
+    if not force_refresh:
+        cached = _token_search_cache.get(token)
+        if cached is not None:
+            return cached
 
     params = {"search": token}
     try:
-        response = requests.get(ALL_POOLS_URL, params=params, timeout=20)
-        response.raise_for_status()
-        payload = response.json()
+        payload = get_json(ALL_POOLS_URL, params=params, timeout=20)
         data = payload.get("data", [])
         if not isinstance(data, list):
             data = []
     except requests.RequestException:
         data = []
 
-    _token_search_cache[token] = CacheEntry(fetched_at=now, data=data)
+    _token_search_cache.set(token, data)
     return data
 
 
 def get_project_url(project: Optional[str]) -> Optional[str]:
-    if not project:
-        return None
-
-    key = project.lower()
-    now = _utcnow()
-    entry = _project_url_cache.get(key)
-    if entry and now - entry.fetched_at < PROJECT_URL_CACHE_TTL:
-        return entry.data
-
-    try:
-        response = requests.get(PROTOCOL_URL_TEMPLATE.format(slug=key), timeout=15)
-        if response.status_code == 200:
-            url = response.json().get("url")
-            _project_url_cache[key] = CacheEntry(fetched_at=now, data=url)
-            return url
-    except requests.RequestException:
-        pass
-
-    _project_url_cache[key] = CacheEntry(fetched_at=now, data=None)
-    return None
-
-
-def _find_point(chart: List[Dict[str, Any]], target_time: datetime) -> Optional[Dict[str, Any]]:
-    """Find the data point closest to target_time but not newer."""
-    candidate: Optional[Dict[str, Any]] = None
-    for point in chart:
-        ts = point.get("timestamp")
-        if not ts:
-            continue
-        try:
-            dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
-        except ValueError:
-            continue
-        if dt <= target_time:
-            candidate = point
-        else:
-            break
-    return candidate
+    return PROTOCOL_DIRECTORY.get_url(project)
 
 
 def _calculate_change(current: Optional[float], past: Optional[float]) -> Optional[float]:
@@ -140,16 +245,10 @@ def _calculate_momentum(tvl_change: Optional[float], apy_change: Optional[float]
     return tvl_component + apy_component
 
 
-def _estimate_first_seen(chart: List[Dict[str, Any]]) -> Optional[datetime]:
-    if not chart:
-        return None
-    first = chart[0].get("timestamp")
-    if not first:
-        return None
-    try:
-        return datetime.fromisoformat(str(first).replace("Z", "+00:00"))
-    except ValueError:
+def _estimate_first_seen(chart: ChartSeries) -> Optional[datetime]:
+    if not len(chart):
         return None
+    return chart.time_at(0)
 
 
 def _filter_by_symbols(tokens: Sequence[str], tracked: Sequence[str]) -> bool:
@@ -165,27 +264,46 @@ def _filter_by_chain(chain: str, chains: Sequence[str]) -> bool:
     return chain.lower() in {chain_name.lower() for chain_name in chains}
 
 
-def _get_new_pool_candidates(
+def _dedupe_candidates(pools: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep the largest pool per (project, normalized pair)."""
+    result: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for pool in pools:
+        key = (pool.get("project") or "", normalize_pair(pool.get("symbol") or ""))
+        stored = result.get(key)
+        if not stored or float(pool.get("tvlUsd") or 0.0) > float(stored.get("tvlUsd") or 0.0):
+            result[key] = pool
+    return list(result.values())
+
+
+def _index_candidates(
+    store: PoolStore,
     symbols: Sequence[str],
     period_days: int,
     min_tvl: float,
     chains: Sequence[str],
-    force_refresh: bool,
 ) -> List[Dict[str, Any]]:
-    allowed_symbols = {token["symbol"].upper() for token in get_top_market_tokens(limit=100)}
-    requested_symbols = [symbol.upper() for symbol in symbols]
-    if not requested_symbols:
-        raise ValueError("At least one symbol must be provided")
-
-    tokens_to_fetch = [symbol for symbol in requested_symbols if symbol in allowed_symbols]
-    if not tokens_to_fetch:
-        raise ValueError("Symbols must be from the top-100 list")
+    rows = sorted({row for symbol in symbols for row in store.rows_for_token(symbol)})
+    count = store.columns["count"]
+    matched = store.filter(
+        rows,
+        min_tvl=min_tvl,
+        chains=chains,
+        # NaN (нет count в payload) не проходит сравнение, как и раньше
+        predicate=lambda row: count[row] <= period_days + 1,
+    )
+    return _dedupe_candidates(store.record(row) for row in matched)
 
-    result: Dict[Tuple[str, str], Dict[str, Any]] = {}
 
-    for symbol in tokens_to_fetch:
-        pools = get_token_pools(symbol, force_refresh=force_refresh)
-        for pool in pools:
+def _search_candidates(
+    symbols: Sequence[str],
+    period_days: int,
+    min_tvl: float,
+    chains: Sequence[str],
+    force_refresh: bool,
+) -> List[Dict[str, Any]]:
+    matched: List[Dict[str, Any]] = []
+    for symbol in symbols:
+        for pool in get_token_pools(symbol, force_refresh=force_refresh):
             tvl = float(pool.get("tvlUsd") or 0.0)
             if tvl < min_tvl:
                 continue
@@ -194,40 +312,123 @@ def _get_new_pool_candidates(
             if not isinstance(count, (int, float)) or count > period_days + 1:
                 continue
 
-            pair_symbol = pool.get("symbol") or ""
-            tokens = parse_tokens(pair_symbol)
-            if not _filter_by_symbols(tokens, requested_symbols):
+            tokens = parse_tokens(pool.get("symbol") or "")
+            if not _filter_by_symbols(tokens, symbols):
                 continue
 
-            chain = pool.get("chain") or ""
-            if not _filter_by_chain(chain, chains):
+            if not _filter_by_chain(pool.get("chain") or "", chains):
                 continue
 
-            norm_pair = normalize_pair(pair_symbol)
-            key = (pool.get("project") or "", norm_pair)
+            matched.append(pool)
+    return _dedupe_candidates(matched)
 
-            stored = result.get(key)
-            if not stored or tvl > stored.get("tvlUsd", 0):
-                result[key] = pool
 
-    return list(result.values())
+def tracked_symbols(symbols: Sequence[str]) -> List[str]:
+    """Return the requested symbols that belong to the top-100 universe."""
+    allowed_symbols = {token["symbol"].upper() for token in get_top_market_tokens(limit=100)}
+    requested_symbols = [symbol.upper() for symbol in symbols]
+    if not requested_symbols:
+        raise ValueError("At least one symbol must be provided")
+
+    tokens_to_fetch = [symbol for symbol in requested_symbols if symbol in allowed_symbols]
+    if not tokens_to_fetch:
+        raise ValueError("Symbols must be from the top-100 list")
+    return tokens_to_fetch
 
 
-def _enrich_pool(pool: Dict[str, Any], chart: List[Dict[str, Any]], period_days: int) -> Optional[Dict[str, Any]]:
+def _get_new_pool_candidates(
+    symbols: Sequence[str],
+    period_days: int,
+    min_tvl: float,
+    chains: Sequence[str],
+    force_refresh: bool,
+) -> List[Dict[str, Any]]:
+    tokens_to_fetch = tracked_symbols(symbols)
+
+    # Индекс уже держит весь список пулов, поэтому upstream нужен только для графиков.
+    # Пулы ниже порога индекса в нём отсутствуют — для такого min_tvl остаётся поиск.
+    store = POOL_INDEX.get_store() if min_tvl >= INDEX_MIN_TVL_USD else None
+    if store is not None:
+        return _index_candidates(store, tokens_to_fetch, period_days, min_tvl, chains)
+    return _search_candidates(tokens_to_fetch, period_days, min_tvl, chains, force_refresh)
+
+
+def _apy_change_proxy(pool: Dict[str, Any], period_days: int) -> float:
+    apy = _as_float(pool.get("apy"))
+    delta = _as_float(pool.get(APY_PCT_FIELDS[period_days]))
+    past_apy = apy - delta
+    # NaN и неположительная база дают -inf, как None в итоговой сортировке
+    if not past_apy > 0:
+        return -math.inf
+    return delta / past_apy * 100.0
+
+
+def _tvl_growth_proxy(pool: Dict[str, Any]) -> float:
+    # Кандидаты не старше периода, поэтому график начинается почти с нуля:
+    # быстрее растут пулы, набравшие больше TVL за меньшее число дней.
+    tvl = _as_float(pool.get("tvlUsd"))
+    count = _as_float(pool.get("count"))
+    if not tvl > 0:
+        return -math.inf
+    return tvl if math.isnan(count) else tvl / max(count, 1.0)
+
+
+def _normalized_ranks(values: Sequence[float]) -> List[float]:
+    ranks = [0.0] * len(values)
+    if len(values) < 2:
+        return ranks
+    order = sorted(range(len(values)), key=values.__getitem__)
+    for position, index in enumerate(order):
+        ranks[index] = position / (len(values) - 1)
+    return ranks
+
+
+def _pre_rank(candidates: Sequence[Dict[str, Any]], period_days: int, sort_key: str) -> List[Dict[str, Any]]:
+    """Order candidates by a chart-free estimate of the requested sort key.
+
+    APY change comes from ``apyPct1D/7D/30D``; TVL growth is approximated by
+    TVL per day of history. For momentum the two are combined as normalized
+    ranks, so their different scales do not matter.
+    """
+    apy_scores = [_apy_change_proxy(pool, period_days) for pool in candidates]
+    tvl_scores = [_tvl_growth_proxy(pool) for pool in candidates]
+    if sort_key == "tvl_change":
+        scores = tvl_scores
+    elif sort_key == "apy_change":
+        scores = apy_scores
+    else:
+        scores = [
+            MOMENTUM_TVL_WEIGHT * tvl_rank + MOMENTUM_APY_WEIGHT * apy_rank
+            for tvl_rank, apy_rank in zip(_normalized_ranks(tvl_scores), _normalized_ranks(apy_scores))
+        ]
+    order = sorted(range(len(candidates)), key=scores.__getitem__, reverse=True)
+    return [candidates[index] for index in order]
+
+
+def _chart_window(
+    candidates: Sequence[Dict[str, Any]], period_days: int, sort_key: str, size: int
+) -> List[Dict[str, Any]]:
+    """Candidates that get charts: all of them if they fit, else the ``size`` best by pre-score."""
+    if len(candidates) <= size:
+        return list(candidates)
+    return _pre_rank(candidates, period_days, sort_key)[:size]
+
+
+def enrich_pool(pool: Dict[str, Any], chart: ChartSeries, period_days: int) -> Optional[Dict[str, Any]]:
     pool_id = pool.get("pool")
-    if not pool_id or not chart:
+    if not pool_id or not len(chart):
         return None
 
-    now_point = chart[-1]
-    now_tvl = now_point.get("tvlUsd")
-    now_apy = now_point.get("apy")
+    now_index = len(chart) - 1
+    now_tvl = chart.tvl_at(now_index)
+    now_apy = chart.apy_at(now_index)
 
     target_time = _utcnow() - timedelta(days=period_days)
-    past_point = _find_point(chart, target_time)
-    if past_point is None and chart:
-        past_point = chart[0]
-    past_tvl = past_point.get("tvlUsd") if past_point else None
-    past_apy = past_point.get("apy") if past_point else None
+    past_index = chart.index_at(target_time)
+    if past_index is None:
+        past_index = 0
+    past_tvl = chart.tvl_at(past_index)
+    past_apy = chart.apy_at(past_index)
 
     tvl_change = _calculate_change(now_tvl, past_tvl)
     apy_change = _calculate_change(now_apy, past_apy)
@@ -254,7 +455,59 @@ def _enrich_pool(pool: Dict[str, Any], chart: List[Dict[str, Any]], period_days:
     }
 
 
-def get_new_pools(
+def sort_value(item: Dict[str, Any], sort_key: str) -> float:
+    """Value ``item`` is ordered by (descending) for ``sort_key``; missing values sort last."""
+    value = item.get(SORT_FIELDS.get(sort_key, "momentum"))
+    return value if value else -math.inf
+
+
+def new_pools_response(
+    period_key: str,
+    days: int,
+    min_tvl: float,
+    symbols: Sequence[str],
+    chains: Sequence[str],
+    pools: List[Dict[str, Any]],
+    total: int,
+) -> Dict[str, Any]:
+    return {
+        "period": period_key,
+        "days": days,
+        "min_tvl": min_tvl,
+        "filters": {
+            "symbols": list(symbols),
+            "chains": [chain for chain in chains],
+        },
+        "count": total,
+        "pools": pools,
+    }
+
+
+def _rank_enriched(
+    pools: Sequence[Dict[str, Any]], charts: Mapping[str, ChartSeries], period_days: int, sort_key: str
+) -> List[Dict[str, Any]]:
+    """Enrich ``pools`` that have a chart and order them by ``sort_key`` (descending)."""
+    enriched: List[Dict[str, Any]] = []
+    for pool in pools:
+        chart = charts.get(pool.get("pool") or "")
+        if chart is None:
+            continue
+        item = enrich_pool(pool, chart, period_days)
+        if item:
+            enriched.append(item)
+    enriched.sort(key=lambda item: sort_value(item, sort_key), reverse=True)
+    return enriched
+
+
+def _remaining(deadline: float) -> float:
+    """Seconds left until ``deadline`` (event loop time); ``asyncio.TimeoutError`` once it has passed."""
+    remaining = deadline - asyncio.get_running_loop().time()
+    if remaining <= 0:
+        raise asyncio.TimeoutError
+    return remaining
+
+
+async def get_new_pools_async(
     period: str = "7d",
     *,
     min_tvl: float = 5_000_000,
@@ -264,19 +517,23 @@ def get_new_pools(
     limit: int = 50,
     force_refresh: bool = False,
 ) -> Dict[str, Any]:
-    period_map = {"24h": 1, "7d": 7, "30d": 30}
     period_key = period.lower()
-    if period_key not in period_map:
+    if period_key not in PERIODS:
         raise ValueError("Unsupported period")
 
     if not symbols:
         raise ValueError("At least one symbol must be provided")
 
-    days = period_map[period_key]
+    days = PERIODS[period_key]
     min_tvl = float(min_tvl)
     limit = max(1, min(limit, 200))
+    # Таймаут пула — бюджет всего запроса, включая загрузку графиков, а не каждого шага
+    deadline = asyncio.get_running_loop().time() + ANALYTICS_EXECUTOR.timeout
 
-    candidates = _get_new_pool_candidates(
+    # Список токенов и холодный старт индекса блокируют — держим их вне event loop
+    candidates = await ANALYTICS_EXECUTOR.run(
+        _get_new_pool_candidates,
+        timeout=_remaining(deadline),
         symbols=symbols,
         period_days=days,
         min_tvl=min_tvl,
@@ -284,61 +541,53 @@ def get_new_pools(
         force_refresh=force_refresh,
     )
     if not candidates:
-        return {
-            "period": period_key,
-            "days": days,
-            "min_tvl": min_tvl,
-            "filters": {
-                "symbols": list(symbols),
-                "chains": [chain for chain in chains],
-            },
-            "count": 0,
-            "pools": [],
-        }
-
-    selected = candidates[: limit * CANDIDATE_MULTIPLIER]
-
-    charts: Dict[str, List[Dict[str, Any]]] = {}
-
-    def fetch_chart(pool: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
-        pool_id = pool.get("pool")
-        if not pool_id:
-            return "", []
-        return pool_id, get_chart(pool_id, force_refresh=force_refresh)
-
-    with ThreadPoolExecutor(max_workers=min(CHART_FETCH_WORKERS, len(selected))) as executor:
-        for pool_id, chart in executor.map(fetch_chart, selected):
-            if pool_id:
-                charts[pool_id] = chart
-
-    enriched: List[Dict[str, Any]] = []
-    for pool in selected:
-        pool_id = pool.get("pool")
-        if not pool_id:
-            continue
-        chart = charts.get(pool_id)
-        if chart is None:
-            continue
-        item = _enrich_pool(pool, chart, days)
-        if item:
-            enriched.append(item)
+        return new_pools_response(period_key, days, min_tvl, symbols, chains, [], 0)
 
+    # Графики нужны для всего окна кандидатов: изменение TVL/APY считается от точки
+    # периода назад, и без графика его нельзя ни оценить, ни ограничить сверху.
+    # Пре-скор по полям payload решает только, кто попадёт в окно, если все не влезают.
     sort_key = sort.lower()
-    if sort_key == "tvl_change":
-        enriched.sort(key=lambda item: item.get("tvl_change_pct") or -math.inf, reverse=True)
-    elif sort_key == "apy_change":
-        enriched.sort(key=lambda item: item.get("apy_change_pct") or -math.inf, reverse=True)
-    else:
-        enriched.sort(key=lambda item: item.get("momentum") or -math.inf, reverse=True)
+    window = limit * CANDIDATE_MULTIPLIER
+    selected = await ANALYTICS_EXECUTOR.run(
+        _chart_window, candidates, days, sort_key, window, timeout=_remaining(deadline)
+    )
+    charts = await asyncio.wait_for(
+        fetch_charts([pool["pool"] for pool in selected if pool.get("pool")], force_refresh=force_refresh),
+        _remaining(deadline),
+    )
 
-    return {
-        "period": period_key,
-        "days": days,
-        "min_tvl": min_tvl,
-        "filters": {
-            "symbols": list(symbols),
-            "chains": [chain for chain in chains],
-        },
-        "count": len(enriched),
-        "pools": enriched[:limit],
-    }
+    # Обогащение (каталог протоколов, парсинг пар) и сортировка тоже уходят из event loop
+    enriched = await ANALYTICS_EXECUTOR.run(
+        _rank_enriched, selected, charts, days, sort_key, timeout=_remaining(deadline)
+    )
+
+    return new_pools_response(period_key, days, min_tvl, symbols, chains, enriched[:limit], len(enriched))
+
+
+def get_new_pools(
+    period: str = "7d",
+    *,
+    min_tvl: float = 5_000_000,
+    symbols: Sequence[str] = (),
+    chains: Sequence[str] = (),
+    sort: str = "momentum",
+    limit: int = 50,
+    force_refresh: bool = False,
+) -> Dict[str, Any]:
+    """Blocking wrapper around :func:`get_new_pools_async` for callers without an event loop."""
+
+    async def run() -> Dict[str, Any]:
+        try:
+            return await get_new_pools_async(
+                period,
+                min_tvl=min_tvl,
+                symbols=symbols,
+                chains=chains,
+                sort=sort,
+                limit=limit,
+                force_refresh=force_refresh,
+            )
+        finally:
+            await UPSTREAM_HTTP.aclose()
+
+    return asyncio.run(run())
@@ -9,7 +9,7 @@ from __future__ import annotations
 
 from api import app  # noqa: F401  (re-exported FastAPI app)
 from api.schemas import PreferencesModel, StrategyRequest, StrategyResponse
-from src.analytics import get_new_pools
+from src.analytics import get_new_pools, get_new_pools_async
 from src.app import run_agent
 from src.coins import get_top_market_tokens
 from src.pool_index import start_preload_index
@@ -22,5 +22,6 @@ __all__ = [
     "get_top_market_tokens",
     "run_agent",
     "get_new_pools",
+    "get_new_pools_async",
     "start_preload_index",
 ]
@@ -0,0 +1,136 @@
+"""Async HTTP client for fan-out reads from upstream APIs.
+
+One ``httpx.AsyncClient`` per event loop keeps TLS connections alive between
+requests, a semaphore caps concurrency, a per-host limiter spaces request
+starts, and transient failures (transport errors, 429, 5xx) are retried with
+exponential backoff.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONCURRENCY = int(os.getenv("UPSTREAM_HTTP_CONCURRENCY", "16"))
+# Максимум запусков запросов в секунду на один хост (0 — без ограничения)
+HTTP_HOST_RATE = float(os.getenv("UPSTREAM_HTTP_HOST_RATE", "20"))
+HTTP_RETRIES = int(os.getenv("UPSTREAM_HTTP_RETRIES", "2"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("UPSTREAM_HTTP_BACKOFF_SECONDS", "0.5"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_HTTP_TIMEOUT_SECONDS", "30"))
+
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class _HostRateLimiter:
+    """Spaces request starts to at most ``rate`` per second."""
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self._interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class _LoopState:
+    def __init__(self, client: httpx.AsyncClient, concurrency: int) -> None:
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiters: Dict[str, _HostRateLimiter] = {}
+
+
+class AsyncJSONFetcher:
+    """Pooled, rate-limited and retrying ``GET -> JSON`` fetcher."""
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = HTTP_CONCURRENCY,
+        host_rate: float = HTTP_HOST_RATE,
+        retries: int = HTTP_RETRIES,
+        backoff: float = HTTP_BACKOFF_SECONDS,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.host_rate = host_rate
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.timeout = timeout
+        self._transport = transport
+        # Клиент и примитивы asyncio привязаны к циклу событий, поэтому храним их по циклу.
+        # Циклы живут в разных потоках (API и asyncio.run лидербордов), отсюда блокировка.
+        self._states: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+        self._states_lock = threading.Lock()
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        with self._states_lock:
+            state = self._states.get(loop)
+            if state is not None:
+                return state
+            for stale_loop in [item for item in self._states if item.is_closed()]:
+                del self._states[stale_loop]
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+                transport=self._transport,
+            )
+            state = _LoopState(client, self.concurrency)
+            self._states[loop] = state
+            return state
+
+    async def get_json(self, url: str, params: Optional[Mapping[str, Any]] = None) -> Any:
+        """Fetch ``url`` and decode JSON; raises ``httpx.HTTPError`` once retries are exhausted."""
+        state = self._state()
+        host = urlsplit(url).netloc
+        limiter = state.limiters.get(host)
+        if limiter is None:
+            limiter = state.limiters[host] = _HostRateLimiter(self.host_rate)
+
+        attempt = 0
+        async with state.semaphore:
+            while True:
+                await limiter.acquire()
+                try:
+                    response = await state.client.get(url, params=params)
+                    if response.status_code not in _RETRY_STATUSES or attempt >= self.retries:
+                        response.raise_for_status()
+                        return response.json()
+                except httpx.TransportError:
+                    if attempt >= self.retries:
+                        raise
+                attempt += 1
+                delay = self.backoff * 2 ** (attempt - 1)
+                logger.debug("Retrying %s in %.2fs (attempt %d)", url, delay, attempt)
+                await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        """Close the client bound to the running loop."""
+        with self._states_lock:
+            state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+
+
+UPSTREAM_HTTP = AsyncJSONFetcher()
@@ -2,23 +2,22 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import timedelta
+from typing import Dict, List
 
 import requests
 
+from src.ttl_cache import TTLCache
+
 COINMARKETCAP_URL = "https://api.coinmarketcap.com/data-api/v3/cryptocurrency/listing"
 CMC_CACHE_TTL = timedelta(minutes=30)
 
 
-@dataclass
-class TokensCache:
-    fetched_at: datetime
-    tokens: List[Dict[str, str]]
-
-
-_tokens_cache: Optional[TokensCache] = None
+_tokens_cache: TTLCache[int, List[Dict[str, str]]] = TTLCache(
+    "coins.top_tokens",
+    ttl=CMC_CACHE_TTL,
+    max_entries=8,
+)
 
 
 def _fetch_top_tokens(limit: int = 100) -> List[Dict[str, str]]:
@@ -42,13 +41,11 @@ def _fetch_top_tokens(limit: int = 100) -> List[Dict[str, str]]:
 
 def get_top_market_tokens(limit: int = 100, force_refresh: bool = False) -> List[Dict[str, str]]:
     """Return list of top market tokens (symbol, name, slug)."""
-    global _tokens_cache
-
-    now = datetime.utcnow()
-
-    if not force_refresh and _tokens_cache and now - _tokens_cache.fetched_at < CMC_CACHE_TTL:
-        return _tokens_cache.tokens
+    if not force_refresh:
+        cached = _tokens_cache.get(limit)
+        if cached is not None:
+            return cached
 
     tokens = _fetch_top_tokens(limit=limit)
-    _tokens_cache = TokensCache(fetched_at=now, tokens=tokens)
+    _tokens_cache.set(limit, tokens)
     return tokens
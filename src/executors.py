@@ -0,0 +1,97 @@
+"""Bounded thread pools for blocking calls made from async handlers.
+
+Each pool has a fixed number of workers plus a small waiting queue; once
+both are full new work is rejected immediately instead of piling up, and
+callers wait at most ``timeout`` seconds for a result. Separate pools keep
+one slow upstream from starving the others and never block the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when a bounded executor has no free worker or queue slot."""
+
+
+class BoundedExecutor:
+    """Thread pool with admission control and per-call timeouts."""
+
+    def __init__(self, name: str, *, max_workers: int, max_pending: int, timeout: float) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def _release(self, _: Future[Any]) -> None:
+        with self._lock:
+            self._active -= 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> T:
+        """Run ``fn`` in the pool and await it.
+
+        Raises ``ExecutorBusyError`` when the pool and its queue are full and
+        ``asyncio.TimeoutError`` when the call outlives ``timeout``. A timed-out
+        call keeps its slot until the thread actually finishes.
+        """
+        with self._lock:
+            if self._active >= self.max_workers + self.max_pending:
+                self._rejected += 1
+                raise ExecutorBusyError(f"{self.name}: too many requests in flight")
+            self._active += 1
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._active -= 1
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "active": self._active,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+
+# Токены (CoinMarketCap) и аналитика живут в разных пулах, чтобы не блокировать друг друга
+TOKENS_EXECUTOR = BoundedExecutor(
+    "tokens-io",
+    max_workers=int(os.getenv("TOKENS_EXECUTOR_WORKERS", "4")),
+    max_pending=int(os.getenv("TOKENS_EXECUTOR_MAX_PENDING", "16")),
+    timeout=float(os.getenv("TOKENS_EXECUTOR_TIMEOUT_SECONDS", "25")),
+)
+ANALYTICS_EXECUTOR = BoundedExecutor(
+    "analytics-io",
+    max_workers=int(os.getenv("ANALYTICS_EXECUTOR_WORKERS", "4")),
+    max_pending=int(os.getenv("ANALYTICS_EXECUTOR_MAX_PENDING", "16")),
+    timeout=float(os.getenv("ANALYTICS_EXECUTOR_TIMEOUT_SECONDS", "45")),
+)
+
+
+def executor_stats() -> List[Dict[str, Any]]:
+    return [executor.stats() for executor in (TOKENS_EXECUTOR, ANALYTICS_EXECUTOR)]
@@ -0,0 +1,243 @@
+"""Precomputed new-pool leaderboards for ``/analytics/new-pools``.
+
+After every pool index generation a background thread enriches all new-pool
+candidates of the top-100 token universe for each period (charts are fetched
+once, for the widest period) and keeps them pre-sorted by every sort key.
+Requests are then answered by filtering and slicing these tables instead of
+recomputing candidates, charts and momentum.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from src import analytics
+from src.async_http import UPSTREAM_HTTP
+from src.pool_index import MIN_TVL_USD as INDEX_MIN_TVL_USD
+from src.pool_index import POOL_INDEX, PoolGeneration, PoolIndex
+from src.pool_store import PoolStore
+from src.utils.tokens import normalize_pair
+
+logger = logging.getLogger(__name__)
+
+# Старше этого таблицы не отдаются, запрос уходит в живой расчёт
+LEADERBOARD_MAX_AGE = timedelta(minutes=30)
+UNIVERSE_SIZE = 100
+
+
+@dataclass(frozen=True)
+class _Entry:
+    item: Dict[str, Any]
+    tokens: FrozenSet[str]
+    chain: str
+    tvl: float
+    group: Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class Leaderboards:
+    """Enriched new pools per period with their order for every sort key."""
+
+    generation: int
+    built_at: datetime
+    universe: FrozenSet[str]
+    entries: Dict[int, List[_Entry]]
+    # (period days, sort key) -> entry positions, best first
+    orders: Dict[Tuple[int, str], List[int]]
+
+    def query(
+        self,
+        days: int,
+        *,
+        min_tvl: float,
+        symbols: Sequence[str],
+        chains: Sequence[str],
+        sort: str,
+        limit: int,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Return the top ``limit`` pools passing the filters and the number that passed."""
+        entries = self.entries[days]
+        wanted = set(symbols)
+        wanted_chains = {chain.lower() for chain in chains}
+
+        # Как и в живом расчёте, из пулов одного (project, pair) остаётся самый крупный прошедший фильтры.
+        best: Dict[Tuple[str, str], int] = {}
+        for position, entry in enumerate(entries):
+            if entry.tvl < min_tvl or not entry.tokens & wanted:
+                continue
+            if wanted_chains and entry.chain not in wanted_chains:
+                continue
+            current = best.get(entry.group)
+            if current is None or entry.tvl > entries[current].tvl:
+                best[entry.group] = position
+
+        winners = set(best.values())
+        order = self.orders.get((days, sort)) or self.orders[(days, "momentum")]
+        ranked = [entries[position].item for position in order if position in winners]
+        return ranked[:limit], len(ranked)
+
+
+def _fetch_charts_blocking(pool_ids: Sequence[str]) -> Dict[str, analytics.ChartSeries]:
+    async def run() -> Dict[str, analytics.ChartSeries]:
+        try:
+            return await analytics.fetch_charts(pool_ids)
+        finally:
+            await UPSTREAM_HTTP.aclose()
+
+    return asyncio.run(run())
+
+
+def build_leaderboards(store: PoolStore, generation: int, universe: Sequence[str]) -> Leaderboards:
+    """Enrich every new pool of ``universe`` in ``store`` and sort it for each period and key."""
+    widest = max(analytics.PERIODS.values())
+    count = store.columns["count"]
+    rows = store.filter(
+        sorted({row for symbol in universe for row in store.rows_for_token(symbol)}),
+        predicate=lambda row: count[row] <= widest + 1,
+    )
+    charts = _fetch_charts_blocking([pool_id for row in rows if (pool_id := store.record(row).get("pool"))])
+
+    entries: Dict[int, List[_Entry]] = {}
+    orders: Dict[Tuple[int, str], List[int]] = {}
+    for days in analytics.PERIODS.values():
+        period_entries: List[_Entry] = []
+        for row in rows:
+            if not count[row] <= days + 1:
+                continue
+            pool = store.record(row)
+            chart = charts.get(pool.get("pool") or "")
+            item = analytics.enrich_pool(pool, chart, days) if chart is not None else None
+            if not item:
+                continue
+            period_entries.append(
+                _Entry(
+                    item=item,
+                    tokens=frozenset(store.tokens[row]),
+                    chain=store.chain(row).lower(),
+                    tvl=store.tvl[row],
+                    group=(store.project(row), normalize_pair(pool.get("symbol") or "")),
+                )
+            )
+        entries[days] = period_entries
+        for sort_key in analytics.SORT_FIELDS:
+            orders[(days, sort_key)] = sorted(
+                range(len(period_entries)),
+                key=lambda position: analytics.sort_value(period_entries[position].item, sort_key),
+                reverse=True,
+            )
+
+    return Leaderboards(
+        generation=generation,
+        built_at=datetime.now(timezone.utc),
+        universe=frozenset(universe),
+        entries=entries,
+        orders=orders,
+    )
+
+
+class NewPoolLeaderboards:
+    """Rebuilds leaderboards in the background whenever the pool index changes."""
+
+    def __init__(self, index: PoolIndex = POOL_INDEX) -> None:
+        self._index = index
+        self._lock = threading.Lock()
+        self._started = False
+        self._building = False
+        self._pending: Optional[PoolGeneration] = None
+        self._current: Optional[Leaderboards] = None
+        self._last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Subscribe to index generations; safe to call more than once."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._index.add_listener(self.schedule)
+
+    def schedule(self, generation: PoolGeneration) -> None:
+        # Пока идёт сборка, копим только последнюю генерацию
+        with self._lock:
+            self._pending = generation
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._run, name="new-pool-leaderboards", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                generation = self._pending
+                self._pending = None
+                if generation is None:
+                    self._building = False
+                    return
+            self.rebuild(generation)
+
+    def rebuild(self, generation: PoolGeneration) -> None:
+        try:
+            universe = [token["symbol"].upper() for token in analytics.get_top_market_tokens(limit=UNIVERSE_SIZE)]
+            self._current = build_leaderboards(generation.store, generation.number, universe)
+            self._last_error = None
+        except Exception as exc:  # noqa: BLE001 - keep serving the previous tables
+            logger.warning("New-pool leaderboards rebuild failed: %s", exc)
+            self._last_error = str(exc)
+
+    def current(self) -> Optional[Leaderboards]:
+        boards = self._current
+        if boards is None or datetime.now(timezone.utc) - boards.built_at > LEADERBOARD_MAX_AGE:
+            return None
+        return boards
+
+    def query(
+        self,
+        period: str = "7d",
+        *,
+        min_tvl: float = 5_000_000,
+        symbols: Sequence[str] = (),
+        chains: Sequence[str] = (),
+        sort: str = "momentum",
+        limit: int = 50,
+    ) -> Optional[Dict[str, Any]]:
+        """Answer a new-pools request from the tables, or ``None`` if they cannot serve it."""
+        boards = self.current()
+        period_key = period.lower()
+        # Пулы ниже порога индекса в таблицы не попали
+        if boards is None or period_key not in analytics.PERIODS or float(min_tvl) < INDEX_MIN_TVL_USD:
+            return None
+
+        requested = [symbol.upper() for symbol in symbols]
+        if not requested:
+            raise ValueError("At least one symbol must be provided")
+        tracked = [symbol for symbol in requested if symbol in boards.universe]
+        if not tracked:
+            raise ValueError("Symbols must be from the top-100 list")
+
+        days = analytics.PERIODS[period_key]
+        pools, total = boards.query(
+            days,
+            min_tvl=float(min_tvl),
+            symbols=tracked,
+            chains=chains,
+            sort=sort.lower(),
+            limit=max(1, min(limit, 200)),
+        )
+        return analytics.new_pools_response(period_key, days, float(min_tvl), symbols, chains, pools, total)
+
+    def status(self) -> Dict[str, Any]:
+        boards = self._current
+        return {
+            "generation": boards.generation if boards else 0,
+            "built_at": boards.built_at.isoformat() if boards else None,
+            "pools": {days: len(items) for days, items in boards.entries.items()} if boards else {},
+            "building": self._building,
+            "last_error": self._last_error,
+        }
+
+
+NEW_POOL_LEADERBOARDS = NewPoolLeaderboards()
@@ -2,65 +2,234 @@
 
 from __future__ import annotations
 
+import contextlib
+import logging
+import os
+import tempfile
 import threading
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Iterable, List
+from typing import Any, Callable, Dict, List, Optional
 
 import requests
 
-from src.utils.tokens import classify_pair, contains_wrapper, normalize_pair, parse_tokens
+from src.pool_store import PoolStore
+from src.protocols import PROTOCOL_DIRECTORY
+
+logger = logging.getLogger(__name__)
 
 POOLS_URL = "https://yields.llama.fi/pools"
 INDEX_TTL = timedelta(minutes=5)  # Более частое обновление индекса пулов
+# Пауза перед повторной попыткой после неудачного обновления
+REFRESH_RETRY_BACKOFF = timedelta(seconds=30)
 
 # Минимальный TVL для рассмотрения стратегий (в USD)
 MIN_TVL_USD = 1_000_000
 
+# Снимок последней генерации на диске для быстрого тёплого старта
+POOL_INDEX_SNAPSHOT_PATH = os.getenv(
+    "POOL_INDEX_SNAPSHOT_PATH",
+    os.path.join(tempfile.gettempdir(), "defi-apy-agent", "pool_index.bin"),
+)
+SNAPSHOT_MAX_AGE = timedelta(hours=24)
+
+
+@dataclass(frozen=True)
+class PoolGeneration:
+    """Immutable, fully built snapshot of the pools index."""
+
+    number: int
+    built_at: datetime
+    store: PoolStore
+    source: str = "upstream"
+
+
+def _download_pools() -> List[Dict[str, Any]]:
+    response = requests.get(POOLS_URL, timeout=30)
+    response.raise_for_status()
+    payload = response.json()
+    pools = payload.get("data", []) if isinstance(payload, dict) else []
+    return [pool for pool in pools if isinstance(pool, dict)]
+
 
 class PoolIndex:
-    def __init__(self) -> None:
+    """Double-buffered pools index with stale-while-revalidate refreshes.
+
+    Readers always see the current generation without taking a lock. Once it
+    is older than ``INDEX_TTL`` a background thread builds the next generation
+    and swaps it in; a failed refresh keeps the previous generation serving.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = POOL_INDEX_SNAPSHOT_PATH) -> None:
+        self._snapshot_path = snapshot_path
         self._lock = threading.Lock()
-        self._data: Dict[str, List[Dict[str, object]]] = {}
-        self._timestamp: datetime | None = None
+        self._refresh_lock = threading.Lock()
+        self._generation: Optional[PoolGeneration] = None
+        self._refreshing = False
+        self._last_error: Optional[str] = None
+        self._last_error_at: Optional[datetime] = None
+        self._listeners: List[Callable[[PoolGeneration], None]] = []
+
+    def add_listener(self, listener: Callable[[PoolGeneration], None]) -> None:
+        """Call ``listener`` with every generation swapped in after registration."""
+        with self._lock:
+            self._listeners.append(listener)
 
-    def ensure_loaded(self, force: bool = False) -> None:
+    def _install(self, generation: PoolGeneration) -> None:
+        self._generation = generation
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(generation)
+            except Exception as exc:  # noqa: BLE001 - a listener must not break the refresh
+                logger.warning("Pool index listener failed: %s", exc)
+
+    def _is_stale(self, generation: Optional[PoolGeneration]) -> bool:
+        return generation is None or datetime.utcnow() - generation.built_at >= INDEX_TTL
+
+    def _in_backoff(self) -> bool:
+        return self._last_error_at is not None and datetime.utcnow() - self._last_error_at < REFRESH_RETRY_BACKOFF
+
+    def _rebuild(self) -> None:
+        """Build the next generation and swap it in; caller holds ``_refresh_lock``."""
+        try:
+            pools = _download_pools()
+            # Фильтруем по минимальному TVL
+            store = PoolStore.from_pools(pools, min_tvl=MIN_TVL_USD)
+            # Строим поисковый индекс до подмены генерации, а не в запросе.
+            store.search_index()
+        except Exception as exc:  # noqa: BLE001 - keep serving the previous generation
+            logger.warning("Pool index refresh failed: %s", exc)
+            self._last_error = str(exc)
+            self._last_error_at = datetime.utcnow()
+            return
+
+        previous = self._generation
+        generation = PoolGeneration(
+            number=(previous.number + 1) if previous else 1,
+            built_at=datetime.utcnow(),
+            store=store,
+        )
+        self._last_error = None
+        self._last_error_at = None
+        self._install(generation)
+        self._write_snapshot(generation)
+
+    def _write_snapshot(self, generation: PoolGeneration) -> None:
+        if not self._snapshot_path:
+            return
+        meta = {"number": generation.number, "built_at": generation.built_at.isoformat()}
+        directory = os.path.dirname(self._snapshot_path) or "."
+        tmp_path: Optional[str] = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Уникальный временный файл: снимок по тому же пути пишут и соседние процессы
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".pool_index.", suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(generation.store.encode(meta))
+            os.replace(tmp_path, self._snapshot_path)
+        except OSError as exc:
+            logger.warning("Failed to persist pool index snapshot: %s", exc)
+            if tmp_path is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+
+    def _load_snapshot(self) -> bool:
+        """Install the on-disk generation if present and recent; caller holds ``_refresh_lock``."""
+        if not self._snapshot_path:
+            return False
+        try:
+            with open(self._snapshot_path, "rb") as handle:
+                store, meta = PoolStore.decode(handle.read())
+            built_at = datetime.fromisoformat(meta["built_at"])
+            number = int(meta.get("number") or 1)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Ignoring unreadable pool index snapshot: %s", exc)
+            return False
+
+        if datetime.utcnow() - built_at > SNAPSHOT_MAX_AGE:
+            return False
+        self._install(PoolGeneration(number=number, built_at=built_at, store=store, source="snapshot"))
+        # Триграммный индекс строится дольше, чем читается снимок: не держим им старт,
+        # а строим в фоне (поиск, пришедший раньше, дождётся его через search_index)
+        threading.Thread(target=store.search_index, name="pool-index-search", daemon=True).start()
+        return True
+
+    def _refresh_in_background(self) -> None:
+        try:
+            with self._refresh_lock:
+                self._rebuild()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _schedule_refresh(self) -> None:
         with self._lock:
-            if not force and self._timestamp and datetime.utcnow() - self._timestamp < INDEX_TTL:
+            if self._refreshing:
                 return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, name="pool-index-refresh", daemon=True).start()
 
-            response = requests.get(POOLS_URL, timeout=30)
-            response.raise_for_status()
-            payload = response.json()
-            pools = payload.get("data", []) if isinstance(payload, dict) else []
-
-            new_index: Dict[str, List[Dict[str, object]]] = {}
-            for pool in pools:
-                # Фильтруем по минимальному TVL
-                tvl_usd = float(pool.get("tvlUsd") or pool.get("tvl_usd") or 0.0)
-                if tvl_usd < MIN_TVL_USD:
-                    continue
-                
-                symbol = pool.get("symbol") or ""
-                tokens = parse_tokens(symbol)
-                category = classify_pair(tokens)
-                wrapper_flag = contains_wrapper(tokens)
-                normalized = normalize_pair(symbol)
-
-                entry = dict(pool)
-                entry["tokens"] = tokens
-                entry["category"] = category
-                entry["contains_wrapper"] = wrapper_flag
-                entry["pair"] = normalized
-
-                for token in tokens:
-                    new_index.setdefault(token, []).append(entry)
-
-            self._data = new_index
-            self._timestamp = datetime.utcnow()
+    def ensure_loaded(self, force: bool = False) -> None:
+        if force:
+            with self._refresh_lock:
+                self._rebuild()
+            return
+
+        generation = self._generation
+        if generation is None:
+            # Холодный старт: ждём первую генерацию, но не чаще раза в REFRESH_RETRY_BACKOFF.
+            if self._in_backoff():
+                return
+            with self._refresh_lock:
+                if self._generation is not None:
+                    return
+                # Сначала пробуем снимок с диска, свежие данные подтянутся в фоне.
+                if not self._load_snapshot():
+                    if not self._in_backoff():
+                        self._rebuild()
+                    return
+            generation = self._generation
+
+        if self._is_stale(generation) and not self._in_backoff():
+            self._schedule_refresh()
+
+    def get_store(self) -> Optional[PoolStore]:
+        """Return the column store of the current generation, loading it if needed."""
+        self.ensure_loaded()
+        generation = self._generation
+        return generation.store if generation else None
 
-    def get_pools(self, token: str) -> List[Dict[str, object]]:
+    def current_generation(self) -> Optional[PoolGeneration]:
+        """Return the current generation, loading it if needed."""
         self.ensure_loaded()
-        return list(self._data.get(token.upper(), []))
+        return self._generation
+
+    def get_pools(self, token: str) -> List[Dict[str, object]]:
+        store = self.get_store()
+        if store is None:
+            return []
+        return [store.materialize(row) for row in store.rows_for_token(token)]
+
+    def status(self) -> Dict[str, Any]:
+        """Return the current generation number, its age and the last refresh error."""
+        generation = self._generation
+        now = datetime.utcnow()
+        return {
+            "generation": generation.number if generation else 0,
+            "built_at": generation.built_at.isoformat() if generation else None,
+            "age_seconds": round((now - generation.built_at).total_seconds(), 3) if generation else None,
+            "pools": len(generation.store) if generation else 0,
+            "tokens": len(generation.store.token_rows) if generation else 0,
+            "source": generation.source if generation else None,
+            "stale": self._is_stale(generation),
+            "refreshing": self._refreshing,
+            "last_error": self._last_error,
+            "last_error_at": self._last_error_at.isoformat() if self._last_error_at else None,
+        }
 
 
 POOL_INDEX = PoolIndex()
@@ -69,6 +238,7 @@ POOL_INDEX = PoolIndex()
 def start_preload_index() -> None:
     def worker() -> None:
         try:
+            PROTOCOL_DIRECTORY.start()
             POOL_INDEX.ensure_loaded()
         except Exception:
             pass
@@ -0,0 +1,316 @@
+"""Columnar storage for DeFiLlama pools.
+
+Numeric fields are parsed once into typed ``array`` columns, string fields
+with few distinct values (chain, project, category) are interned into integer
+codes, and a token -> row-ids mapping replaces per-token lists of dict copies.
+Consumers filter and rank by row id and only touch the raw pool dict for the
+rows they actually return.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.token_search import TokenSearchIndex
+from src.utils.tokens import (
+    classify_pair,
+    contains_wrapper,
+    normalize_pair,
+    parse_tokens,
+)
+
+# (column name, pool payload key)
+FLOAT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("tvl", "tvlUsd"),
+    ("apy", "apy"),
+    ("apy_base", "apyBase"),
+    ("apy_reward", "apyReward"),
+    ("apy_pct_7d", "apyPct7D"),
+    ("apy_pct_30d", "apyPct30D"),
+    # Число точек истории пула у DeFiLlama, т.е. примерный возраст в днях
+    ("count", "count"),
+)
+
+MISSING = math.nan
+
+SNAPSHOT_MAGIC = b"PSTORE"
+SNAPSHOT_VERSION = 2
+# magic, format version, header length
+_SNAPSHOT_PREFIX = struct.Struct("<6sHI")
+
+
+def _to_float(value: Any) -> float:
+    if value is None:
+        return MISSING
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+class _Interner:
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class PoolStore:
+    """Immutable column store built once per pools payload."""
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+        self.tokens: List[Tuple[str, ...]] = []
+        self.columns: Dict[str, array] = {name: array("d") for name, _ in FLOAT_COLUMNS}
+        self.chain_codes = array("i")
+        self.project_codes = array("i")
+        self.category_codes = array("i")
+        self.wrapper_flags = array("b")
+        self.chains = _Interner()
+        self.projects = _Interner()
+        self.categories = _Interner()
+        self.token_rows: Dict[str, array] = {}
+        self._search_index: Optional[TokenSearchIndex] = None
+        self._search_lock = threading.Lock()
+
+    @classmethod
+    def from_pools(cls, pools: Iterable[Dict[str, Any]], min_tvl: float = 0.0) -> PoolStore:
+        store = cls()
+        for pool in pools:
+            if not isinstance(pool, dict):
+                continue
+            tvl = _to_float(pool.get("tvlUsd") or pool.get("tvl_usd") or 0.0)
+            if min_tvl and not tvl >= min_tvl:
+                continue
+            store._append(pool, tvl)
+        return store
+
+    def _append(self, pool: Dict[str, Any], tvl: float) -> None:
+        row = len(self.records)
+        tokens = tuple(parse_tokens(pool.get("symbol") or ""))
+
+        self.records.append(pool)
+        self.tokens.append(tokens)
+        for name, key in FLOAT_COLUMNS:
+            self.columns[name].append(tvl if name == "tvl" else _to_float(pool.get(key)))
+        self.chain_codes.append(self.chains.code(pool.get("chain") or ""))
+        self.project_codes.append(self.projects.code(pool.get("project") or ""))
+        self.category_codes.append(self.categories.code(classify_pair(tokens)))
+        self.wrapper_flags.append(1 if contains_wrapper(tokens) else 0)
+
+        for token in dict.fromkeys(tokens):
+            self.token_rows.setdefault(token, array("i")).append(row)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _arrays(self) -> Dict[str, array]:
+        arrays: Dict[str, array] = {f"column:{name}": values for name, values in self.columns.items()}
+        arrays["chain_codes"] = self.chain_codes
+        arrays["project_codes"] = self.project_codes
+        arrays["category_codes"] = self.category_codes
+        arrays["wrapper_flags"] = self.wrapper_flags
+        return arrays
+
+    def encode(self, meta: Optional[Dict[str, Any]] = None) -> bytes:
+        """Serialize the store into a compact binary snapshot.
+
+        Typed columns are written as raw array bytes so decoding them is a
+        memcpy; only the raw pool records go through JSON.
+        """
+        token_names = list(self.token_rows)
+        token_offsets = array("i")
+        token_flat = array("i")
+        for name in token_names:
+            token_offsets.append(len(token_flat))
+            token_flat.extend(self.token_rows[name])
+        token_offsets.append(len(token_flat))
+
+        arrays = self._arrays()
+        arrays["token_offsets"] = token_offsets
+        arrays["token_flat"] = token_flat
+
+        blobs: List[bytes] = []
+        sections: Dict[str, List[Any]] = {}
+        offset = 0
+        for name, values in arrays.items():
+            blob = values.tobytes()
+            sections[name] = [values.typecode, values.itemsize, offset, len(blob)]
+            blobs.append(blob)
+            offset += len(blob)
+
+        records_blob = json.dumps(
+            {"records": self.records, "tokens": self.tokens}, separators=(",", ":")
+        ).encode("utf-8")
+        sections["records"] = ["json", 1, offset, len(records_blob)]
+        blobs.append(records_blob)
+
+        header = json.dumps(
+            {
+                "meta": meta or {},
+                "byteorder": sys.byteorder,
+                "rows": len(self.records),
+                "chains": self.chains.values,
+                "projects": self.projects.values,
+                "categories": self.categories.values,
+                "tokens": token_names,
+                "sections": sections,
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+        return b"".join([_SNAPSHOT_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)), header, *blobs])
+
+    @classmethod
+    def decode(cls, data: bytes) -> Tuple[PoolStore, Dict[str, Any]]:
+        """Inverse of :meth:`encode`; raises ``ValueError`` on foreign or corrupt data."""
+        if len(data) < _SNAPSHOT_PREFIX.size:
+            raise ValueError("Snapshot is truncated")
+        magic, version, header_len = _SNAPSHOT_PREFIX.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot format")
+        body_start = _SNAPSHOT_PREFIX.size + header_len
+        header = json.loads(data[_SNAPSHOT_PREFIX.size : body_start])
+        view = memoryview(data)[body_start:]
+
+        def section(name: str) -> memoryview:
+            _, _, offset, length = header["sections"][name]
+            if offset + length > len(view):
+                raise ValueError("Snapshot is truncated")
+            return view[offset : offset + length]
+
+        def load_array(name: str) -> array:
+            typecode, itemsize, _, _ = header["sections"][name]
+            values = array(typecode)
+            if values.itemsize != itemsize:
+                raise ValueError("Snapshot was written on an incompatible platform")
+            values.frombytes(section(name))
+            if header["byteorder"] != sys.byteorder:
+                values.byteswap()
+            return values
+
+        store = cls()
+        body = json.loads(bytes(section("records")))
+        store.records = body["records"]
+        store.tokens = [tuple(tokens) for tokens in body["tokens"]]
+        store.columns = {name: load_array(f"column:{name}") for name, _ in FLOAT_COLUMNS}
+        store.chain_codes = load_array("chain_codes")
+        store.project_codes = load_array("project_codes")
+        store.category_codes = load_array("category_codes")
+        store.wrapper_flags = load_array("wrapper_flags")
+        for interner, values in (
+            (store.chains, header["chains"]),
+            (store.projects, header["projects"]),
+            (store.categories, header["categories"]),
+        ):
+            for value in values:
+                interner.code(value)
+
+        token_offsets = load_array("token_offsets")
+        token_flat = load_array("token_flat")
+        for position, name in enumerate(header["tokens"]):
+            store.token_rows[name] = token_flat[token_offsets[position] : token_offsets[position + 1]]
+
+        if any(len(values) != header["rows"] for values in store._arrays().values()) or len(store.records) != header["rows"]:
+            raise ValueError("Snapshot columns are inconsistent")
+        return store, header["meta"]
+
+    @property
+    def tvl(self) -> array:
+        return self.columns["tvl"]
+
+    @property
+    def apy(self) -> array:
+        return self.columns["apy"]
+
+    def rows_for_token(self, token: str) -> Sequence[int]:
+        return self.token_rows.get(token.upper(), array("i"))
+
+    def search_index(self) -> TokenSearchIndex:
+        """Token search index over this store's rows, built on first use."""
+        index = self._search_index
+        if index is None:
+            with self._search_lock:
+                index = self._search_index
+                if index is None:
+                    index = TokenSearchIndex(self.records)
+                    self._search_index = index
+        return index
+
+    def record(self, row: int) -> Dict[str, Any]:
+        return self.records[row]
+
+    def chain(self, row: int) -> str:
+        return self.chains.values[self.chain_codes[row]]
+
+    def project(self, row: int) -> str:
+        return self.projects.values[self.project_codes[row]]
+
+    def category(self, row: int) -> str:
+        return self.categories.values[self.category_codes[row]]
+
+    def value(self, column: str, row: int) -> Optional[float]:
+        """Return a numeric field or ``None`` when the payload did not have it."""
+        number = self.columns[column][row]
+        return None if math.isnan(number) else number
+
+    def materialize(self, row: int) -> Dict[str, Any]:
+        """Return the pool dict enriched with derived fields, as ``get_pools`` used to."""
+        entry = dict(self.records[row])
+        entry["tokens"] = list(self.tokens[row])
+        entry["category"] = self.category(row)
+        entry["contains_wrapper"] = bool(self.wrapper_flags[row])
+        entry["pair"] = normalize_pair(entry.get("symbol") or "")
+        return entry
+
+    def filter(
+        self,
+        rows: Optional[Iterable[int]] = None,
+        *,
+        min_tvl: Optional[float] = None,
+        min_apy: Optional[float] = None,
+        chains: Sequence[str] = (),
+        exclude_projects: Sequence[str] = (),
+        predicate: Optional[Callable[[int], bool]] = None,
+    ) -> List[int]:
+        """Return row ids passing numeric and interned-code filters."""
+        candidates: Iterable[int] = range(len(self.records)) if rows is None else rows
+        tvl = self.columns["tvl"]
+        apy = self.columns["apy"]
+
+        chain_filter: Optional[set[int]] = None
+        if chains:
+            wanted = {name.lower() for name in chains}
+            chain_filter = {code for code, name in enumerate(self.chains.values) if name.lower() in wanted}
+        excluded: set[int] = set()
+        if exclude_projects:
+            unwanted = {name.lower() for name in exclude_projects}
+            excluded = {code for code, name in enumerate(self.projects.values) if name.lower() in unwanted}
+
+        result: List[int] = []
+        for row in candidates:
+            # NaN comparisons are False, so missing values never pass a minimum.
+            if min_tvl is not None and not tvl[row] >= min_tvl:
+                continue
+            if min_apy is not None and not apy[row] >= min_apy:
+                continue
+            if chain_filter is not None and self.chain_codes[row] not in chain_filter:
+                continue
+            if excluded and self.project_codes[row] in excluded:
+                continue
+            if predicate is not None and not predicate(row):
+                continue
+            result.append(row)
+        return result
@@ -0,0 +1,235 @@
+"""Shared directory of DeFiLlama protocol metadata (site URL, logo, symbol).
+
+The whole ``/protocols`` listing is loaded once (or restored from a local
+snapshot when the API is unreachable) into a slug index, so callers resolve
+protocol links with a dictionary lookup instead of one HTTP call per project.
+Lookups never touch the network: the listing is preloaded at startup and
+refreshed by a background thread every ``PROTOCOLS_TTL`` (sooner, after
+``PROTOCOLS_RETRY_BACKOFF``, when a refresh fails).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+PROTOCOLS_URL = os.getenv("DEFILLAMA_PROTOCOLS_URL", "https://api.llama.fi/protocols")
+PROTOCOLS_TTL = timedelta(hours=6)
+# Пауза перед повторной попыткой после неудачной загрузки списка
+PROTOCOLS_RETRY_BACKOFF = timedelta(minutes=1)
+PROTOCOLS_SNAPSHOT_PATH = os.getenv(
+    "PROTOCOLS_SNAPSHOT_PATH",
+    os.path.join(tempfile.gettempdir(), "defi-apy-agent", "defillama_protocols.json"),
+)
+
+
+@dataclass(frozen=True)
+class ProtocolMeta:
+    slug: str
+    name: Optional[str]
+    url: Optional[str]
+    logo: Optional[str]
+    symbol: Optional[str]
+
+
+def _build_index(items: List[Dict[str, Any]]) -> Dict[str, ProtocolMeta]:
+    index: Dict[str, ProtocolMeta] = {}
+    aliases: Dict[str, ProtocolMeta] = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        slug = (item.get("slug") or item.get("name") or "").strip().lower()
+        if not slug:
+            continue
+        name = item.get("name")
+        symbol = item.get("symbol")
+        meta = ProtocolMeta(
+            slug=slug,
+            name=name,
+            url=item.get("url") or None,
+            logo=item.get("logo") or None,
+            symbol=symbol if symbol and symbol != "-" else None,
+        )
+        index[slug] = meta
+        if name:
+            aliases.setdefault(name.strip().lower(), meta)
+
+    # Slugs win over display names when both collide.
+    for alias, meta in aliases.items():
+        index.setdefault(alias, meta)
+    return index
+
+
+class ProtocolDirectory:
+    def __init__(self, snapshot_path: Optional[str] = PROTOCOLS_SNAPSHOT_PATH) -> None:
+        # ``_lock`` only guards swapping the index; ``_fetch_lock`` serializes the slow loads
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._data: Dict[str, ProtocolMeta] = {}
+        self._timestamp: datetime | None = None
+        self._last_error_at: datetime | None = None
+        self._snapshot_path = snapshot_path
+        self._timer: Optional[threading.Thread] = None
+
+    def _is_fresh(self) -> bool:
+        return self._timestamp is not None and datetime.utcnow() - self._timestamp < PROTOCOLS_TTL
+
+    def _in_backoff(self) -> bool:
+        return self._last_error_at is not None and datetime.utcnow() - self._last_error_at < PROTOCOLS_RETRY_BACKOFF
+
+    def _fetch(self) -> Optional[List[Dict[str, Any]]]:
+        try:
+            response = requests.get(PROTOCOLS_URL, timeout=30)
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            logger.warning("Failed to load protocol listing: %s", exc)
+            return None
+        return payload if isinstance(payload, list) else None
+
+    def _read_snapshot(self) -> Optional[List[Dict[str, Any]]]:
+        if not self._snapshot_path:
+            return None
+        try:
+            with open(self._snapshot_path, encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        return payload if isinstance(payload, list) else None
+
+    def _write_snapshot(self, items: List[Dict[str, Any]]) -> None:
+        if not self._snapshot_path:
+            return
+        # Keep only the fields the index needs; the raw listing is several MB.
+        compact = [
+            {key: item.get(key) for key in ("slug", "name", "url", "logo", "symbol")}
+            for item in items
+            if isinstance(item, dict)
+        ]
+        directory = os.path.dirname(self._snapshot_path) or "."
+        tmp_path: Optional[str] = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Уникальный временный файл: снимок по тому же пути пишут и соседние процессы
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".protocols.", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(compact, handle)
+            os.replace(tmp_path, self._snapshot_path)
+        except OSError as exc:
+            logger.warning("Failed to persist protocol listing: %s", exc)
+            if tmp_path is not None:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+
+    def _refresh(self) -> None:
+        """Fetch the listing and swap the index in; caller holds ``_fetch_lock``."""
+        # Сеть и разбор идут без ``_lock``: читатели в это время видят прежний индекс
+        items = self._fetch()
+        if items is not None:
+            self._write_snapshot(items)
+            index = _build_index(items)
+            with self._lock:
+                self._data = index
+                self._timestamp = datetime.utcnow()
+                self._last_error_at = None
+            return
+
+        # Без сети поднимаем снимок с диска, но свежим его не считаем — повторим после паузы
+        snapshot = self._read_snapshot() if not self._data else None
+        index = _build_index(snapshot) if snapshot is not None else None
+        with self._lock:
+            if index is not None and not self._data:
+                self._data = index
+            self._last_error_at = datetime.utcnow()
+
+    def ensure_loaded(self, force: bool = False) -> None:
+        """Load the listing now unless it is fresh (or the last attempt failed moments ago)."""
+        if not force and (self._is_fresh() or self._in_backoff()):
+            return
+
+        with self._fetch_lock:
+            if not force and (self._is_fresh() or self._in_backoff()):
+                return
+            self._refresh()
+
+    def _refresh_in_background(self) -> None:
+        try:
+            if not (self._is_fresh() or self._in_backoff()):
+                self._refresh()
+        finally:
+            self._fetch_lock.release()
+
+    def _schedule_refresh(self) -> None:
+        if self._is_fresh() or self._in_backoff():
+            return
+        # Не ждём: если загрузка уже идёт (в фоне или в ensure_loaded), она и обновит индекс
+        if not self._fetch_lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._refresh_in_background, name="protocols-refresh", daemon=True).start()
+        except BaseException:
+            self._fetch_lock.release()
+            raise
+
+    def _next_refresh_in(self) -> float:
+        if self._last_error_at is not None:
+            due = self._last_error_at + PROTOCOLS_RETRY_BACKOFF
+        elif self._timestamp is not None:
+            due = self._timestamp + PROTOCOLS_TTL
+        else:
+            return 0.0
+        return max((due - datetime.utcnow()).total_seconds(), 0.0)
+
+    def _refresh_forever(self) -> None:
+        while True:
+            try:
+                self.ensure_loaded()
+            except Exception as exc:  # noqa: BLE001 - keep the timer alive
+                logger.warning("Protocol listing refresh failed: %s", exc)
+                time.sleep(PROTOCOLS_RETRY_BACKOFF.total_seconds())
+            time.sleep(max(self._next_refresh_in(), 1.0))
+
+    def start(self) -> None:
+        """Start the background refresh timer (idempotent); the first load happens right away."""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Thread(target=self._refresh_forever, name="protocols-timer", daemon=True)
+        self._timer.start()
+
+    def load(self, items: List[Dict[str, Any]]) -> None:
+        """Replace the index with an already fetched ``/protocols`` listing."""
+        with self._lock:
+            self._data = _build_index(items)
+            self._timestamp = datetime.utcnow()
+            self._last_error_at = None
+
+    def get(self, project: Optional[str]) -> Optional[ProtocolMeta]:
+        if not project:
+            return None
+        # Только память: устаревший список обновится в фоне, запрос его не ждёт
+        self._schedule_refresh()
+        return self._data.get(project.strip().lower())
+
+    def get_url(self, project: Optional[str]) -> Optional[str]:
+        meta = self.get(project)
+        return meta.url if meta else None
+
+    def get_logo(self, project: Optional[str]) -> Optional[str]:
+        meta = self.get(project)
+        return meta.logo if meta else None
+
+
+PROTOCOL_DIRECTORY = ProtocolDirectory()
@@ -0,0 +1,124 @@
+"""Request coalescing for upstream HTTP calls.
+
+Concurrent callers asking for the same upstream resource share a single
+in-flight request: the first caller performs it, the others wait and receive
+the same result (or exception). Nothing is cached after the call completes;
+caching stays with the callers. Coroutine calls are shared the same way,
+across event loops as well, through a ``concurrent.futures.Future``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, TypeVar
+from urllib.parse import urlencode
+
+import requests
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent executions of the same keyed call."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._futures: Dict[str, Future[Any]] = {}
+        self._executed = 0
+        self._shared = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+            else:
+                self._shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore[no-any-return]
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result  # type: ignore[no-any-return]
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Coroutine counterpart of :meth:`do`; callers may run on different event loops."""
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if future is None:
+                future = self._futures[key] = Future()
+                self._executed += 1
+            else:
+                self._shared += 1
+
+        if not leader:
+            # shield: отмена одного ожидающего не должна отменять общий вызов
+            return await asyncio.shield(asyncio.wrap_future(future))  # type: ignore[no-any-return]
+
+        try:
+            result = await fn()
+        except BaseException as exc:
+            with self._lock:
+                self._futures.pop(key, None)
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._futures.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._futures)
+            return {"executed": self._executed, "shared": self._shared, "in_flight": in_flight}
+
+
+UPSTREAM_FLIGHTS = SingleFlight()
+
+
+def flight_key(url: str, params: Optional[Mapping[str, Any]] = None) -> str:
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted((str(key), str(value)) for key, value in params.items()))}"
+
+
+def get_json(url: str, params: Optional[Mapping[str, Any]] = None, timeout: float = 20) -> Any:
+    """``requests.get(...).json()`` coalesced with identical in-flight requests.
+
+    Raises ``requests.RequestException`` (or ``ValueError`` for invalid JSON)
+    to every waiting caller when the shared request fails.
+    """
+
+    def fetch() -> Any:
+        response = requests.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    return UPSTREAM_FLIGHTS.do(flight_key(url, params), fetch)
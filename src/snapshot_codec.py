@@ -0,0 +1,85 @@
+"""Compact binary encoding of the published strategies snapshot.
+
+The collector stores ``{"updated_at", "version", "count", "items"}`` once per
+run and the API downloads it on list requests, so the blob is kept small:
+each item is written as a row of values against a shared field list (one
+list per distinct key set, so the round trip is exact) instead of repeating
+its keys, and the JSON body is zlib-compressed behind a short header naming
+the format. This cuts Redis memory and transfer several times over; decoding
+is not cheaper than plain JSON (decompression plus rebuilding each dict), and
+the API pays it once per snapshot version thanks to its in-process memo.
+Plain JSON snapshots written before this format are still decoded.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, Tuple, Union
+
+SNAPSHOT_MAGIC = b"STRAT"
+FORMAT_VERSION = 1
+CODEC_JSON = 0
+CODEC_ZLIB = 1
+# Снимки, записанные до переименования, несут "columnar/v1"; декодер имя не проверяет
+ENCODING_NAME = "shaped-rows/v1"
+# magic, format version, codec
+_PREFIX = struct.Struct("<5sBB")
+
+
+def encode_snapshot(envelope: Dict[str, Any], *, compress: bool = True) -> bytes:
+    """Encode a snapshot envelope; ``items`` become value rows keyed by a shared field list."""
+    shapes: Dict[Tuple[str, ...], int] = {}
+    rows: List[List[Any]] = []
+    for item in envelope.get("items") or []:
+        shape = tuple(item)
+        index = shapes.setdefault(shape, len(shapes))
+        rows.append([index, *item.values()])
+
+    body = {key: value for key, value in envelope.items() if key != "items"}
+    body["encoding"] = ENCODING_NAME
+    body["shapes"] = [list(shape) for shape in shapes]
+    body["rows"] = rows
+    payload = json.dumps(body, separators=(",", ":")).encode("utf-8")
+    codec = CODEC_ZLIB if compress else CODEC_JSON
+    if compress:
+        payload = zlib.compress(payload, 6)
+    return _PREFIX.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, codec) + payload
+
+
+def decode_snapshot(raw: Union[bytes, str]) -> Dict[str, Any]:
+    """Decode :func:`encode_snapshot` output or a legacy plain-JSON snapshot.
+
+    Raises ``ValueError`` for unknown formats and corrupt data.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if not raw.startswith(SNAPSHOT_MAGIC):
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("Snapshot is not an object")
+        return data
+
+    if len(raw) < _PREFIX.size:
+        raise ValueError("Snapshot is truncated")
+    _, version, codec = _PREFIX.unpack_from(raw)
+    if version != FORMAT_VERSION or codec not in (CODEC_JSON, CODEC_ZLIB):
+        raise ValueError(f"Unsupported snapshot format {version}/{codec}")
+    payload = raw[_PREFIX.size :]
+    if codec == CODEC_ZLIB:
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as exc:
+            raise ValueError(f"Corrupt snapshot: {exc}") from exc
+
+    try:
+        body = json.loads(payload)
+        shapes = body.pop("shapes")
+        rows = body.pop("rows")
+        body.pop("encoding", None)
+        body["items"] = [dict(zip(shapes[row[0]], row[1:])) for row in rows]
+    except (KeyError, IndexError, TypeError, AttributeError) as exc:
+        # Тело без shapes/rows или строки со ссылкой мимо shapes — тоже повреждённый снимок
+        raise ValueError(f"Corrupt snapshot: {exc!r}") from exc
+    return body
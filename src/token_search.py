@@ -0,0 +1,91 @@
+"""Inverted index for matching free-form token queries against pools.
+
+A pool matches a query part when the part is a substring of its symbol,
+pool id, project or one of its underlying token addresses (the rule the
+linear ``_token_matches`` scan used to implement). Every row's searchable
+fields are indexed once by character trigrams, so a query resolves to
+posting-list intersections plus a verification pass over the few surviving
+candidates; multi-part queries (``"ETH, USDC"``) intersect the per-part sets.
+"""
+
+from __future__ import annotations
+
+import re
+from array import array
+from typing import Any, Dict, List, Sequence, Set
+
+NGRAM_SIZE = 3
+# Separator between fields of a row; it never appears in a normalized query part.
+_FIELD_SEPARATOR = "\x00"
+
+
+def normalize_search_tokens(query: str) -> List[str]:
+    raw_parts = re.split(r"[,\s/|]+", query.upper())
+    return [part for part in raw_parts if part]
+
+
+def _searchable_text(pool: Dict[str, Any]) -> str:
+    fields = [
+        pool.get("symbol") or "",
+        pool.get("pool") or "",
+        pool.get("project") or "",
+        *(str(item) for item in (pool.get("underlyingTokens") or []) if item),
+    ]
+    return _FIELD_SEPARATOR.join(field.upper() for field in fields)
+
+
+def _ngrams(text: str) -> Set[str]:
+    grams: Set[str] = set()
+    for field in text.split(_FIELD_SEPARATOR):
+        for start in range(len(field) - NGRAM_SIZE + 1):
+            grams.add(field[start : start + NGRAM_SIZE])
+    return grams
+
+
+class TokenSearchIndex:
+    """Trigram postings over the searchable fields of a list of pools."""
+
+    def __init__(self, records: Sequence[Dict[str, Any]]) -> None:
+        self._texts: List[str] = []
+        self._postings: Dict[str, array] = {}
+        for row, pool in enumerate(records):
+            text = _searchable_text(pool)
+            self._texts.append(text)
+            for gram in _ngrams(text):
+                self._postings.setdefault(gram, array("i")).append(row)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def _match_part(self, part: str) -> Set[int]:
+        if len(part) < NGRAM_SIZE:
+            # Too short for trigram postings; a scan over pre-normalized text is still cheap.
+            return {row for row, text in enumerate(self._texts) if part in text}
+
+        grams = {part[start : start + NGRAM_SIZE] for start in range(len(part) - NGRAM_SIZE + 1)}
+        postings = sorted((self._postings.get(gram) for gram in grams), key=lambda rows: len(rows) if rows else 0)
+        if not postings[0]:
+            return set()
+
+        candidates = set(postings[0])
+        for rows in postings[1:]:
+            candidates.intersection_update(rows or ())
+            if not candidates:
+                return candidates
+        # Trigrams may come from different fields or positions, so confirm the substring.
+        return {row for row in candidates if part in self._texts[row]}
+
+    def match(self, query: str) -> Set[int]:
+        """Return row ids whose fields contain every part of ``query``."""
+        parts = normalize_search_tokens(query)
+        if not parts:
+            return set()
+
+        result: Set[int] | None = None
+        # Longer parts have shorter postings, so start with them.
+        for part in sorted(set(parts), key=len, reverse=True):
+            rows = self._match_part(part)
+            result = rows if result is None else result & rows
+            if not result:
+                return set()
+        return result or set()
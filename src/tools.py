@@ -2,19 +2,23 @@
 
 from __future__ import annotations
 
+import heapq
 import re
-from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import requests
 
 from src.pool_index import POOL_INDEX
+from src.pool_store import PoolStore
+from src.protocols import PROTOCOL_DIRECTORY
+from src.singleflight import get_json
+from src.ttl_cache import TTLCache
 from src.utils.tokens import classify_pair, contains_wrapper, parse_tokens
 
 API_URL = "https://yields.llama.fi/pools"
-PROTOCOL_URL_TMPL = "https://api.llama.fi/protocol/{slug}"
 TOKEN_CACHE_DURATION = timedelta(minutes=2)  # Более частое обновление для поиска новых пулов
+TOKEN_CACHE_MAX_ENTRIES = 512
 
 # Минимальный TVL для рассмотрения стратегий (в USD)
 MIN_TVL_USD = 1_000_000
@@ -30,51 +34,38 @@ class APIError(Exception):
     """Пользовательское исключение для ошибок API."""
 
 
-_project_url_cache: Dict[str, Optional[str]] = {}
+_token_cache: TTLCache[str, Tuple[PoolStore, List[int]]] = TTLCache(
+    "tools.token_pools",
+    ttl=TOKEN_CACHE_DURATION,
+    max_entries=TOKEN_CACHE_MAX_ENTRIES,
+)
 
 
-@dataclass
-class TokenPoolCache:
-    fetched_at: datetime
-    data: List[Dict[str, Any]]
-
-
-_token_cache: Dict[str, TokenPoolCache] = {}
-
-
-def _fetch_pools_for_token(token: str, limit: int) -> List[Dict[str, Any]]:
-    data = POOL_INDEX.get_pools(token)
-    if data:
-        # Фильтруем по минимальному TVL
-        filtered_data = []
-        for pool in data:
-            tvl_usd = float(pool.get("tvlUsd") or pool.get("tvl_usd") or 0.0)
-            if tvl_usd >= MIN_TVL_USD:
-                filtered_data.append(pool)
-        
-        if limit:
-            return filtered_data[:limit]
-        return filtered_data
+def _fetch_pools_for_token(token: str, limit: int) -> Tuple[PoolStore, List[int]]:
+    store = POOL_INDEX.get_store()
+    if store is not None:
+        # Индекс уже отфильтрован по минимальному TVL
+        rows = list(store.rows_for_token(token))
+        if rows:
+            return store, rows[:limit] if limit else rows
 
     def fetch(params: Dict[str, Any]) -> List[Dict[str, Any]]:
         try:
-            response = requests.get(API_URL, params=params, timeout=20)
-            response.raise_for_status()
-            payload = response.json()
+            # Одновременные запросы с теми же параметрами разделяют один вызов DeFiLlama
+            payload = get_json(API_URL, params=params, timeout=20)
             return (payload or {}).get("data", [])
         except requests.RequestException:
             return []
 
+    def as_store(pools: List[Dict[str, Any]]) -> Tuple[PoolStore, List[int]]:
+        fetched = PoolStore.from_pools(pools, min_tvl=MIN_TVL_USD)
+        rows = list(range(len(fetched)))
+        return fetched, rows[:limit] if limit else rows
+
     # Try exact symbol lookup first (fast, small payload)
     exact = fetch({"symbol": token})
     if exact:
-        # Фильтруем по минимальному TVL
-        filtered_exact = []
-        for pool in exact:
-            tvl_usd = float(pool.get("tvlUsd") or pool.get("tvl_usd") or 0.0)
-            if tvl_usd >= MIN_TVL_USD:
-                filtered_exact.append(pool)
-        return filtered_exact[:limit] if limit else filtered_exact
+        return as_store(exact)
 
     # Агрессивный поиск: увеличиваем лимит для поиска большего количества пулов
     search_params: Dict[str, Any] = {"search": token}
@@ -82,107 +73,36 @@ def _fetch_pools_for_token(token: str, limit: int) -> List[Dict[str, Any]]:
         search_params["limit"] = str(limit * 4)  # Увеличиваем в 4 раза для более широкого поиска
     results = fetch(search_params)
 
-    filtered: List[Dict[str, Any]] = []
     token_upper = token.upper()
-    for pool in results:
-        symbol = pool.get("symbol") or ""
-        tokens = parse_tokens(symbol)
-        if token_upper in tokens:
-            # Проверяем минимальный TVL
-            tvl_usd = float(pool.get("tvlUsd") or pool.get("tvl_usd") or 0.0)
-            if tvl_usd >= MIN_TVL_USD:
-                filtered.append(pool)
-                if limit and len(filtered) >= limit:
-                    break
-    return filtered
-
-
-def _ensure_token_cache(token: str, limit: int, force_refresh: bool = False) -> List[Dict[str, Any]]:
-    key = token.upper()
-    now = datetime.utcnow()
-
-    if not force_refresh and key in _token_cache:
-        entry = _token_cache[key]
-        if now - entry.fetched_at < TOKEN_CACHE_DURATION:
-            return entry.data
-
-    data = _fetch_pools_for_token(key, limit)
-    _token_cache[key] = TokenPoolCache(fetched_at=now, data=data)
-    return data
-
-
-def _normalize_search_tokens(token: str) -> List[str]:
-    raw_parts = re.split(r"[,\s/|]+", token.upper())
-    return [part for part in raw_parts if part]
-
+    return as_store([pool for pool in results if token_upper in parse_tokens(pool.get("symbol") or "")])
 
-def _token_matches(pool: Dict[str, Any], token: str) -> bool:
-    """Определяет, относится ли пул к заданному токену."""
-    tokens = _normalize_search_tokens(token)
-    if not tokens:
-        return False
 
-    symbol = (pool.get("symbol") or "").upper()
-    pool_ref = (pool.get("pool") or "").upper()
-    project = (pool.get("project") or "").upper()
-    underlying_tokens = [item.upper() for item in (pool.get("underlyingTokens") or [])]
-
-    def match_single(single: str) -> bool:
-        if single == symbol:
-            return True
-
-        for candidate in _split_symbol_parts(symbol):
-            if candidate == single:
-                return True
-
-        if single in symbol:
-            return True
-
-        if single in pool_ref:
-            return True
-
-        if single in project:
-            return True
+def _ensure_token_cache(token: str, limit: int, force_refresh: bool = False) -> Tuple[PoolStore, List[int]]:
+    key = token.upper()
 
-        if underlying_tokens and any(single in under for under in underlying_tokens):
-            return True
+    if not force_refresh:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            return cached
 
-        return False
+    store, rows = _fetch_pools_for_token(key, limit)
+    _token_cache.set(key, (store, rows))
+    return store, rows
 
-    if len(tokens) == 1:
-        return match_single(tokens[0])
 
-    return all(match_single(part) for part in tokens)
+def _token_rows(
+    token: str, limit: int, force_refresh: bool = False, store: Optional[PoolStore] = None
+) -> Tuple[PoolStore, List[int]]:
+    """Pools of ``token``: from the given index generation if any, else via the token cache."""
+    if store is None:
+        return _ensure_token_cache(token, limit=limit, force_refresh=force_refresh)
+    rows = list(store.rows_for_token(token.upper()))
+    return store, rows[:limit] if limit else rows
 
 
 def _get_protocol_url(project: Optional[str]) -> Optional[str]:
-    """Возвращает ссылку на протокол из API DeFiLlama."""
-    if not project:
-        return None
-
-    slug = project.lower()
-    if slug in _project_url_cache:
-        return _project_url_cache[slug]
-
-    try:
-        response = requests.get(PROTOCOL_URL_TMPL.format(slug=slug), timeout=15)
-        if response.status_code == 200:
-            payload = response.json()
-            url = payload.get("url")
-            _project_url_cache[slug] = url
-            return url
-    except requests.RequestException:
-        pass
-
-    _project_url_cache[slug] = None
-    return None
-
-
-def _split_symbol_parts(value: str) -> Iterable[str]:
-    for part in re.split(r"[-_/()\s]+", value):
-        cleaned = part.strip()
-        if cleaned:
-            yield cleaned
+    """Возвращает ссылку на протокол из справочника протоколов DeFiLlama."""
+    return PROTOCOL_DIRECTORY.get_url(project)
 
 
 def _parse_lockup(meta: Optional[str]) -> Tuple[int, Optional[str]]:
@@ -277,10 +197,10 @@ def _evaluate_risk(pool: Dict[str, Any]) -> Tuple[str, float, List[str]]:
     return level, round(score, 2), reasons
 
 
-def _decorate_pool(pool: Dict[str, Any]) -> Dict[str, Any]:
+def _decorate_pool(pool: Dict[str, Any], risk: Optional[Tuple[str, float, List[str]]] = None) -> Dict[str, Any]:
     """Добавляет производные поля для дальнейшего анализа."""
     lockup_days, lockup_note = _parse_lockup(pool.get("poolMeta"))
-    risk_level, risk_score, risk_reasons = _evaluate_risk(pool)
+    risk_level, risk_score, risk_reasons = risk or _evaluate_risk(pool)
     pool_id = pool.get("pool")
     pool_url = f"https://defillama.com/yields/pool/{pool_id}" if pool_id else None
     protocol_url = _get_protocol_url(pool.get("project"))
@@ -322,84 +242,83 @@ def _decorate_pool(pool: Dict[str, Any]) -> Dict[str, Any]:
 
 def force_refresh_all_pools() -> None:
     """Принудительно обновляет все кэши пулов."""
-    global _token_cache
     _token_cache.clear()  # Очищаем кэш токенов
     POOL_INDEX.ensure_loaded(force=True)  # Принудительно перезагружаем индекс
 
 
-def discover_new_pools(token: str, limit: int = 100, force_refresh: bool = True) -> List[Dict[str, Any]]:
+RankKey = Callable[[float, float, int], Tuple[float, ...]]
+
+
+def _rank_and_decorate(store: PoolStore, rows: List[int], limit: int, rank_key: RankKey) -> List[Dict[str, Any]]:
+    """Ранжирует пулы по числовым полям и декорирует только попавшие в топ-K.
+
+    Ключ сортировки считается из колонок APY/TVL и уровня риска; дорогая
+    декорация (регулярки блокировки, разбор токенов, ссылки на протокол)
+    выполняется лишь для ``limit`` победителей.
+    """
+    scored: List[Tuple[Tuple[float, ...], int, Tuple[str, float, List[str]]]] = []
+    for row in rows:
+        risk = _evaluate_risk(store.record(row))
+        apy = store.value("apy", row) or 0.0
+        key = rank_key(apy, store.tvl[row], RISK_LEVELS.get(risk[0], 3))
+        scored.append((key, row, risk))
+
+    # nsmallest эквивалентен sorted(...)[:limit] (включая стабильность), но без полной сортировки
+    top = heapq.nsmallest(max(limit, 0), scored, key=lambda entry: entry[0])
+    return [_decorate_pool(store.record(row), risk=risk) for _, row, risk in top]
+
+
+def _discovery_rank_key(apy: float, tvl: float, risk_value: int) -> Tuple[float, ...]:
+    # Бонус за высокий APY и TVL
+    apy_bonus = min(apy / 10, 5)  # Бонус до 5 за высокий APY
+    tvl_bonus = min(tvl / 10_000_000, 3)  # Бонус до 3 за высокий TVL
+    risk_penalty = risk_value * 0.5  # Штраф за риск
+
+    discovery_score = apy_bonus + tvl_bonus - risk_penalty
+
+    return (-discovery_score, -apy, -tvl)
+
+
+def _opportunity_rank_key(apy: float, tvl: float, risk_value: int) -> Tuple[float, ...]:
+    # Улучшенная сортировка: приоритет APY, затем TVL, затем риск
+    # Комбинированный скор: APY * log(TVL) / risk
+    tvl_score = max(1, tvl / 1_000_000)  # Нормализуем TVL
+    combined_score = (apy * tvl_score) / max(risk_value, 0.1)
+
+    return (-combined_score, -apy, -tvl, risk_value)
+
+
+def discover_new_pools(
+    token: str, limit: int = 100, force_refresh: bool = True, *, store: Optional[PoolStore] = None
+) -> List[Dict[str, Any]]:
     """Агрессивный поиск новых пулов для заданного токена."""
     # Принудительно обновляем кэш для поиска новых пулов
-    raw_pools = _ensure_token_cache(token, limit=limit * 5, force_refresh=force_refresh)
-    
-    # Ищем все пулы с токеном, включая новые
-    all_pools = []
-    for pool in raw_pools:
-        if not _token_matches(pool, token):
-            continue
-        
-        # Проверяем минимальный TVL
-        tvl_usd = float(pool.get("tvlUsd") or pool.get("tvl_usd") or 0.0)
-        if tvl_usd < MIN_TVL_USD:
-            continue
-            
-        decorated = _decorate_pool(pool)
-        all_pools.append(decorated)
+    store, rows = _token_rows(token, limit * 5, force_refresh, store)
+
+    # Ищем все пулы с токеном, включая новые; TVL проверяем по колонке без разбора словарей
+    hits = store.search_index().match(token)
+    matched = store.filter(rows, min_tvl=MIN_TVL_USD, predicate=hits.__contains__)
 
     # Сортируем по комбинированному скору (APY + TVL + новизна)
-    def discovery_sort_key(item: Dict[str, Any]) -> tuple:
-        apy = float(item.get("apy") or 0)
-        tvl = float(item.get("tvl_usd") or 0)
-        risk_value = RISK_LEVELS.get(item["risk_level"], 3)
-        
-        # Бонус за высокий APY и TVL
-        apy_bonus = min(apy / 10, 5)  # Бонус до 5 за высокий APY
-        tvl_bonus = min(tvl / 10_000_000, 3)  # Бонус до 3 за высокий TVL
-        risk_penalty = risk_value * 0.5  # Штраф за риск
-        
-        discovery_score = apy_bonus + tvl_bonus - risk_penalty
-        
-        return (-discovery_score, -apy, -tvl)
-
-    all_pools.sort(key=discovery_sort_key)
-    return all_pools[:limit]
-
-
-def get_opportunities(token: str, limit: int = 50, force_refresh: bool = False) -> List[Dict[str, Any]]:
-    """Возвращает список лучших возможностей по заданному токену с агрессивным поиском."""
+    return _rank_and_decorate(store, matched, limit, _discovery_rank_key)
+
+
+def get_opportunities(
+    token: str, limit: int = 50, force_refresh: bool = False, *, store: Optional[PoolStore] = None
+) -> List[Dict[str, Any]]:
+    """Возвращает список лучших возможностей по заданному токену с агрессивным поиском.
+
+    С ``store`` пулы берутся из этой генерации индекса, без кэша токенов и запросов к DeFiLlama.
+    """
     # Увеличиваем лимит для более широкого поиска
     search_limit = max(limit * 3, 150)  # Ищем в 3 раза больше пулов
-    raw_pools = _ensure_token_cache(token, limit=search_limit, force_refresh=force_refresh)
-    
-    # Фильтруем по токену и минимальному TVL
-    filtered = []
-    for pool in raw_pools:
-        if not _token_matches(pool, token):
-            continue
-        
-        # Проверяем минимальный TVL
-        tvl_usd = float(pool.get("tvlUsd") or pool.get("tvl_usd") or 0.0)
-        if tvl_usd < MIN_TVL_USD:
-            continue
-            
-        decorated = _decorate_pool(pool)
-        filtered.append(decorated)
-
-    def sort_key(item: Dict[str, Any]) -> tuple:
-        # Улучшенная сортировка: приоритет APY, затем TVL, затем риск
-        apy = float(item.get("apy") or 0)
-        tvl = float(item.get("tvl_usd") or 0)
-        risk_value = RISK_LEVELS.get(item["risk_level"], 3)
-        
-        # Комбинированный скор: APY * log(TVL) / risk
-        tvl_score = max(1, tvl / 1_000_000)  # Нормализуем TVL
-        combined_score = (apy * tvl_score) / max(risk_value, 0.1)
-        
-        return (-combined_score, -apy, -tvl, risk_value)
-
-    filtered.sort(key=sort_key)
-
-    return filtered[:limit]
+    store, rows = _token_rows(token, search_limit, force_refresh, store)
+
+    # Фильтруем по минимальному TVL (колонка) и по токену (пересечение с поисковым индексом)
+    hits = store.search_index().match(token)
+    matched = store.filter(rows, min_tvl=MIN_TVL_USD, predicate=hits.__contains__)
+
+    return _rank_and_decorate(store, matched, limit, _opportunity_rank_key)
 
 
 def analyze_strategies(apy_options: List[Dict[str, Any]], user_prefs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -448,12 +367,13 @@ def analyze_strategies(apy_options: List[Dict[str, Any]], user_prefs: Dict[str,
             trend_bonus = max(min(apy_30d, 5), -5) * 0.02
         return pool["apy"] - risk_penalty + tvl_bonus + trend_bonus
 
-    shortlisted.sort(key=score, reverse=True)
+    # Скор считаем один раз на пул, а не при сортировке и повторно при обогащении
+    scored = sorted(((score(pool), pool) for pool in shortlisted), key=lambda pair: pair[0], reverse=True)
 
     ranked: List[Dict[str, Any]] = []
-    for item in shortlisted:
+    for value, item in scored:
         enriched = item.copy()
-        enriched["score"] = round(score(item), 2)
+        enriched["score"] = round(value, 2)
         ranked.append(enriched)
 
     best = ranked[0].copy()
@@ -0,0 +1,151 @@
+"""Bounded in-process cache with TTL expiry and LRU eviction.
+
+Used for every module-level cache so a long-running API process has bounded
+memory: entries expire after ``ttl``, and once ``max_entries`` or
+``max_weight`` is exceeded the least recently used entries are evicted.
+Each cache registers itself so hit/miss/eviction counters can be reported.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_REGISTRY: "weakref.WeakSet[TTLCache[Any, Any]]" = weakref.WeakSet()
+_REGISTRY_LOCK = threading.Lock()
+
+
+class TTLCache(Generic[K, V]):
+    """Thread-safe mapping with per-entry TTL, LRU order and optional weights."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        ttl: Optional[timedelta] = None,
+        max_entries: Optional[int] = None,
+        max_weight: Optional[int] = None,
+        weigher: Optional[Callable[[V], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self._ttl = ttl.total_seconds() if ttl is not None else None
+        self._max_entries = max_entries
+        self._max_weight = max_weight
+        self._weigher = weigher
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, weight)
+        self._entries: "OrderedDict[K, Tuple[V, Optional[float], int]]" = OrderedDict()
+        self._weight = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+        with _REGISTRY_LOCK:
+            _REGISTRY.add(self)
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            value, expires_at, weight = entry
+            if expires_at is not None and self._clock() >= expires_at:
+                del self._entries[key]
+                self._weight -= weight
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: K, value: V, *, ttl: Optional[timedelta] = None, weight: Optional[int] = None) -> None:
+        ttl_seconds = ttl.total_seconds() if ttl is not None else self._ttl
+        expires_at = self._clock() + ttl_seconds if ttl_seconds is not None else None
+        if weight is None:
+            weight = self._weigher(value) if self._weigher else 1
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._weight -= previous[2]
+            self._entries[key] = (value, expires_at, weight)
+            self._weight += weight
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        while self._entries and (
+            (self._max_entries is not None and len(self._entries) > self._max_entries)
+            or (self._max_weight is not None and self._weight > self._max_weight)
+        ):
+            _, (_, _, weight) = self._entries.popitem(last=False)
+            self._weight -= weight
+            self._evictions += 1
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._weight -= entry[2]
+            return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)  # type: ignore[call-overload]
+            if entry is None:
+                return False
+            expires_at = entry[1]
+            return expires_at is None or self._clock() < expires_at
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "weight": self._weight,
+                "max_entries": self._max_entries,
+                "max_weight": self._max_weight,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    """Return counters for every cache created in this process."""
+    with _REGISTRY_LOCK:
+        caches = sorted(_REGISTRY, key=lambda cache: cache.name)
+    return [cache.stats() for cache in caches]
@@ -1,3 +1,5 @@
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 
 import pytest
@@ -34,20 +36,18 @@ def cache_stub():
             self.tokens_payload = {"tokens": tokens}
 
         async def get_strategy(self, key):
-            entry = self.entries.get(key)
-            if entry is not None:
-                return entry
+            return self.entries.get(key)
+
+        async def get_strategy_item(self, key):
             if self.latest_snapshot:
                 for item in self.latest_snapshot.get("items", []):
                     if item.get("id") == key:
                         return item
             return None
 
-        async def enqueue_refresh(self, payload):
+        async def enqueue_refresh(self, payload, *, staleness_seconds=None):
             self.enqueued.append(payload)
-
-        async def pop_refresh_request(self, timeout: int = 0):
-            return None
+            return True
 
         async def get_latest_strategies(self):
             return self.latest_snapshot
@@ -96,6 +96,20 @@ def test_tokens_endpoint(monkeypatch, cache_stub) -> None:
     assert response.json() == {"tokens": sample_tokens}
 
 
+def test_tokens_endpoint_rejects_when_upstream_pool_is_saturated(monkeypatch, cache_stub) -> None:
+    from src.executors import TOKENS_EXECUTOR, ExecutorBusyError
+
+    client = TestClient(api.app)
+
+    async def busy(*args, **kwargs):
+        raise ExecutorBusyError("tokens-io: too many requests in flight")
+
+    monkeypatch.setattr(TOKENS_EXECUTOR, "run", busy)
+
+    response = client.get("/tokens")
+    assert response.status_code == 503
+
+
 def test_strategy_endpoint_success(cache_stub) -> None:
     client = TestClient(api.app)
 
@@ -157,7 +171,10 @@ def test_new_pools_endpoint(monkeypatch, cache_stub) -> None:
         ],
     }
 
-    monkeypatch.setattr(api, "get_new_pools", lambda *args, **kwargs: payload)
+    async def fake_get_new_pools(*args, **kwargs):
+        return payload
+
+    monkeypatch.setattr(api, "get_new_pools_async", fake_get_new_pools)
 
     response = client.get("/analytics/new-pools?symbols=APT")
     assert response.status_code == 200
@@ -236,16 +253,37 @@ def test_protocols_and_chains(cache_stub) -> None:
 
 
 def test_refresh_endpoint(monkeypatch, cache_stub) -> None:
+    from collector.jobs import CollectionJobs
+    from tests.redis_fakes import LockRedis
+
     client = TestClient(api.app)
+    release = threading.Event()
 
-    def fake_collect():
+    def fake_collect(progress=None):
+        progress("fetch")
+        release.wait(5)
         return {"strategies": 1}
 
+    jobs = CollectionJobs(LockRedis())  # type: ignore[arg-type]
     monkeypatch.setattr("api.routers.aggregator.collect_and_store", fake_collect)
+    monkeypatch.setattr("api.routers.aggregator.COLLECTION_JOBS", jobs)
 
     response = client.get("/refresh")
-    assert response.status_code == 200
-    assert response.json()["details"] == {"strategies": 1}
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    # Повторный вызов присоединяется к идущему сбору
+    again = client.get("/refresh").json()
+    assert again["job_id"] == job_id
+    assert again["attached"] is True
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while (status := client.get(f"/refresh/{job_id}").json())["status"] != "succeeded":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert status["result"] == {"strategies": 1}
+    assert [stage["name"] for stage in status["stages"]] == ["fetch"]
+    assert client.get("/refresh/unknown").status_code == 404
 
 
 def test_strategy_details_endpoint(cache_stub) -> None:
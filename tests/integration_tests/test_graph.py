@@ -63,7 +63,7 @@ def test_agent_recommends_strategy(monkeypatch: pytest.MonkeyPatch) -> None:
         },
     ]
 
-    def fake_get_opportunities(token: str, limit: int = 200, force_refresh: bool = False):
+    def fake_get_opportunities(token: str, limit: int = 200, force_refresh: bool = False, store=None):
         assert token == "ETH"
         return mocked_pools
 
@@ -0,0 +1,64 @@
+"""In-memory Redis stand-ins shared by unit and integration tests."""
+
+import threading
+
+
+class LockRedis:
+    """String keys with NX/TTL bookkeeping and WATCH/MULTI pipelines."""
+
+    def __init__(self) -> None:
+        self.values = {}
+        self.ttls = {}
+        self._lock = threading.Lock()
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            if nx and key in self.values:
+                return None
+            self.values[key] = value
+            self.ttls[key] = ex
+            return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def delete(self, key):
+        self.ttls.pop(key, None)
+        return int(self.values.pop(key, None) is not None)
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return key in self.values
+
+    def pipeline(self):
+        return LockPipeline(self)
+
+
+class LockPipeline:
+    def __init__(self, redis: LockRedis) -> None:
+        self._redis = redis
+        self._queued = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, key):
+        pass
+
+    def get(self, key):
+        return self._redis.get(key)
+
+    def multi(self):
+        self._queued = []
+
+    def __getattr__(self, name):
+        return lambda *args: self._queued.append((name, args))
+
+    def execute(self):
+        return [getattr(self._redis, name)(*args) for name, args in self._queued]
@@ -1,15 +1,18 @@
+import asyncio
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 
 import pytest
 
 from src import analytics
+from src.pool_store import PoolStore
 
 
 @pytest.fixture(autouse=True)
 def reset_caches(monkeypatch: pytest.MonkeyPatch) -> None:
     analytics._all_pools_cache = None  # type: ignore[attr-defined]
     analytics._chart_cache.clear()  # type: ignore[attr-defined]
-    analytics._project_url_cache.clear()  # type: ignore[attr-defined]
 
 
 def build_chart(days: int, now: datetime) -> list[dict[str, float | str | None]]:
@@ -54,8 +57,11 @@ def test_get_new_pools_returns_sorted(monkeypatch: pytest.MonkeyPatch) -> None:
     ]
 
     monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "APT"}, {"symbol": "BTC"}])
-    monkeypatch.setattr(analytics, "get_token_pools", lambda symbol, force_refresh=False: pools if symbol == "APT" else [])
-    monkeypatch.setattr(analytics, "get_chart", lambda pool_id, force_refresh=False: build_chart(2, now))
+    monkeypatch.setattr(analytics.POOL_INDEX, "get_store", lambda: PoolStore.from_pools(pools))
+    async def fake_fetch_charts(pool_ids, force_refresh=False):
+        return {pool_id: analytics.ChartSeries.from_points(build_chart(2, now)) for pool_id in pool_ids}
+
+    monkeypatch.setattr(analytics, "fetch_charts", fake_fetch_charts)
     monkeypatch.setattr(analytics, "get_project_url", lambda project: f"https://{project}.example")
 
     result = analytics.get_new_pools(
@@ -99,8 +105,11 @@ def test_get_new_pools_filters_by_chain(monkeypatch: pytest.MonkeyPatch) -> None
     ]
 
     monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "APT"}])
-    monkeypatch.setattr(analytics, "get_token_pools", lambda symbol, force_refresh=False: pools if symbol == "APT" else [])
-    monkeypatch.setattr(analytics, "get_chart", lambda pool_id, force_refresh=False: build_chart(1, now))
+    monkeypatch.setattr(analytics.POOL_INDEX, "get_store", lambda: PoolStore.from_pools(pools))
+    async def fake_fetch_charts(pool_ids, force_refresh=False):
+        return {pool_id: analytics.ChartSeries.from_points(build_chart(1, now)) for pool_id in pool_ids}
+
+    monkeypatch.setattr(analytics, "fetch_charts", fake_fetch_charts)
     monkeypatch.setattr(analytics, "get_project_url", lambda project: None)
 
     result = analytics.get_new_pools(
@@ -113,3 +122,234 @@ def test_get_new_pools_filters_by_chain(monkeypatch: pytest.MonkeyPatch) -> None
 
     assert result["count"] == 1
     assert result["pools"][0]["chain"] == "Aptos"
+
+
+def test_chart_series_point_lookup() -> None:
+    now = datetime(2024, 3, 10, tzinfo=timezone.utc)
+    points = build_chart(5, now)
+    points.insert(2, {"timestamp": None, "tvlUsd": 1, "apy": 1})
+    points[-1]["apy"] = None
+
+    series = analytics.ChartSeries.from_points(points)
+
+    assert len(series) == 6
+    index = series.index_at(now - timedelta(days=2, hours=12))
+    assert index == 2
+    assert series.tvl_at(index) == 6_000_000
+    assert series.index_at(now - timedelta(days=30)) is None
+    assert series.index_at(now) == 5
+    assert series.apy_at(5) is None
+    assert analytics._estimate_first_seen(series) == now - timedelta(days=5)
+
+
+def test_new_pool_candidates_come_from_index_without_list_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    pools = [
+        {"pool": "a", "symbol": "ETH-USDC", "project": "p", "chain": "Ethereum", "tvlUsd": 7_000_000, "count": 3},
+        {"pool": "b", "symbol": "ETH-USDC", "project": "p", "chain": "Ethereum", "tvlUsd": 9_000_000, "count": 2},
+        {"pool": "c", "symbol": "WETH-USDC", "project": "q", "chain": "Ethereum", "tvlUsd": 9_000_000, "count": 2},
+        {"pool": "d", "symbol": "BTC-USDC", "project": "q", "chain": "Base", "tvlUsd": 9_000_000, "count": 2},
+        {"pool": "e", "symbol": "BTC-ETH", "project": "r", "chain": "Ethereum", "tvlUsd": 9_000_000, "count": 40},
+        {"pool": "f", "symbol": "BTC-ETH", "project": "s", "chain": "Ethereum", "tvlUsd": 9_000_000},
+    ]
+
+    def fail_search(symbol: str, force_refresh: bool = False) -> list:
+        raise AssertionError("list endpoint must not be called")
+
+    monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "ETH"}, {"symbol": "BTC"}])
+    monkeypatch.setattr(analytics, "get_token_pools", fail_search)
+    monkeypatch.setattr(analytics.POOL_INDEX, "get_store", lambda: PoolStore.from_pools(pools))
+
+    candidates = analytics._get_new_pool_candidates(
+        symbols=("eth", "BTC"), period_days=7, min_tvl=5_000_000, chains=("ethereum",), force_refresh=False
+    )
+
+    assert [pool["pool"] for pool in candidates] == ["b"]
+
+
+def test_new_pool_candidates_below_index_floor_use_search(monkeypatch: pytest.MonkeyPatch) -> None:
+    pools = [{"pool": "a", "symbol": "ETH-USDC", "project": "p", "chain": "Ethereum", "tvlUsd": 500_000, "count": 1}]
+    searched: list[str] = []
+
+    def search(symbol: str, force_refresh: bool = False) -> list:
+        searched.append(symbol)
+        return pools
+
+    monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "ETH"}])
+    monkeypatch.setattr(analytics, "get_token_pools", search)
+    monkeypatch.setattr(analytics.POOL_INDEX, "get_store", lambda: pytest.fail("index cannot serve this min_tvl"))
+
+    candidates = analytics._get_new_pool_candidates(
+        symbols=("ETH",), period_days=1, min_tvl=100_000, chains=(), force_refresh=False
+    )
+
+    assert searched == ["ETH"]
+    assert [pool["pool"] for pool in candidates] == ["a"]
+
+
+@pytest.mark.parametrize("sort", ["momentum", "tvl_change", "apy_change"])
+def test_get_new_pools_matches_full_fetch(monkeypatch: pytest.MonkeyPatch, sort: str) -> None:
+    now = datetime.now(timezone.utc)
+    pools = [
+        {
+            "pool": f"pool-{index}",
+            "symbol": f"ETH-T{index}",
+            "project": f"protocol-{index}",
+            "chain": "Ethereum",
+            # Крупные пулы растут медленнее: размер пула не предсказывает порядок
+            "tvlUsd": 50_000_000 - index * 1_000_000,
+            "apy": 10,
+            "apyPct7D": (40 - index) * 0.1,
+            "count": 5,
+        }
+        for index in range(40)
+    ]
+
+    def chart(pool_id: str) -> analytics.ChartSeries:
+        index = int(pool_id.split("-")[1])
+        if index % 7 == 0:
+            return analytics.ChartSeries.from_points([])
+        points = build_chart(3, now)
+        points[0]["tvlUsd"] = 1_000_000 + index * 50_000
+        points[0]["apy"] = 1 + (index * 37) % 11
+        return analytics.ChartSeries.from_points(points)
+
+    requested: list[str] = []
+
+    async def fake_fetch_charts(pool_ids, force_refresh=False):
+        requested.extend(pool_ids)
+        return {pool_id: chart(pool_id) for pool_id in pool_ids}
+
+    store = PoolStore.from_pools(pools)
+    monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "ETH"}])
+    monkeypatch.setattr(analytics.POOL_INDEX, "get_store", lambda: store)
+    monkeypatch.setattr(analytics, "fetch_charts", fake_fetch_charts)
+    monkeypatch.setattr(analytics, "get_project_url", lambda project: None)
+
+    # Все 40 кандидатов влезают в окно limit * CANDIDATE_MULTIPLIER: графики получают все
+    result = analytics.get_new_pools(period="7d", min_tvl=5_000_000, symbols=("ETH",), sort=sort, limit=10)
+
+    candidates = analytics._get_new_pool_candidates(("ETH",), 7, 5_000_000, (), False)
+    expected = [item for pool in candidates if (item := analytics.enrich_pool(pool, chart(pool["pool"]), 7))]
+    expected.sort(key=lambda item: analytics.sort_value(item, sort), reverse=True)
+
+    assert sorted(requested) == sorted(pool["pool"] for pool in candidates)
+    assert result["pools"] == expected[:10]
+    assert result["count"] == len(expected)
+
+
+def test_overflowing_candidates_are_pre_ranked_into_the_chart_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = datetime.now(timezone.utc)
+    # Рост APY за 7 дней растёт с номером пула, а строки индекса идут с нулевого:
+    # без пре-ранжирования окно заняли бы пулы с наименьшим ростом
+    pools = [
+        {
+            "pool": f"pool-{index}",
+            "symbol": f"ETH-T{index}",
+            "project": f"protocol-{index}",
+            "chain": "Ethereum",
+            "tvlUsd": 6_000_000,
+            "apy": 10,
+            "apyPct7D": index * 0.2,
+            "count": 5,
+        }
+        for index in range(40)
+    ]
+
+    def chart(pool_id: str) -> analytics.ChartSeries:
+        index = int(pool_id.split("-")[1])
+        points = build_chart(3, now)
+        points[0]["apy"] = 10 - index * 0.2
+        points[-1]["apy"] = 10
+        return analytics.ChartSeries.from_points(points)
+
+    requested: list[str] = []
+
+    async def fake_fetch_charts(pool_ids, force_refresh=False):
+        requested.extend(pool_ids)
+        return {pool_id: chart(pool_id) for pool_id in pool_ids}
+
+    store = PoolStore.from_pools(pools)
+    monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "ETH"}])
+    monkeypatch.setattr(analytics.POOL_INDEX, "get_store", lambda: store)
+    monkeypatch.setattr(analytics, "fetch_charts", fake_fetch_charts)
+    monkeypatch.setattr(analytics, "get_project_url", lambda project: None)
+
+    result = analytics.get_new_pools(period="7d", min_tvl=5_000_000, symbols=("ETH",), sort="apy_change", limit=5)
+
+    window = 5 * analytics.CANDIDATE_MULTIPLIER
+    assert len(requested) == window
+    assert set(requested) == {f"pool-{index}" for index in range(40 - window, 40)}
+    assert [pool["pool_id"] for pool in result["pools"]] == [f"pool-{index}" for index in range(39, 34, -1)]
+
+
+def test_chart_decoding_and_enrichment_run_off_the_event_loop(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = datetime.now(timezone.utc)
+    pools = [
+        {"pool": "pool-1", "symbol": "ETH-USDC", "project": "protocol-a", "chain": "Ethereum", "tvlUsd": 6e6, "count": 3}
+    ]
+    threads: dict[str, set[int]] = {"loop": set(), "decode": set(), "enrich": set()}
+
+    async def fake_get_json(url, params=None):
+        threads["loop"].add(threading.get_ident())
+        return {"data": build_chart(3, now)}
+
+    original_points = analytics._chart_points
+
+    def tracking_points(payload):
+        threads["decode"].add(threading.get_ident())
+        return original_points(payload)
+
+    def tracking_url(project):
+        threads["enrich"].add(threading.get_ident())
+        return None
+
+    monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "ETH"}])
+    monkeypatch.setattr(analytics.POOL_INDEX, "get_store", lambda: PoolStore.from_pools(pools))
+    monkeypatch.setattr(analytics.UPSTREAM_HTTP, "get_json", fake_get_json)
+    monkeypatch.setattr(analytics, "_chart_points", tracking_points)
+    monkeypatch.setattr(analytics, "get_project_url", tracking_url)
+
+    result = analytics.get_new_pools(period="7d", min_tvl=5_000_000, symbols=("ETH",))
+
+    assert [pool["pool_id"] for pool in result["pools"]] == ["pool-1"]
+    assert threads["decode"] and threads["enrich"]
+    assert not (threads["decode"] | threads["enrich"]) & threads["loop"]
+
+
+def test_concurrent_chart_fetches_share_one_upstream_call(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = datetime.now(timezone.utc)
+    calls: list[str] = []
+
+    async def fake_get_json(url, params=None):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return {"data": build_chart(2, now)}
+
+    monkeypatch.setattr(analytics.UPSTREAM_HTTP, "get_json", fake_get_json)
+
+    async def run():
+        return await asyncio.gather(analytics.fetch_charts(["pool-1"]), analytics.fetch_charts(["pool-1"]))
+
+    first, second = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert len(first["pool-1"]) == len(second["pool-1"]) == 3
+
+
+def test_chart_phase_is_bounded_by_the_request_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    pools = [{"pool": "pool-1", "symbol": "ETH-USDC", "project": "p", "chain": "Ethereum", "tvlUsd": 6e6, "count": 3}]
+
+    async def hanging_fetch_charts(pool_ids, force_refresh=False):
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(analytics, "_get_new_pool_candidates", lambda **kwargs: pools)
+    monkeypatch.setattr(analytics, "fetch_charts", hanging_fetch_charts)
+    monkeypatch.setattr(analytics.ANALYTICS_EXECUTOR, "timeout", 0.2)
+
+    async def run() -> None:
+        await analytics.get_new_pools_async(period="7d", symbols=("ETH",))
+
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert time.monotonic() - started < 5
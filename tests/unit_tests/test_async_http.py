@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.async_http import AsyncJSONFetcher
+
+
+def test_retries_transient_status_then_succeeds() -> None:
+    calls = {"count": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["count"] += 1
+        if calls["count"] < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"data": [1]})
+
+    fetcher = AsyncJSONFetcher(retries=2, backoff=0, host_rate=0, transport=httpx.MockTransport(handler))
+
+    async def run() -> object:
+        try:
+            return await fetcher.get_json("https://yields.example/chart/pool-1")
+        finally:
+            await fetcher.aclose()
+
+    assert asyncio.run(run()) == {"data": [1]}
+    assert calls["count"] == 3
+
+
+def test_gives_up_after_retries_and_does_not_retry_client_errors() -> None:
+    statuses = {"pool-1": 500, "pool-2": 404}
+    calls: dict[str, int] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        pool_id = request.url.path.rsplit("/", 1)[-1]
+        calls[pool_id] = calls.get(pool_id, 0) + 1
+        return httpx.Response(statuses[pool_id])
+
+    fetcher = AsyncJSONFetcher(retries=1, backoff=0, host_rate=0, transport=httpx.MockTransport(handler))
+
+    async def run(pool_id: str) -> None:
+        try:
+            await fetcher.get_json(f"https://yields.example/chart/{pool_id}")
+        finally:
+            await fetcher.aclose()
+
+    for pool_id in statuses:
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(run(pool_id))
+    assert calls == {"pool-1": 2, "pool-2": 1}
+
+
+def test_concurrency_is_bounded() -> None:
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return httpx.Response(200, json={"ok": True})
+
+    fetcher = AsyncJSONFetcher(concurrency=3, host_rate=0, transport=httpx.MockTransport(handler))
+
+    async def run() -> list:
+        try:
+            return await asyncio.gather(
+                *(fetcher.get_json(f"https://yields.example/chart/{index}") for index in range(12))
+            )
+        finally:
+            await fetcher.aclose()
+
+    assert len(asyncio.run(run())) == 12
+    assert state["peak"] == 3
@@ -15,7 +15,7 @@ def test_get_top_market_tokens_uses_cache(monkeypatch: pytest.MonkeyPatch) -> No
         return sample
 
     monkeypatch.setattr(coins, "_fetch_top_tokens", fake_fetch)
-    coins._tokens_cache = None
+    coins._tokens_cache.clear()
 
     first = coins.get_top_market_tokens()
     second = coins.get_top_market_tokens()
@@ -0,0 +1,130 @@
+import threading
+
+import redis as redis_lib
+
+from collector.config import COLLECT_LOCK_KEY
+from collector.jobs import CollectionJobs
+from tests.redis_fakes import LockRedis
+
+
+def test_concurrent_submits_attach_to_the_running_job() -> None:
+    redis = LockRedis()
+    jobs = CollectionJobs(redis, lock_ttl=60)  # type: ignore[arg-type]
+
+    first, created = jobs.submit()
+    second, attached_created = jobs.submit()
+
+    assert created is True
+    assert attached_created is False
+    assert second == first
+    assert jobs.get(first)["status"] == "queued"
+    assert len([key for key in redis.values if key.startswith("strategies:collect:job")]) == 1
+
+
+def test_run_records_stages_and_releases_the_lock() -> None:
+    redis = LockRedis()
+    jobs = CollectionJobs(redis, lock_ttl=60)  # type: ignore[arg-type]
+    job_id, _ = jobs.submit()
+    seen = []
+
+    def collect(progress):
+        for stage in ("fetch", "normalize", "store"):
+            progress(stage)
+            # Каждая стадия продлевает блокировку
+            assert redis.ttls[COLLECT_LOCK_KEY] == 60
+            redis.ttls[COLLECT_LOCK_KEY] = 1
+            seen.append(jobs.get(job_id)["stage"])
+        return {"strategies": 3}
+
+    record = jobs.run(job_id, collect)
+
+    assert seen == ["fetch", "normalize", "store"]
+    assert record["status"] == "succeeded"
+    assert record["result"] == {"strategies": 3}
+    assert [stage["name"] for stage in record["stages"]] == ["fetch", "normalize", "store"]
+    assert all(stage["seconds"] is not None for stage in record["stages"])
+    assert jobs.get(job_id) == record
+    assert jobs.running() is None
+    # Следующий запуск снова получает блокировку
+    assert jobs.submit()[1] is True
+
+
+def test_failed_run_is_reported_and_foreign_lock_is_kept() -> None:
+    redis = LockRedis()
+    jobs = CollectionJobs(redis, lock_ttl=60)  # type: ignore[arg-type]
+    job_id, _ = jobs.submit()
+
+    def collect(progress):
+        progress("fetch")
+        # Блокировка истекла и её взял другой запуск
+        redis.values[COLLECT_LOCK_KEY] = "other"
+        raise RuntimeError("boom")
+
+    record = jobs.run(job_id, collect)
+
+    assert record["status"] == "failed"
+    assert record["error"] == "boom"
+    assert jobs.running() == "other"
+
+
+def test_jobs_are_single_flight_across_threads() -> None:
+    redis = LockRedis()
+    jobs = CollectionJobs(redis, lock_ttl=60)  # type: ignore[arg-type]
+    results = []
+    barrier = threading.Barrier(8)
+
+    def submit():
+        barrier.wait()
+        results.append(jobs.submit())
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(created for _, created in results) == 1
+    assert len({job_id for job_id, _ in results}) == 1
+
+
+def test_running_job_without_the_lock_is_reported_abandoned() -> None:
+    redis = LockRedis()
+    jobs = CollectionJobs(redis, lock_ttl=60)  # type: ignore[arg-type]
+    job_id, _ = jobs.submit()
+
+    def collect(progress):
+        progress("fetch")
+        assert jobs.get(job_id)["status"] == "running"
+        # Процесс умер, блокировка истекла — запись осталась "running"
+        redis.delete(COLLECT_LOCK_KEY)
+        assert jobs.get(job_id)["status"] == "abandoned"
+        return {}
+
+    jobs.run(job_id, collect)
+
+    assert jobs.get(job_id)["status"] == "succeeded"
+
+
+def test_redis_error_while_recording_progress_does_not_abort_collection(monkeypatch) -> None:
+    redis = LockRedis()
+    jobs = CollectionJobs(redis, lock_ttl=60)  # type: ignore[arg-type]
+    job_id, _ = jobs.submit()
+    original_save = jobs._save
+
+    def flaky_save(record):
+        if record.get("stage") == "normalize":
+            raise redis_lib.ConnectionError("redis is down")
+        original_save(record)
+
+    monkeypatch.setattr(jobs, "_save", flaky_save)
+
+    def collect(progress):
+        progress("fetch")
+        progress("normalize")
+        progress("store")
+        return {"strategies": 1}
+
+    record = jobs.run(job_id, collect)
+
+    assert record["status"] == "succeeded"
+    assert [stage["name"] for stage in record["stages"]] == ["fetch", "normalize", "store"]
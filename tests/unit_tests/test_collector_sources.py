@@ -0,0 +1,83 @@
+import threading
+import time
+
+from collector import data_sources
+
+
+def test_fetch_concurrently_runs_sources_in_parallel_with_deadlines() -> None:
+    release = threading.Event()
+
+    def slow() -> list:
+        time.sleep(0.2)
+        return [{"id": "slow"}]
+
+    def fast() -> list:
+        return [{"id": "a"}, {"id": "b"}]
+
+    def hung() -> list:
+        release.wait(timeout=5)
+        return [{"id": "late"}]
+
+    def broken() -> list:
+        raise RuntimeError("boom")
+
+    started = time.monotonic()
+    try:
+        results, reports = data_sources.fetch_concurrently(
+            [("slow", slow), ("slow-2", slow), ("fast", fast), ("hung", hung), ("broken", broken)],
+            deadlines={"hung": 0.3},
+            budget=5,
+        )
+    finally:
+        release.set()
+    elapsed = time.monotonic() - started
+
+    # Two 0.2s sources and a 0.3s deadline finish in roughly the slowest one, not their sum.
+    assert elapsed < 0.6
+    assert results == {
+        "slow": [{"id": "slow"}],
+        "slow-2": [{"id": "slow"}],
+        "fast": [{"id": "a"}, {"id": "b"}],
+        "hung": [],
+        "broken": [],
+    }
+    by_source = {report.source: report for report in reports}
+    assert [report.source for report in reports] == ["slow", "slow-2", "fast", "hung", "broken"]
+    assert by_source["fast"].status == "ok" and by_source["fast"].records == 2
+    assert by_source["hung"].status == "timeout"
+    assert by_source["broken"].status == "error" and by_source["broken"].error == "boom"
+
+
+def test_run_budget_caps_source_deadlines() -> None:
+    release = threading.Event()
+
+    def hung() -> list:
+        release.wait(timeout=5)
+        return []
+
+    started = time.monotonic()
+    try:
+        _, reports = data_sources.fetch_concurrently([("hung", hung)], deadlines={"hung": 10}, budget=0.1)
+    finally:
+        release.set()
+
+    assert time.monotonic() - started < 0.5
+    assert reports[0].status == "timeout"
+
+
+def test_each_thread_gets_its_own_session() -> None:
+    sessions = []
+
+    def grab():
+        sessions.append(data_sources._session())
+        sessions.append(data_sources._session())
+
+    threads = [threading.Thread(target=grab) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sessions[0] is sessions[1]
+    assert sessions[2] is sessions[3]
+    assert sessions[0] is not sessions[2]
@@ -0,0 +1,217 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from collector import storage as storage_module
+from collector.config import (
+    LATEST_STRATEGIES_KEY,
+    PROTOCOL_SET_KEY,
+    SNAPSHOT_POINTER_KEY,
+    STRATEGY_HISTORY_HASH,
+    STRATEGY_ITEM_HASH,
+)
+from collector.storage import (
+    StrategyStorage,
+    growth_from_snapshot,
+    snapshot_key,
+    tvl_key,
+)
+from src.snapshot_codec import decode_snapshot
+
+
+class RecordingRedis:
+    """Minimal in-memory stand-in counting network round-trips."""
+
+    def __init__(self) -> None:
+        self.strings: dict[str, str] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.sets: dict[str, set[str]] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.round_trips = 0
+
+    def _call(self, name, *args, **kwargs):
+        self.round_trips += 1
+        return getattr(self, f"_{name}")(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if hasattr(type(self), f"_{name}"):
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def pipeline(self, transaction=True):
+        return RecordingPipeline(self)
+
+    def _get(self, name):
+        return self.strings.get(name)
+
+    def _set(self, name, value, ex=None):
+        self.strings[name] = value if isinstance(value, bytes) else str(value)
+
+    def _incr(self, name):
+        self.strings[name] = str(int(self.strings.get(name, "0")) + 1)
+        return int(self.strings[name])
+
+    def _hmget(self, name, keys):
+        values = self.hashes.get(name, {})
+        return [values.get(key) for key in keys]
+
+    def _hset(self, name, key=None, value=None, mapping=None):
+        self.hashes.setdefault(name, {}).update(mapping or {key: value})
+
+    def _sadd(self, name, *values):
+        self.sets.setdefault(name, set()).update(values)
+
+    def _zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def _zrangebyscore(self, name, low, high):
+        members = sorted(self.zsets.get(name, {}).items(), key=lambda item: item[1])
+        return [member for member, score in members if float(low) <= score <= float(high)]
+
+    def _zrem(self, name, *members):
+        for member in members:
+            self.zsets.get(name, {}).pop(member, None)
+
+    def _zremrangebyrank(self, name, start, end):
+        members = sorted(self.zsets.get(name, {}).items(), key=lambda item: item[1])
+        for member, _ in members[start : max(0, len(members) + end + 1)]:
+            del self.zsets[name][member]
+
+    def _expire(self, name, seconds):
+        pass
+
+    def _delete(self, *names):
+        for name in names:
+            for store in (self.strings, self.hashes, self.sets, self.zsets):
+                store.pop(name, None)
+
+
+class RecordingPipeline:
+    def __init__(self, client: RecordingRedis) -> None:
+        self.client = client
+        self.commands: list = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.commands.clear()
+
+    def __getattr__(self, name):
+        method = getattr(self.client, f"_{name}")
+        return lambda *args, **kwargs: self.commands.append((method, args, kwargs))
+
+    def execute(self):
+        self.client.round_trips += 1
+        results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands.clear()
+        return results
+
+
+@pytest.fixture
+def storage(monkeypatch: pytest.MonkeyPatch) -> StrategyStorage:
+    monkeypatch.setattr(storage_module, "REDIS_BATCH_SIZE", 10)
+    instance = StrategyStorage.__new__(StrategyStorage)
+    instance.redis = RecordingRedis()
+    return instance
+
+
+def test_bulk_operations_batch_round_trips(storage: StrategyStorage) -> None:
+    now = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    ids = [f"s{index}" for index in range(25)]
+    storage.redis.hashes[STRATEGY_HISTORY_HASH] = {"s3": json.dumps({"tvl_usd": 50.0}), "s4": "not json"}
+
+    previous = storage.load_previous_snapshots(ids)
+    assert storage.redis.round_trips == 3
+    assert previous["s3"] == {"tvl_usd": 50.0}
+    assert previous["s4"] is None and previous["s0"] is None
+
+    storage.save_snapshots({strategy_id: {"tvl_usd": 1.0} for strategy_id in ids})
+    storage.append_tvl_points({strategy_id: 1.0 for strategy_id in ids}, now)
+
+    # One pipelined HSET batch plus one pipeline per 10 TVL appends.
+    assert storage.redis.round_trips == 3 + 1 + 3
+    assert len(storage.redis.hashes[STRATEGY_HISTORY_HASH]) == 25
+    assert json.loads(storage.redis.zsets[tvl_key("s7")].popitem()[0]) == {"t": now.isoformat(), "v": 1.0}
+
+
+def test_tvl_history_is_trimmed(storage: StrategyStorage) -> None:
+    start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    for step in range(storage_module.TVL_HISTORY_POINTS + 5):
+        storage.append_tvl_points({"s1": float(step)}, start + timedelta(minutes=15 * step))
+
+    assert len(storage.redis.zsets[tvl_key("s1")]) == storage_module.TVL_HISTORY_POINTS
+
+
+def test_growth_from_snapshot() -> None:
+    now = datetime(2024, 5, 2, tzinfo=timezone.utc)
+    previous = {"tvl_usd": 100.0, "timestamp": (now - timedelta(days=1)).isoformat()}
+
+    growth, snapshot = growth_from_snapshot(previous, 150.0, now)
+
+    assert growth == pytest.approx(50.0)
+    assert snapshot == {"tvl_usd": 150.0, "timestamp": now.isoformat()}
+    assert growth_from_snapshot(None, 150.0, now)[0] == 0.0
+
+
+def test_save_latest_publishes_generations_behind_a_pointer(
+    storage: StrategyStorage, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    redis = storage.redis
+    first = [{"id": "a", "protocol": "aave", "chain": "Ethereum"}]
+    second = [{"id": "b", "protocol": "yearn", "chain": "Base"}]
+    # Данные до версионирования: после первой публикации их быть не должно
+    redis.strings[LATEST_STRATEGIES_KEY] = "{}"
+    redis.hashes[STRATEGY_ITEM_HASH] = {"old": "{}"}
+    redis.sets[PROTOCOL_SET_KEY] = {"old"}
+
+    v1 = storage.save_latest(first)
+    assert LATEST_STRATEGIES_KEY not in redis.strings
+    assert STRATEGY_ITEM_HASH not in redis.hashes
+    assert PROTOCOL_SET_KEY not in redis.sets
+    assert redis.strings[SNAPSHOT_POINTER_KEY] == v1
+    assert decode_snapshot(redis.strings[snapshot_key(v1, "latest")])["items"] == first
+    assert set(redis.hashes[snapshot_key(v1, "items")]) == {"a"}
+    assert redis.sets[snapshot_key(v1, "protocols")] == {"aave"}
+
+    v2 = storage.save_latest(second)
+    # The previous generation stays readable during the grace period...
+    assert redis.strings[SNAPSHOT_POINTER_KEY] == v2
+    assert snapshot_key(v1, "items") in redis.hashes
+
+    # ...and is collected afterwards, while the current one is kept.
+    monkeypatch.setattr(storage_module, "SNAPSHOT_GC_GRACE_SECONDS", 0)
+    later = datetime.now(timezone.utc) + timedelta(seconds=1)
+    assert storage.collect_garbage(keep=v2, now=later) == [v1]
+    assert snapshot_key(v1, "items") not in redis.hashes
+    assert snapshot_key(v1, "latest") not in redis.strings
+    assert set(redis.hashes[snapshot_key(v2, "items")]) == {"b"}
+
+
+def test_save_latest_keeps_a_long_lived_generation_through_the_grace_period(
+    storage: StrategyStorage, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    redis = storage.redis
+    published = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return published
+
+    monkeypatch.setattr(storage_module, "datetime", Clock)
+    v1 = storage.save_latest([{"id": "a"}])
+    # Между публикациями проходит интервал сборщика, много больше грейс-периода
+    published += timedelta(seconds=storage_module.SNAPSHOT_GC_GRACE_SECONDS * 10)
+    v2 = storage.save_latest([{"id": "b"}])
+
+    # Читатель, успевший взять старый указатель, всё ещё находит v1
+    assert snapshot_key(v1, "latest") in redis.strings
+    assert snapshot_key(v1, "items") in redis.hashes
+
+    published += timedelta(seconds=storage_module.SNAPSHOT_GC_GRACE_SECONDS + 1)
+    v3 = storage.save_latest([{"id": "c"}])
+    assert snapshot_key(v1, "items") not in redis.hashes
+    assert snapshot_key(v2, "items") in redis.hashes
+    assert redis.zsets[storage_module.SNAPSHOT_GENERATIONS_KEY][v3] == float("inf")
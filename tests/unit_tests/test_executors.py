@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.executors import BoundedExecutor, ExecutorBusyError
+
+
+def test_runs_blocking_call_off_the_event_loop() -> None:
+    executor = BoundedExecutor("test", max_workers=2, max_pending=0, timeout=5)
+    loop_thread: list[int] = []
+
+    async def run() -> int:
+        loop_thread.append(threading.get_ident())
+        return await executor.run(lambda value: (threading.get_ident(), value * 2), 21)
+
+    worker_thread, result = asyncio.run(run())
+
+    assert result == 42
+    assert worker_thread != loop_thread[0]
+    assert executor.stats()["active"] == 0
+
+
+def test_rejects_when_full_and_times_out() -> None:
+    executor = BoundedExecutor("test", max_workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+
+    async def run() -> list[object]:
+        calls = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        # One call is running and one is queued, so there is no room for a third.
+        with pytest.raises(ExecutorBusyError):
+            await executor.run(release.wait, 5)
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+        # The running call outlived its timeout but still holds its slot; the queued one was cancelled.
+        assert executor.stats()["active"] == 1
+    finally:
+        release.set()
+
+    assert all(isinstance(item, asyncio.TimeoutError) for item in results)
+    stats = executor.stats()
+    assert stats["timed_out"] == 2
+    assert stats["rejected"] == 1
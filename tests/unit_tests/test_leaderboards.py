@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src import analytics, leaderboards
+from src.pool_index import PoolGeneration, PoolIndex
+from src.pool_store import PoolStore
+
+
+def build_chart(days: int, growth: float, now: datetime) -> list[dict]:
+    return [
+        {
+            "timestamp": (now - timedelta(days=offset)).isoformat(),
+            "tvlUsd": 5_000_000 * (1 + growth * (days - offset)),
+            "apy": 10.0,
+        }
+        for offset in range(days, -1, -1)
+    ]
+
+
+POOLS = [
+    {"pool": "slow", "symbol": "ETH-USDC", "project": "p", "chain": "Ethereum", "tvlUsd": 8_000_000, "count": 5},
+    {"pool": "fast", "symbol": "ETH-DAI", "project": "q", "chain": "Arbitrum", "tvlUsd": 6_000_000, "count": 5},
+    {"pool": "dupe", "symbol": "USDC-ETH", "project": "p", "chain": "Base", "tvlUsd": 7_000_000, "count": 5},
+    {"pool": "young", "symbol": "BTC-USDT", "project": "r", "chain": "Ethereum", "tvlUsd": 9_000_000, "count": 1},
+    {"pool": "old", "symbol": "ETH-USDT", "project": "s", "chain": "Ethereum", "tvlUsd": 9_000_000, "count": 90},
+]
+GROWTH = {"slow": 0.1, "fast": 0.5, "dupe": 0.9, "young": 0.2}
+
+
+@pytest.fixture
+def boards(monkeypatch: pytest.MonkeyPatch) -> leaderboards.NewPoolLeaderboards:
+    now = datetime.now(timezone.utc)
+    fetched: list[list[str]] = []
+
+    async def fake_fetch_charts(pool_ids, force_refresh=False):
+        fetched.append(list(pool_ids))
+        return {pool_id: analytics.ChartSeries.from_points(build_chart(5, GROWTH[pool_id], now)) for pool_id in pool_ids}
+
+    monkeypatch.setattr(analytics, "fetch_charts", fake_fetch_charts)
+    monkeypatch.setattr(analytics, "get_top_market_tokens", lambda limit=100: [{"symbol": "ETH"}, {"symbol": "BTC"}])
+    monkeypatch.setattr(analytics, "get_project_url", lambda project: None)
+
+    service = leaderboards.NewPoolLeaderboards(index=PoolIndex(snapshot_path=None))
+    generation = PoolGeneration(number=3, built_at=datetime.utcnow(), store=PoolStore.from_pools(POOLS))
+    service.rebuild(generation)
+
+    # Charts are fetched once for all periods, and never for pools older than the widest period.
+    assert fetched == [["slow", "fast", "dupe", "young"]]
+    return service
+
+
+def test_query_filters_dedupes_and_sorts(boards: leaderboards.NewPoolLeaderboards) -> None:
+    result = boards.query("7d", min_tvl=5_000_000, symbols=["eth"], sort="tvl_change", limit=10)
+
+    assert result is not None
+    # "dupe" loses to the larger "slow" pool of the same project and pair despite its growth.
+    assert [pool["pool_id"] for pool in result["pools"]] == ["fast", "slow"]
+    assert result["count"] == 2
+
+    chained = boards.query("7d", min_tvl=5_000_000, symbols=["ETH"], chains=["base"], limit=10)
+    assert chained is not None
+    assert [pool["pool_id"] for pool in chained["pools"]] == ["dupe"]
+
+    day = boards.query("24h", min_tvl=5_000_000, symbols=["ETH", "BTC"], limit=10)
+    assert day is not None
+    assert [pool["pool_id"] for pool in day["pools"]] == ["young"]
+
+
+def test_query_declines_what_tables_cannot_answer(boards: leaderboards.NewPoolLeaderboards) -> None:
+    assert boards.query("7d", min_tvl=100_000, symbols=["ETH"]) is None
+    with pytest.raises(ValueError):
+        boards.query("7d", symbols=["DOGE"])
+
+    empty = leaderboards.NewPoolLeaderboards(index=PoolIndex(snapshot_path=None))
+    assert empty.query("7d", symbols=["ETH"]) is None
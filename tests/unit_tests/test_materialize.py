@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from api.cache import strategy_cache_key
+from src import tools
+from src.app import run_agent
+from src.pool_index import PoolGeneration
+from src.pool_store import PoolStore
+from worker import materialize
+
+
+def _pools():
+    return [
+        {"pool": "p1", "symbol": "ETH", "project": "aave-v3", "chain": "Ethereum", "tvlUsd": 900_000_000, "apy": 4.5},
+        {"pool": "p2", "symbol": "WETH-USDC", "project": "uniswap-v3", "chain": "Arbitrum", "tvlUsd": 40_000_000, "apy": 14.0},
+        {"pool": "p3", "symbol": "ETH-PEPE", "project": "newdex", "chain": "Base", "tvlUsd": 2_000_000, "apy": 95.0},
+        {"pool": "p4", "symbol": "STETH", "project": "lido", "chain": "Ethereum", "tvlUsd": 20_000_000_000, "apy": 3.1},
+    ]
+
+
+def _without_timestamps(value):
+    # _decorate_pool ставит время декорации, остальное должно совпадать
+    if isinstance(value, dict):
+        return {key: _without_timestamps(item) for key, item in value.items() if key != "updated_at"}
+    if isinstance(value, list):
+        return [_without_timestamps(item) for item in value]
+    return value
+
+
+@pytest.fixture
+def generation(monkeypatch: pytest.MonkeyPatch) -> PoolGeneration:
+    store = PoolStore.from_pools(_pools())
+    monkeypatch.setattr(tools, "_get_protocol_url", lambda project: None)
+    # Обычный путь графа видит те же пулы, что и генерация
+    monkeypatch.setattr(
+        tools,
+        "_ensure_token_cache",
+        lambda token, limit, force_refresh=False: (store, list(store.rows_for_token(token))[:limit]),
+    )
+    return PoolGeneration(number=3, built_at=datetime.utcnow(), store=store)
+
+
+def test_every_variant_matches_a_full_agent_run(generation: PoolGeneration) -> None:
+    entries = materialize.materialize_token("ETH", generation)
+
+    assert len(entries) == len(materialize.VARIANTS) == 8
+    for risk_key, risk_level, include_wrappers in materialize.VARIANTS:
+        expected = run_agent("ETH", {"risk_level": risk_level, "include_wrappers": include_wrappers})
+        actual = entries[strategy_cache_key("ETH", risk_key, include_wrappers)]
+        assert _without_timestamps(actual) == _without_timestamps(expected)
+
+
+def test_opportunities_are_decorated_once_per_token(monkeypatch: pytest.MonkeyPatch, generation: PoolGeneration) -> None:
+    decorated = []
+    original = tools._decorate_pool
+
+    def tracking(pool, risk=None):
+        decorated.append(pool["pool"])
+        return original(pool, risk=risk)
+
+    monkeypatch.setattr(tools, "_decorate_pool", tracking)
+    materialize.materialize_token("ETH", generation)
+
+    # get_opportunities + discover_new_pools, но не по разу на каждый из 8 вариантов
+    assert len(decorated) <= 2 * len(generation.store)
+
+
+def test_materialize_strategies_writes_one_batch(monkeypatch: pytest.MonkeyPatch, generation: PoolGeneration) -> None:
+    class Index:
+        def current_generation(self):
+            return generation
+
+    class Cache:
+        def __init__(self) -> None:
+            self.batches = []
+
+        async def set_many(self, items, ttl_seconds=None, *, compute_seconds=None):
+            self.batches.append(items)
+            self.compute_seconds = compute_seconds
+
+    monkeypatch.setattr(materialize, "get_top_market_tokens", lambda limit=100: [{"symbol": "eth"}, {"symbol": "btc"}])
+    cache = Cache()
+
+    stats = asyncio.run(materialize.materialize_strategies(cache, index=Index()))  # type: ignore[arg-type]
+
+    assert len(cache.batches) == 1
+    assert stats == {"generation": 3, "tokens": 2, "keys": 16, "seconds": stats["seconds"]}
+    assert strategy_cache_key("BTC", "any", True) in cache.batches[0]
+    assert set(cache.compute_seconds) == set(cache.batches[0])
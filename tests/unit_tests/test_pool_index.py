@@ -0,0 +1,164 @@
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from src import pool_index
+
+
+def make_pool(pool_id: str, symbol: str, tvl: float = 5_000_000) -> dict:
+    return {"pool": pool_id, "symbol": symbol, "project": "protocol-a", "chain": "Ethereum", "tvlUsd": tvl, "apy": 5}
+
+
+def test_index_builds_generation_and_filters_tvl(monkeypatch: pytest.MonkeyPatch) -> None:
+    pools = [make_pool("p1", "ETH-USDC"), make_pool("p2", "ETH", tvl=10_000)]
+    monkeypatch.setattr(pool_index, "_download_pools", lambda: pools)
+
+    index = pool_index.PoolIndex(snapshot_path=None)
+    result = index.get_pools("eth")
+
+    assert [pool["pool"] for pool in result] == ["p1"]
+    assert result[0]["pair"] == "ETH-USDC"
+    status = index.status()
+    assert status["generation"] == 1
+    assert status["pools"] == 1
+    assert status["last_error"] is None
+
+
+def test_failed_refresh_keeps_previous_generation(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pool_index, "_download_pools", lambda: [make_pool("p1", "ETH")])
+    index = pool_index.PoolIndex(snapshot_path=None)
+    index.ensure_loaded()
+
+    def failing() -> list:
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(pool_index, "_download_pools", failing)
+    index.ensure_loaded(force=True)
+
+    assert [pool["pool"] for pool in index.get_pools("ETH")] == ["p1"]
+    status = index.status()
+    assert status["generation"] == 1
+    assert status["last_error"] == "upstream down"
+
+
+def test_listeners_see_each_new_generation(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pool_index, "_download_pools", lambda: [make_pool("p1", "ETH")])
+    index = pool_index.PoolIndex(snapshot_path=None)
+    seen: list[int] = []
+
+    def broken(generation: pool_index.PoolGeneration) -> None:
+        raise RuntimeError("listener bug")
+
+    index.add_listener(broken)
+    index.add_listener(lambda generation: seen.append(generation.number))
+    index.ensure_loaded()
+    index.ensure_loaded(force=True)
+
+    assert seen == [1, 2]
+    assert index.status()["generation"] == 2
+
+
+def test_stale_generation_is_refreshed_in_background(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(pool_index, "_download_pools", lambda: [make_pool("p1", "ETH")])
+    index = pool_index.PoolIndex(snapshot_path=None)
+    index.ensure_loaded()
+
+    release = threading.Event()
+    done = threading.Event()
+
+    def slow_download() -> list:
+        release.wait(timeout=5)
+        return [make_pool("p2", "ETH")]
+
+    original_refresh = index._refresh_in_background
+
+    def tracked_refresh() -> None:
+        original_refresh()
+        done.set()
+
+    monkeypatch.setattr(pool_index, "_download_pools", slow_download)
+    monkeypatch.setattr(pool_index, "INDEX_TTL", timedelta(0))
+    monkeypatch.setattr(index, "_refresh_in_background", tracked_refresh)
+
+    # The stale generation keeps serving while the next one is being built.
+    assert [pool["pool"] for pool in index.get_pools("ETH")] == ["p1"]
+    assert index.status()["refreshing"] is True
+
+    release.set()
+    assert done.wait(timeout=5)
+    monkeypatch.setattr(pool_index, "INDEX_TTL", timedelta(minutes=5))
+    assert [pool["pool"] for pool in index.get_pools("ETH")] == ["p2"]
+    assert index.status()["generation"] == 2
+
+
+def test_snapshot_restores_generation_without_upstream(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    snapshot_path = str(tmp_path / "pool_index.bin")
+    monkeypatch.setattr(pool_index, "_download_pools", lambda: [make_pool("p1", "ETH-USDC"), make_pool("p2", "BTC")])
+    index = pool_index.PoolIndex(snapshot_path=snapshot_path)
+    index.ensure_loaded()
+
+    scheduled = []
+
+    def failing() -> list:
+        raise AssertionError("cold start should not block on upstream")
+
+    monkeypatch.setattr(pool_index, "_download_pools", failing)
+    restored = pool_index.PoolIndex(snapshot_path=snapshot_path)
+    monkeypatch.setattr(restored, "_schedule_refresh", lambda: scheduled.append(True))
+
+    pools = restored.get_pools("USDC")
+    assert [pool["pool"] for pool in pools] == ["p1"]
+    assert pools[0]["pair"] == "ETH-USDC"
+    status = restored.status()
+    assert status["source"] == "snapshot"
+    assert status["generation"] == 1
+    assert status["pools"] == 2
+    assert not scheduled
+
+    monkeypatch.setattr(pool_index, "INDEX_TTL", timedelta(0))
+    restored.get_pools("USDC")
+    assert scheduled
+
+
+def test_snapshot_warm_start_does_not_wait_for_the_search_index(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    snapshot_path = str(tmp_path / "pool_index.bin")
+    monkeypatch.setattr(pool_index, "_download_pools", lambda: [make_pool("p1", "ETH-USDC")])
+    pool_index.PoolIndex(snapshot_path=snapshot_path).ensure_loaded()
+
+    release = threading.Event()
+    building = threading.Event()
+    original = pool_index.PoolStore.search_index
+
+    def slow_search_index(store):
+        building.set()
+        release.wait(5)
+        return original(store)
+
+    monkeypatch.setattr(pool_index.PoolStore, "search_index", slow_search_index)
+    restored = pool_index.PoolIndex(snapshot_path=snapshot_path)
+    monkeypatch.setattr(restored, "_schedule_refresh", lambda: None)
+
+    # Генерация из снимка доступна, пока поисковый индекс ещё строится в фоне
+    started = time.monotonic()
+    assert [pool["pool"] for pool in restored.get_pools("ETH")] == ["p1"]
+    assert time.monotonic() - started < 1
+    assert building.wait(5)
+    release.set()
+
+
+def test_concurrent_snapshot_writers_do_not_share_a_temp_file(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    snapshot_path = str(tmp_path / "pool_index.bin")
+    monkeypatch.setattr(pool_index, "_download_pools", lambda: [make_pool(f"p{i}", "ETH-USDC") for i in range(200)])
+    indexes = [pool_index.PoolIndex(snapshot_path=snapshot_path) for _ in range(4)]
+    threads = [threading.Thread(target=index.ensure_loaded) for index in indexes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    with open(snapshot_path, "rb") as handle:
+        store, _ = pool_index.PoolStore.decode(handle.read())
+    assert len(store) == 200
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["pool_index.bin"]
@@ -0,0 +1,54 @@
+import math
+
+from src.pool_store import PoolStore
+
+
+def sample_pools() -> list[dict]:
+    return [
+        {"pool": "p1", "symbol": "ETH-USDC", "project": "uniswap-v3", "chain": "Ethereum", "tvlUsd": 12_000_000, "apy": 7.5, "apyPct30D": 1.2},
+        {"pool": "p2", "symbol": "STETH", "project": "lido", "chain": "Ethereum", "tvlUsd": 900_000_000, "apy": 3.1},
+        {"pool": "p3", "symbol": "ETH", "project": "aave-v3", "chain": "Arbitrum", "tvlUsd": 500_000, "apy": None},
+        {"pool": "p4", "symbol": "WETH-ETH", "project": "curve", "chain": "arbitrum", "tvlUsd": "3000000", "apy": "4"},
+    ]
+
+
+def test_store_builds_columns_and_token_rows() -> None:
+    store = PoolStore.from_pools(sample_pools(), min_tvl=1_000_000)
+
+    assert len(store) == 3
+    assert list(store.rows_for_token("eth")) == [0, 2]
+    assert store.tvl[2] == 3_000_000
+    assert store.value("apy_pct_30d", 0) == 1.2
+    assert store.value("apy_pct_30d", 1) is None
+    assert store.chain(0) == store.chain(1) == "Ethereum"
+    assert store.chain_codes[0] == store.chain_codes[1]
+    assert store.category(0) == "token-stable"
+
+    entry = store.materialize(2)
+    assert entry["pool"] == "p4"
+    assert entry["pair"] == "ETH-WETH"
+    assert entry["contains_wrapper"] is True
+
+
+def test_store_filter_uses_columns() -> None:
+    store = PoolStore.from_pools(sample_pools())
+
+    assert math.isnan(store.apy[2])
+    assert store.filter(min_apy=3.5) == [0, 3]
+    assert store.filter(min_tvl=10_000_000) == [0, 1]
+    assert store.filter(chains=["ARBITRUM"]) == [2, 3]
+    assert store.filter(store.rows_for_token("ETH"), exclude_projects=["Curve"]) == [0, 2]
+    assert store.filter(predicate=lambda row: store.project(row) == "lido") == [1]
+
+
+def test_store_snapshot_round_trip() -> None:
+    store = PoolStore.from_pools(sample_pools())
+
+    restored, meta = PoolStore.decode(store.encode({"number": 3}))
+
+    assert meta == {"number": 3}
+    assert len(restored) == len(store)
+    assert restored.records == store.records
+    assert list(restored.rows_for_token("ETH")) == list(store.rows_for_token("ETH"))
+    assert restored.filter(chains=["arbitrum"], min_tvl=1_000_000) == store.filter(chains=["arbitrum"], min_tvl=1_000_000)
+    assert restored.materialize(3) == store.materialize(3)
@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from src import protocols
+
+
+@pytest.fixture
+def directory(tmp_path) -> protocols.ProtocolDirectory:
+    return protocols.ProtocolDirectory(snapshot_path=str(tmp_path / "protocols.json"))
+
+
+LISTING = [
+    {"slug": "aave-v3", "name": "Aave V3", "url": "https://aave.com", "logo": "https://icons.llama.fi/aave-v3.png"},
+    {"slug": "yearn-finance", "name": "Yearn", "url": "https://yearn.fi", "logo": None, "symbol": "YFI"},
+]
+
+
+def test_directory_fetches_listing_once(monkeypatch: pytest.MonkeyPatch, directory) -> None:
+    calls = {"count": 0}
+
+    def fake_fetch() -> list[dict]:
+        calls["count"] += 1
+        return LISTING
+
+    monkeypatch.setattr(directory, "_fetch", fake_fetch)
+    directory.ensure_loaded()
+
+    assert directory.get_url("Aave-V3") == "https://aave.com"
+    assert directory.get_url("yearn") == "https://yearn.fi"
+    assert directory.get_logo("aave-v3") == "https://icons.llama.fi/aave-v3.png"
+    assert directory.get_url("unknown-protocol") is None
+    assert directory.get_url(None) is None
+    assert calls["count"] == 1
+
+
+def test_directory_falls_back_to_snapshot(monkeypatch: pytest.MonkeyPatch, directory, tmp_path) -> None:
+    monkeypatch.setattr(directory, "_fetch", lambda: LISTING)
+    directory.ensure_loaded()
+
+    restored = protocols.ProtocolDirectory(snapshot_path=str(tmp_path / "protocols.json"))
+    monkeypatch.setattr(restored, "_fetch", lambda: None)
+    restored.ensure_loaded()
+
+    meta = restored.get("yearn-finance")
+    assert meta is not None
+    assert meta.url == "https://yearn.fi"
+    assert meta.symbol == "YFI"
+
+
+def test_lookup_does_not_wait_for_a_stale_listing(monkeypatch: pytest.MonkeyPatch, directory) -> None:
+    directory.load(LISTING)
+    # Список устарел, а upstream висит: поиск отвечает старыми данными сразу
+    monkeypatch.setattr(protocols, "PROTOCOLS_TTL", timedelta(0))
+    release = threading.Event()
+    fetched = threading.Event()
+
+    def slow_fetch() -> list[dict]:
+        fetched.set()
+        release.wait(5)
+        return [{"slug": "aave-v3", "url": "https://app.aave.com"}]
+
+    monkeypatch.setattr(directory, "_fetch", slow_fetch)
+
+    assert directory.get_url("aave-v3") == "https://aave.com"
+    assert fetched.wait(5)
+    # Пока загрузка идёт, следующие поиски тоже не ждут её
+    started = time.monotonic()
+    assert directory.get_url("aave-v3") == "https://aave.com"
+    assert directory.get_logo("aave-v3") == "https://icons.llama.fi/aave-v3.png"
+    assert time.monotonic() - started < 1
+    release.set()
+
+
+def test_lookup_does_not_wait_for_the_first_load(monkeypatch: pytest.MonkeyPatch, directory) -> None:
+    release = threading.Event()
+    fetched = threading.Event()
+
+    def slow_fetch() -> list[dict]:
+        fetched.set()
+        release.wait(5)
+        return LISTING
+
+    monkeypatch.setattr(directory, "_fetch", slow_fetch)
+    loader = threading.Thread(target=directory.ensure_loaded)
+    loader.start()
+    assert fetched.wait(5)
+
+    started = time.monotonic()
+    assert directory.get_url("aave-v3") is None
+    assert time.monotonic() - started < 1
+
+    release.set()
+    loader.join(5)
+    assert directory.get_url("aave-v3") == "https://aave.com"
+
+
+def test_failed_refresh_is_retried_after_backoff(monkeypatch: pytest.MonkeyPatch, directory) -> None:
+    attempts = []
+    monkeypatch.setattr(directory, "_fetch", lambda: attempts.append(1))
+
+    directory.ensure_loaded()
+    directory.ensure_loaded()
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(protocols, "PROTOCOLS_RETRY_BACKOFF", timedelta(0))
+    monkeypatch.setattr(directory, "_fetch", lambda: LISTING)
+    directory.ensure_loaded()
+    assert directory.get_url("yearn") == "https://yearn.fi"
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+from worker.refresh import RefreshConsumer
+
+
+class QueueCache:
+    def __init__(self, payloads) -> None:
+        self.queue = list(payloads)
+        self.stored = {}
+        self.set_many_calls = 0
+        self.stats = None
+        self.leased = []
+        self.acked = []
+
+    async def claim_refresh_requests(self, count: int, *, timeout: int = 0, lease_seconds: int = 0):
+        claimed, self.queue = self.queue[:count], self.queue[count:]
+        self.leased.extend(payload["key"] for payload in claimed)
+        return claimed
+
+    async def ack_refresh_requests(self, keys) -> None:
+        self.acked.extend(keys)
+
+    async def refresh_queue_length(self) -> int:
+        return len(self.queue)
+
+    async def set_many(self, items, ttl_seconds=None, *, compute_seconds=None) -> None:
+        self.set_many_calls += 1
+        self.stored.update(items)
+        self.compute_seconds = compute_seconds
+
+    async def set_refresh_stats(self, stats) -> None:
+        self.stats = stats
+
+
+def _payload(key: str, token: str, **request):
+    return {
+        "key": key,
+        "request": {"token": token, "preferences": None, "result_limit": 10, **request},
+        "enqueued_at": "2024-01-01T00:00:00+00:00",
+    }
+
+
+def test_consumer_runs_batch_concurrently_and_stores_results() -> None:
+    cache = QueueCache(
+        [_payload("eth", "ETH"), _payload("usdc", "USDC"), _payload("bad", "BAD"), {"key": "broken", "request": {}}]
+    )
+    calls = []
+    both_running = threading.Barrier(2, timeout=5)
+
+    def runner(token, preferences, **options):
+        calls.append(token)
+        if token == "BAD":
+            return {"status": "error", "message": "boom"}
+        # ETH и USDC должны выполняться одновременно, иначе барьер не пройдёт
+        both_running.wait()
+        return {"status": "ok", "token": token}
+
+    consumer = RefreshConsumer(cache, runner=runner, concurrency=3, batch_size=10)  # type: ignore[arg-type]
+    try:
+        stats = asyncio.run(consumer.run_once())
+    finally:
+        consumer.close()
+
+    assert sorted(calls) == ["BAD", "ETH", "USDC"]
+    assert cache.stored == {"eth": {"status": "ok", "token": "ETH"}, "usdc": {"status": "ok", "token": "USDC"}}
+    assert cache.set_many_calls == 1
+    assert sorted(cache.compute_seconds) == ["eth", "usdc"]
+    assert stats["processed"] == 2
+    assert stats["failed"] == 1
+    assert stats["invalid"] == 1
+    assert sorted(cache.acked) == ["bad", "broken", "eth", "usdc"]
+    assert stats["queue_depth"] == 0
+    assert stats["avg_queue_wait_seconds"] > 0
+    assert cache.stats == stats
+
+
+def test_consumer_limits_batch_size() -> None:
+    cache = QueueCache([_payload(f"k{i}", f"T{i}") for i in range(5)])
+    consumer = RefreshConsumer(cache, runner=lambda token, prefs, **_: {"status": "ok"}, batch_size=2)  # type: ignore[arg-type]
+    try:
+        stats = asyncio.run(consumer.run_once())
+    finally:
+        consumer.close()
+
+    assert stats["last_batch"]["claimed"] == 2
+    assert stats["queue_depth"] == 3
+
+
+def test_consumer_runs_only_the_cache_key_preferences() -> None:
+    payload = _payload("eth", "ETH", debug=True, force_refresh=True)
+    payload["request"]["preferences"] = {
+        "risk_level": "low",
+        "include_wrappers": False,
+        "min_apy": 25.0,
+        "preferred_chains": ["Base"],
+    }
+    cache = QueueCache([payload])
+    calls = []
+
+    def runner(token, preferences, **options):
+        calls.append((token, preferences, options))
+        return {"status": "ok"}
+
+    consumer = RefreshConsumer(cache, runner=runner)  # type: ignore[arg-type]
+    try:
+        asyncio.run(consumer.run_once())
+    finally:
+        consumer.close()
+
+    assert calls == [
+        (
+            "ETH",
+            {"risk_level": "low", "include_wrappers": False},
+            {"result_limit": 200, "force_refresh": True, "debug": False},
+        )
+    ]
+
+
+def test_job_timeout_does_not_count_time_waiting_for_a_thread() -> None:
+    cache = QueueCache([_payload(f"k{i}", f"T{i}") for i in range(4)])
+
+    def runner(token, preferences, **options):
+        time.sleep(0.2)
+        return {"status": "ok"}
+
+    # Один поток и таймаут чуть больше одного расчёта: очередь в пуле не должна съедать таймаут
+    consumer = RefreshConsumer(cache, runner=runner, concurrency=1, batch_size=4, job_timeout=0.5)  # type: ignore[arg-type]
+    try:
+        stats = asyncio.run(consumer.run_once())
+    finally:
+        consumer.close()
+
+    assert stats["processed"] == 4
+    assert stats["failed"] == 0
+    assert all(seconds < 0.5 for seconds in cache.compute_seconds.values())
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.singleflight import SingleFlight, flight_key
+
+
+def test_concurrent_callers_share_one_call() -> None:
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = {"count": 0}
+
+    def slow_fetch() -> dict:
+        calls["count"] += 1
+        started.set()
+        release.wait(timeout=5)
+        return {"data": [1, 2, 3]}
+
+    results: list[dict] = []
+
+    def worker() -> None:
+        results.append(flights.do("chart:pool-1", slow_fetch))
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    assert started.wait(timeout=5)
+    followers = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    while flights.stats()["shared"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(timeout=5)
+
+    assert calls["count"] == 1
+    assert len(results) == 5
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {"executed": 1, "shared": 4, "in_flight": 0}
+
+    # Completed calls are not cached.
+    flights.do("chart:pool-1", slow_fetch)
+    assert calls["count"] == 2
+
+
+def test_errors_are_not_remembered() -> None:
+    flights = SingleFlight()
+
+    def failing() -> None:
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flights.do("key", failing)
+    assert flights.do("key", lambda: "ok") == "ok"
+
+
+def test_flight_key_is_order_independent() -> None:
+    assert flight_key("https://x", {"b": 1, "a": 2}) == flight_key("https://x", {"a": 2, "b": 1})
+    assert flight_key("https://x") == "https://x"
+
+
+def test_coroutine_callers_on_different_loops_share_one_call() -> None:
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = {"count": 0}
+
+    async def slow_fetch() -> dict:
+        calls["count"] += 1
+        started.set()
+        await asyncio.to_thread(release.wait, 5)
+        return {"data": [1]}
+
+    results: list[dict] = []
+    # Лидер в отдельном потоке со своим циклом, как asyncio.run у лидербордов
+    leader = threading.Thread(target=lambda: results.append(asyncio.run(flights.do_async("chart", slow_fetch))))
+    leader.start()
+    assert started.wait(timeout=5)
+
+    async def follower() -> dict:
+        waiting = asyncio.ensure_future(flights.do_async("chart", slow_fetch))
+        while flights.stats()["shared"] < 1:
+            await asyncio.sleep(0.001)
+        release.set()
+        return await waiting
+
+    results.append(asyncio.run(follower()))
+    leader.join(timeout=5)
+
+    assert calls["count"] == 1
+    assert results[0] is results[1]
+    assert flights.stats()["in_flight"] == 0
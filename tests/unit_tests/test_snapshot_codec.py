@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from src.snapshot_codec import (
+    _PREFIX,
+    CODEC_JSON,
+    FORMAT_VERSION,
+    SNAPSHOT_MAGIC,
+    decode_snapshot,
+    encode_snapshot,
+)
+
+
+def make_envelope(count: int) -> dict:
+    items = [
+        {
+            "id": f"defillama:pool-{index}",
+            "protocol": "aave-v3" if index % 2 else "yearn",
+            "chain": "Ethereum",
+            "apy": 4.5 + index,
+            "tvl_usd": 1_000_000.0 * index,
+            "token_pair": "USDC",
+            "risk_index": None,
+        }
+        for index in range(count)
+    ]
+    items.append({"id": "sparse", "apy": 1.0})
+    return {"updated_at": "2024-05-01T00:00:00+00:00", "version": "3", "count": len(items), "items": items}
+
+
+def test_round_trip_is_exact_and_smaller_than_json() -> None:
+    envelope = make_envelope(500)
+
+    encoded = encode_snapshot(envelope)
+
+    assert decode_snapshot(encoded) == envelope
+    assert decode_snapshot(encode_snapshot(envelope, compress=False)) == envelope
+    assert list(decode_snapshot(encoded)["items"][-1]) == ["id", "apy"]
+    assert len(encoded) * 5 < len(json.dumps(envelope).encode())
+
+
+def test_plain_json_snapshots_stay_readable() -> None:
+    envelope = make_envelope(2)
+
+    assert decode_snapshot(json.dumps(envelope)) == envelope
+    assert decode_snapshot(json.dumps(envelope).encode()) == envelope
+
+
+def test_rejects_corrupt_and_unknown_formats() -> None:
+    encoded = encode_snapshot(make_envelope(2))
+
+    with pytest.raises(ValueError):
+        decode_snapshot(encoded[:12])
+    with pytest.raises(ValueError):
+        decode_snapshot(encoded[:5] + bytes([9]) + encoded[6:])
+    with pytest.raises(ValueError):
+        decode_snapshot(b"[1, 2]")
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"version": "1"},
+        {"shapes": [["id"]], "rows": [[3, "a"]]},
+        {"shapes": [["id"]], "rows": [5]},
+        [1, 2],
+    ],
+)
+def test_malformed_bodies_raise_value_error(body) -> None:
+    raw = _PREFIX.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, CODEC_JSON) + json.dumps(body).encode()
+
+    with pytest.raises(ValueError):
+        decode_snapshot(raw)
+    with pytest.raises(ValueError):
+        decode_snapshot(raw[: _PREFIX.size + 1])
+
+
+def test_snapshots_written_under_the_old_encoding_name_still_decode() -> None:
+    envelope = make_envelope(3)
+    body = json.loads(encode_snapshot(envelope, compress=False)[_PREFIX.size :])
+    body["encoding"] = "columnar/v1"
+    raw = _PREFIX.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, CODEC_JSON) + json.dumps(body).encode()
+
+    assert decode_snapshot(raw) == envelope
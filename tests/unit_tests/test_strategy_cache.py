@@ -0,0 +1,356 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api import cache as cache_module
+from api.cache import StrategyCache, StrategyCacheEntry, apply_invalidation
+from src.snapshot_codec import encode_snapshot
+
+
+@pytest.fixture(autouse=True)
+def reset_snapshot_memo(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(cache_module, "_latest_snapshot", cache_module._SnapshotMemo())
+    cache_module._strategy_l1.clear()
+
+
+class FakeAsyncRedis:
+    def __init__(self, strings=None, hashes=None, sets=None) -> None:
+        self.strings = strings or {}
+        self.hashes = hashes or {}
+        self.sets = sets or {}
+        self.body_reads = 0
+
+    async def get(self, key):
+        return self.strings.get(key)
+
+    async def execute_command(self, name, key, **options):
+        assert name == "GET"
+        self.body_reads += 1
+        value = self.strings.get(key)
+        return value.encode() if isinstance(value, str) else value
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def smembers(self, key):
+        return self.sets.get(key, set())
+
+
+def test_snapshot_reads_follow_the_generation_pointer() -> None:
+    redis = FakeAsyncRedis(
+        strings={
+            "strategies:current": "7",
+            "strategies:v:7:latest": encode_snapshot({"version": "7", "items": [{"id": "new"}]}),
+            "strategies:latest": json.dumps({"items": [{"id": "legacy"}]}),
+        },
+        hashes={"strategies:v:7:items": {"new": json.dumps({"id": "new"})}},
+        sets={"strategies:v:7:chains": {"Base", "Arbitrum"}},
+    )
+    cache = StrategyCache(redis)  # type: ignore[arg-type]
+
+    async def run():
+        return (
+            await cache.get_latest_strategies(),
+            await cache.get_strategy_item("new"),
+            await cache.get_chains(),
+            await cache.get_protocols(),
+        )
+
+    latest, item, chains, protocols = asyncio.run(run())
+    assert latest["items"] == [{"id": "new"}]
+    assert item == {"id": "new"}
+    assert chains == ["Arbitrum", "Base"]
+    assert protocols == []
+
+
+def test_snapshot_reads_fall_back_to_legacy_keys_without_pointer() -> None:
+    redis = FakeAsyncRedis(strings={"strategies:latest": json.dumps({"items": [{"id": "legacy"}]})})
+    cache = StrategyCache(redis)  # type: ignore[arg-type]
+
+    latest = asyncio.run(cache.get_latest_strategies())
+
+    assert latest["items"] == [{"id": "legacy"}]
+    # Тот же снимок без версии не декодируется заново, а новый — декодируется
+    assert asyncio.run(cache.get_latest_strategies()) is latest
+    redis.strings["strategies:latest"] = json.dumps({"items": [{"id": "newer"}]})
+    assert asyncio.run(cache.get_latest_strategies())["items"] == [{"id": "newer"}]
+
+
+def test_decoded_snapshot_is_reused_until_the_version_changes() -> None:
+    redis = FakeAsyncRedis(
+        strings={
+            "strategies:current": "1",
+            "strategies:v:1:latest": encode_snapshot({"version": "1", "items": [{"id": "a"}]}),
+            "strategies:v:2:latest": encode_snapshot({"version": "2", "items": [{"id": "b"}]}),
+        }
+    )
+
+    async def read():
+        # A new StrategyCache per request, as the FastAPI dependency creates.
+        return await StrategyCache(redis).get_latest_strategies()  # type: ignore[arg-type]
+
+    first = asyncio.run(read())
+    assert asyncio.run(read()) is first
+    assert redis.body_reads == 1
+
+    redis.strings["strategies:current"] = "2"
+    assert asyncio.run(read())["items"] == [{"id": "b"}]
+    assert redis.body_reads == 2
+
+
+class QueueRedis:
+    """Sorted sets and hashes with transactional pipelines, enough for the refresh queue."""
+
+    def __init__(self) -> None:
+        self.zsets = {}
+        self.hashes = {}
+
+    async def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zrangebyscore(self, key, low, high):
+        return [member for member, score in self._sorted(key) if score <= float(high)]
+
+    def zrange(self, key, start, end):
+        return [member for member, _ in self._sorted(key)][start : end + 1]
+
+    def _sorted(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda pair: (pair[1], pair[0]))
+
+    def zadd(self, key, mapping, nx=False, lt=False):
+        zset = self.zsets.setdefault(key, {})
+        added = 0
+        for member, score in mapping.items():
+            if member in zset and (nx or (lt and score >= zset[member])):
+                continue
+            added += member not in zset
+            zset[member] = score
+        return added
+
+    def zincrby(self, key, amount, member):
+        zset = self.zsets.setdefault(key, {})
+        zset[member] = zset.get(member, 0.0) + amount
+        return zset[member]
+
+    def zrem(self, key, *members):
+        return sum(self.zsets.get(key, {}).pop(member, None) is not None for member in members)
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+        return 1
+
+    def hsetnx(self, key, field, value):
+        table = self.hashes.setdefault(key, {})
+        return int(table.setdefault(field, value) is value)
+
+    def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    def hdel(self, key, *fields):
+        return sum(self.hashes.get(key, {}).pop(field, None) is not None for field in fields)
+
+    def pipeline(self, transaction=True):
+        return QueuePipeline(self)
+
+
+class QueuePipeline:
+    def __init__(self, redis: QueueRedis) -> None:
+        self._redis = redis
+        self._calls = []
+        self._immediate = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, *keys):
+        # После WATCH команды выполняются сразу, до MULTI
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    async def reset(self):
+        self._immediate = False
+        self._calls = []
+
+    def __getattr__(self, name):
+        if self._immediate:
+
+            async def call(*args, **kwargs):
+                return getattr(self._redis, name)(*args, **kwargs)
+
+            return call
+        return lambda *args, **kwargs: self._calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+
+
+def _refresh_payload(key: str) -> dict:
+    return {"key": key, "request": {"token": key.upper()}}
+
+
+def test_refresh_queue_collapses_duplicates_and_orders_by_priority() -> None:
+    redis = QueueRedis()
+    cache = StrategyCache(redis)  # type: ignore[arg-type]
+
+    async def run():
+        added = [
+            await cache.enqueue_refresh(_refresh_payload("fresh"), staleness_seconds=0),
+            await cache.enqueue_refresh(_refresh_payload("popular"), staleness_seconds=0),
+            await cache.enqueue_refresh(_refresh_payload("popular"), staleness_seconds=0),
+            await cache.enqueue_refresh(_refresh_payload("missing")),
+        ]
+        return added, await cache.refresh_queue_length(), await cache.claim_refresh_requests(10)
+
+    added, depth, claimed = asyncio.run(run())
+
+    assert added == [True, True, False, True]
+    assert depth == 3
+    # Отсутствующий в кэше ключ первым, затем часто запрашиваемый
+    assert [payload["key"] for payload in claimed] == ["missing", "popular", "fresh"]
+    assert asyncio.run(cache.refresh_queue_length()) == 0
+
+
+def test_refresh_leases_skip_duplicates_and_requeue_after_expiry() -> None:
+    redis = QueueRedis()
+    cache = StrategyCache(redis)  # type: ignore[arg-type]
+
+    async def claim_then_retry():
+        await cache.enqueue_refresh(_refresh_payload("eth"))
+        claimed = await cache.claim_refresh_requests(1, lease_seconds=300)
+        # Ключ в работе: повторный запрос не ставит его в очередь снова
+        requeued = await cache.enqueue_refresh(_refresh_payload("eth"))
+        return claimed, requeued
+
+    claimed, requeued = asyncio.run(claim_then_retry())
+    assert [payload["key"] for payload in claimed] == ["eth"]
+    assert requeued is False
+    assert asyncio.run(cache.refresh_queue_length()) == 0
+
+    # Воркер упал: аренда истекла, ключ снова выдаётся
+    leases_key = next(key for key in redis.zsets if key.endswith(":leases"))
+    redis.zsets[leases_key]["eth"] = 0.0
+    reclaimed = asyncio.run(cache.claim_refresh_requests(1))
+    assert [payload["key"] for payload in reclaimed] == ["eth"]
+
+    asyncio.run(cache.ack_refresh_requests(["eth"]))
+    assert redis.zsets[leases_key] == {}
+    assert asyncio.run(cache.claim_refresh_requests(1)) == []
+
+
+def test_refresh_queue_merges_force_and_priority_of_repeated_requests() -> None:
+    redis = QueueRedis()
+    cache = StrategyCache(redis)  # type: ignore[arg-type]
+    forced = {"key": "eth", "request": {"token": "ETH", "force_refresh": True}}
+
+    async def run():
+        await cache.enqueue_refresh(_refresh_payload("eth"), staleness_seconds=0)
+        await cache.enqueue_refresh(_refresh_payload("usdc"), staleness_seconds=60)
+        # Ключ уже в очереди: принудительный запрос должен поднять его и сохранить флаг
+        await cache.enqueue_refresh(forced)
+        await cache.enqueue_refresh(_refresh_payload("eth"), staleness_seconds=0)
+        return await cache.claim_refresh_requests(10)
+
+    claimed = asyncio.run(run())
+
+    assert [payload["key"] for payload in claimed] == ["eth", "usdc"]
+    assert claimed[0]["request"]["force_refresh"] is True
+
+
+def test_refresh_claim_moves_keys_to_leases_in_one_transaction(monkeypatch: pytest.MonkeyPatch) -> None:
+    redis = QueueRedis()
+    cache = StrategyCache(redis)  # type: ignore[arg-type]
+    asyncio.run(cache.enqueue_refresh(_refresh_payload("eth")))
+    queue_key = next(key for key in redis.zsets if key.endswith(":pending"))
+    leases_key = queue_key.replace(":pending", ":leases")
+
+    executions = []
+    original_execute = QueuePipeline.execute
+
+    async def execute(self):
+        executions.append([name for name, _, _ in self._calls])
+        # Первая попытка проигрывает гонку с другим воркером
+        if len(executions) == 1:
+            self._calls = []
+            raise cache_module.WatchError()
+        return await original_execute(self)
+
+    monkeypatch.setattr(QueuePipeline, "execute", execute)
+    claimed = asyncio.run(cache.claim_refresh_requests(5))
+
+    assert [payload["key"] for payload in claimed] == ["eth"]
+    assert executions[-1] == ["zrem", "zadd", "hmget"]
+    assert len(executions) == 2
+    assert redis.zsets[queue_key] == {}
+    assert set(redis.zsets[leases_key]) == {"eth"}
+
+
+class EntryRedis:
+    def __init__(self) -> None:
+        self.strings = {}
+        self.published = []
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return self.strings.get(key)
+
+    def set(self, key, value, ex=None):
+        self.strings[key] = value
+
+    def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+    def pipeline(self, transaction=True):
+        return QueuePipeline(self)  # type: ignore[arg-type]
+
+
+def test_strategy_entries_are_served_from_l1_until_invalidated() -> None:
+    redis = EntryRedis()
+    asyncio.run(StrategyCache(redis).set_many({"k": {"v": 1}}, compute_seconds={"k": 2.5}))  # type: ignore[arg-type]
+
+    channel, message = redis.published[-1]
+    assert channel == cache_module.INVALIDATION_CHANNEL
+    assert message["keys"] == ["k"]
+
+    async def read():
+        return await StrategyCache(redis).get_strategy("k")  # type: ignore[arg-type]
+
+    first = asyncio.run(read())
+    assert first.data == {"v": 1}
+    assert first.delta == 2.5
+    assert asyncio.run(read()) is first
+    assert redis.gets == 1
+
+    # Воркер записал новую версию: сообщение сбрасывает L1, следующий запрос идёт в Redis
+    asyncio.run(StrategyCache(redis).set_many({"k": {"v": 2}}))  # type: ignore[arg-type]
+    assert apply_invalidation(json.dumps(redis.published[-1][1])) == 1
+    assert asyncio.run(read()).data == {"v": 2}
+    assert redis.gets == 2
+
+
+def test_xfetch_refreshes_slow_entries_earlier() -> None:
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    stale_after = timedelta(minutes=5)
+
+    def entry(age_seconds: float, delta: float) -> StrategyCacheEntry:
+        updated = now - timedelta(seconds=age_seconds)
+        expires = updated + timedelta(minutes=10)
+        return StrategyCacheEntry(key="k", data={}, updated_at=updated, expires_at=expires, delta=delta)
+
+    # Свежая запись при обычном броске не обновляется, устаревшая и истёкшая — всегда
+    assert not entry(10, 5).should_refresh(stale_after, now=now, rand=lambda: 0.5)
+    assert entry(300, 5).should_refresh(stale_after, now=now, rand=lambda: 0.0)
+    assert entry(700, 5).should_refresh(stale_after, now=now, rand=lambda: 0.0)
+    # За 20 секунд до срока: быстрая запись ещё ждёт, медленная уже уходит на пересчёт
+    assert not entry(280, 1).should_refresh(stale_after, now=now, rand=lambda: 0.5)
+    assert entry(280, 60).should_refresh(stale_after, now=now, rand=lambda: 0.5)
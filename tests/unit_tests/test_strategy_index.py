@@ -0,0 +1,80 @@
+import itertools
+import random
+
+import pytest
+
+from api import strategy_index
+from api.strategy_index import SORT_KEYS, StrategyIndex, index_for
+
+
+def _items(count: int = 60):
+    rng = random.Random(7)
+    chains = ["Ethereum", "Arbitrum", " base ", None]
+    protocols = ["Aave", "Curve", "beefy"]
+    return [
+        {
+            "id": f"s{i}",
+            "chain": rng.choice(chains),
+            "protocol": rng.choice(protocols),
+            # Повторы значений проверяют порядок равных
+            "tvl_usd": rng.choice([None, 5e5, 1e6, 2e6, 3e6]),
+            "apy": rng.choice([0.0, 3.5, 7.0, 12.0]),
+            "ai_score": rng.choice([0.1, 0.5, 0.9]),
+            "tvl_growth_24h": rng.choice([None, -0.1, 0.2]),
+        }
+        for i in range(count)
+    ]
+
+
+def _naive(items, *, chain=None, protocol=None, min_tvl=None, min_apy=None, sort="ai_score_desc"):
+    result = []
+    for item in items:
+        if chain and (item.get("chain") or "").strip().lower() not in {c.lower() for c in chain}:
+            continue
+        if protocol and (item.get("protocol") or "").strip().lower() not in {p.lower() for p in protocol}:
+            continue
+        if min_tvl is not None and float(item.get("tvl_usd") or 0.0) < min_tvl:
+            continue
+        if min_apy is not None and float(item.get("apy") or 0.0) < min_apy:
+            continue
+        result.append(item)
+    return sorted(result, key=SORT_KEYS.get(sort, SORT_KEYS["ai_score_desc"]), reverse=True)
+
+
+@pytest.mark.parametrize("sort", [*SORT_KEYS, "unknown"])
+def test_query_matches_full_filter_and_sort(sort: str) -> None:
+    items = _items()
+    index = StrategyIndex(items)
+    filters = itertools.product(
+        [None, ["ethereum"], ["Base", "ARBITRUM"], ["solana"]],
+        [None, ["aave"], ["Curve", "beefy"]],
+        [None, 1e6, 2.5e6],
+        [None, 5.0],
+    )
+    for chain, protocol, min_tvl, min_apy in filters:
+        expected = _naive(items, chain=chain, protocol=protocol, min_tvl=min_tvl, min_apy=min_apy, sort=sort)
+        for offset, limit in ((0, 200), (3, 5)):
+            page, total = index.query(
+                chain=chain,
+                protocol=protocol,
+                min_tvl=min_tvl,
+                min_apy=min_apy,
+                sort=sort,
+                offset=offset,
+                limit=limit,
+            )
+            assert total == len(expected)
+            assert [item["id"] for item in page] == [item["id"] for item in expected[offset : offset + limit]]
+
+
+def test_index_for_reuses_index_per_version(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(strategy_index, "_memo", (None, None, None))
+    items = _items(5)
+
+    first = index_for({"version": 3, "items": items})
+    assert index_for({"version": 3, "items": items}) is first
+    assert index_for({"version": 4, "items": _items(5)}) is not first
+    # Снимки без версии (старый формат) узнаются по тому же списку items
+    legacy = index_for({"items": items})
+    assert index_for({"items": items}) is legacy
+    assert index_for({"items": _items(5)}) is not legacy
@@ -0,0 +1,38 @@
+import re
+
+import pytest
+
+from src.token_search import TokenSearchIndex, normalize_search_tokens
+
+POOLS = [
+    {"pool": "aa11-bb22", "symbol": "WETH-USDC", "project": "uniswap-v3", "underlyingTokens": ["0xC02aaa39", "0xA0b86991"]},
+    {"pool": "cc33-dd44", "symbol": "STETH", "project": "lido", "underlyingTokens": ["0xae7ab965"]},
+    {"pool": "ee55-ff66", "symbol": "USDT-DAI", "project": "curve-dex", "underlyingTokens": None},
+    {"pool": "0xop77", "symbol": "OP", "project": "velodrome-v2"},
+]
+
+
+def reference_matches(pool: dict, query: str) -> bool:
+    """Linear substring rule the index replaces."""
+    fields = [
+        (pool.get("symbol") or "").upper(),
+        (pool.get("pool") or "").upper(),
+        (pool.get("project") or "").upper(),
+        *[item.upper() for item in (pool.get("underlyingTokens") or [])],
+    ]
+    parts = [part for part in re.split(r"[,\s/|]+", query.upper()) if part]
+    return bool(parts) and all(any(part in field for field in fields) for part in parts)
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["ETH", "usdc", "weth usdc", "ETH,DAI", "lido", "0xae7a", "OP", "V3", "dd44", "A", "", "  ,", "UNKNOWN"],
+)
+def test_index_matches_linear_scan(query: str) -> None:
+    index = TokenSearchIndex(POOLS)
+    expected = {row for row, pool in enumerate(POOLS) if reference_matches(pool, query)}
+    assert index.match(query) == expected
+
+
+def test_normalize_search_tokens() -> None:
+    assert normalize_search_tokens("eth, usdc/dai|op") == ["ETH", "USDC", "DAI", "OP"]
@@ -105,3 +105,46 @@ def test_analyze_strategies_excludes_wrappers_when_disabled() -> None:
     assert result is not None
     assert result["best"]["platform"] == "ProtocolB"
     assert result["matched_count"] == 1
+
+
+def test_get_opportunities_decorates_only_top_ranked(monkeypatch) -> None:
+    from src import tools
+    from src.pool_store import PoolStore
+
+    pools = [
+        {
+            "pool": f"pool-{index}",
+            "symbol": "ETH-USDC" if index % 2 else "ETH",
+            "project": "protocol-a",
+            "chain": "Ethereum",
+            "tvlUsd": 2_000_000 + index * 3_000_000,
+            "apy": (index * 7) % 23,
+            "stablecoin": index % 3 == 0,
+            "exposure": "single" if index % 2 == 0 else "multi",
+            "ilRisk": "no",
+        }
+        for index in range(40)
+    ]
+    store = PoolStore.from_pools(pools)
+    rows = list(range(len(store)))
+    monkeypatch.setattr(tools, "_ensure_token_cache", lambda token, limit, force_refresh=False: (store, rows))
+    monkeypatch.setattr(tools, "_get_protocol_url", lambda project: None)
+
+    decorated_ids = []
+    original_decorate = tools._decorate_pool
+
+    def tracking_decorate(pool, risk=None):
+        decorated_ids.append(pool["pool"])
+        return original_decorate(pool, risk=risk)
+
+    # Reference ordering: decorate everything, then sort by the same key.
+    everything = [original_decorate(pool) for pool in pools]
+    everything.sort(
+        key=lambda item: tools._opportunity_rank_key(item["apy"], item["tvl_usd"], tools.RISK_LEVELS[item["risk_level"]])
+    )
+
+    monkeypatch.setattr(tools, "_decorate_pool", tracking_decorate)
+    result = tools.get_opportunities("ETH", limit=5)
+
+    assert [item["pool_id"] for item in result] == [item["pool_id"] for item in everything[:5]]
+    assert len(decorated_ids) == 5
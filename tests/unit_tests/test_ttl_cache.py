@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from src.ttl_cache import TTLCache, cache_stats
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_after_ttl() -> None:
+    clock = FakeClock()
+    cache: TTLCache[str, int] = TTLCache("test.ttl", ttl=timedelta(seconds=10), clock=clock)
+
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now = 10.0
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expirations"] == 1
+
+
+def test_lru_eviction_by_entries_and_weight() -> None:
+    cache: TTLCache[str, list] = TTLCache("test.lru", max_entries=3, max_weight=10, weigher=len)
+
+    cache.set("a", [1] * 3)
+    cache.set("b", [1] * 3)
+    cache.set("c", [1] * 3)
+    assert cache.get("a") is not None  # "b" becomes least recently used
+
+    cache.set("d", [1] * 3)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    cache.set("e", [1] * 8)
+    assert len(cache) == 1
+    assert cache.get("e") is not None
+    stats = cache.stats()
+    assert stats["weight"] == 8
+    assert stats["evictions"] == 4
+
+
+def test_registry_reports_named_caches() -> None:
+    cache: TTLCache[str, int] = TTLCache("test.registry")
+    cache.set("a", 1)
+    names = [entry["name"] for entry in cache_stats()]
+    assert "test.registry" in names
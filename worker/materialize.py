@@ -0,0 +1,132 @@
+"""Warm every strategy cache key from one pool index generation.
+
+The key space is fixed: top tokens × risk levels (plus ``any``) × wrappers
+on/off. Opportunities are gathered and decorated once per token from the
+given generation; every risk/wrapper variant is then only a filter and
+ranking pass over that shared list, using the same graph nodes as a single
+agent run. All entries are written with one ``set_many`` pipeline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from agent.graph import (
+    analyze_opportunities,
+    attach_opportunities,
+    format_response,
+    gather_opportunities,
+    prepare_state,
+)
+from api.cache import StrategyCache, strategy_cache_key
+from src.coins import get_top_market_tokens
+from src.pool_index import POOL_INDEX, PoolGeneration, PoolIndex
+from src.tools import APIError
+from src.utils.constants import SUPPORTED_RISK_LEVELS
+
+logger = logging.getLogger(__name__)
+
+MATERIALIZE_TOKENS = int(os.getenv("STRATEGY_MATERIALIZE_TOKENS", "100"))
+# Совпадает со значением result_limit по умолчанию в StrategyRequest
+MATERIALIZE_RESULT_LIMIT = int(os.getenv("STRATEGY_MATERIALIZE_RESULT_LIMIT", "200"))
+MATERIALIZE_CHECK_SECONDS = int(os.getenv("STRATEGY_MATERIALIZE_CHECK_SECONDS", "60"))
+
+# (risk level в ключе, risk level в предпочтениях, include_wrappers)
+VARIANTS: Tuple[Tuple[str, Optional[str], bool], ...] = tuple(
+    (risk, None if risk == "any" else risk, wrappers)
+    for risk in ("any", *SUPPORTED_RISK_LEVELS)
+    for wrappers in (True, False)
+)
+
+
+def materialize_token(
+    token: str, generation: PoolGeneration, *, limit: int = MATERIALIZE_RESULT_LIMIT
+) -> Dict[str, Dict[str, Any]]:
+    """Return ``{cache key: agent output}`` for every variant of ``token``."""
+    try:
+        opportunities = gather_opportunities(token, limit=limit, store=generation.store)
+        error: Optional[str] = None
+    except APIError as exc:
+        opportunities, error = [], str(exc)
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    for risk_key, risk_level, include_wrappers in VARIANTS:
+        # Те же узлы, что и в графе, но выборка пулов общая для всех вариантов
+        prefs = {"risk_level": risk_level, "include_wrappers": include_wrappers}
+        state: Dict[str, Any] = {"input": token, "user_prefs": prefs}
+        state.update(prepare_state(state, None))  # type: ignore[arg-type]
+        if error:
+            state["error"] = error
+        else:
+            state.update(attach_opportunities(state, opportunities))  # type: ignore[arg-type]
+        state.update(analyze_opportunities(state, None))  # type: ignore[arg-type]
+        output = format_response(state, None)["output"]  # type: ignore[arg-type]
+        # Ошибки не кэшируем, как и воркер очереди обновлений
+        if output.get("status") != "error":
+            entries[strategy_cache_key(token, risk_key, include_wrappers)] = output
+    return entries
+
+
+def materialize_generation(
+    generation: PoolGeneration, tokens: Sequence[str]
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, float]]:
+    """Return entries for all ``tokens`` and, per key, the seconds its token took to compute."""
+    entries: Dict[str, Dict[str, Any]] = {}
+    compute_seconds: Dict[str, float] = {}
+    for token in tokens:
+        started = time.monotonic()
+        try:
+            token_entries = materialize_token(token, generation)
+        except Exception as exc:  # noqa: BLE001 - one token must not spoil the batch
+            logger.warning("Strategy materialization for %s failed: %s", token, exc)
+            continue
+        spent = time.monotonic() - started
+        entries.update(token_entries)
+        compute_seconds.update(dict.fromkeys(token_entries, spent))
+    return entries, compute_seconds
+
+
+async def materialize_strategies(
+    cache: StrategyCache,
+    *,
+    index: PoolIndex = POOL_INDEX,
+    token_limit: int = MATERIALIZE_TOKENS,
+) -> Dict[str, Any]:
+    """Compute and store every cache key for the current index generation."""
+    generation = await asyncio.to_thread(index.current_generation)
+    if generation is None:
+        return {"generation": 0, "tokens": 0, "keys": 0}
+
+    started = time.monotonic()
+    tokens: List[str] = [
+        token["symbol"].upper()
+        for token in await asyncio.to_thread(get_top_market_tokens, limit=token_limit)
+        if token.get("symbol")
+    ]
+    entries, compute_seconds = await asyncio.to_thread(materialize_generation, generation, tokens)
+    await cache.set_many(entries, compute_seconds=compute_seconds)
+    return {
+        "generation": generation.number,
+        "tokens": len(tokens),
+        "keys": len(entries),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+async def materialize_forever(cache: StrategyCache, *, index: PoolIndex = POOL_INDEX) -> None:
+    """Re-materialize whenever a new index generation appears."""
+    done = 0
+    while True:
+        try:
+            generation = await asyncio.to_thread(index.current_generation)
+            if generation is not None and generation.number != done:
+                stats = await materialize_strategies(cache, index=index)
+                done = stats["generation"]
+                logger.info("Strategy cache materialized", extra={"stats": stats})
+        except Exception as exc:  # noqa: BLE001 - log and continue loop
+            logger.exception("Strategy materialization failed: %s", exc)
+        await asyncio.sleep(MATERIALIZE_CHECK_SECONDS)
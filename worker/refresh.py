@@ -0,0 +1,211 @@
+"""Consumer of the strategy refresh queue filled by ``POST /strategies``.
+
+The queue already holds each cache key once, ordered by priority. A batch of
+up to ``REFRESH_BATCH_SIZE`` keys is claimed under a lease, agent runs go to
+a bounded thread pool, the results are written back with one ``set_many``
+pipeline and the leases are released. Keys of a worker that died mid-batch
+return to the queue when their lease expires.
+
+A cache key covers only token, risk level and wrappers, so the agent runs
+with exactly those preferences and the default result limit; the rest of
+the client's request (filters, ``debug``) never reaches the shared entry.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from api.cache import REFRESH_LEASE_SECONDS, StrategyCache
+from api.schemas import StrategyRequest
+
+logger = logging.getLogger(__name__)
+
+REFRESH_CONCURRENCY = int(os.getenv("STRATEGY_REFRESH_CONCURRENCY", "4"))
+REFRESH_BATCH_SIZE = int(os.getenv("STRATEGY_REFRESH_BATCH_SIZE", "32"))
+REFRESH_POP_TIMEOUT_SECONDS = int(os.getenv("STRATEGY_REFRESH_POP_TIMEOUT", "5"))
+REFRESH_JOB_TIMEOUT_SECONDS = float(os.getenv("STRATEGY_REFRESH_JOB_TIMEOUT_SECONDS", "120"))
+# Вес нового замера в скользящих средних задержек
+_EWMA_ALPHA = 0.2
+# Ответы с ошибкой не кладём в кэш, иначе клиент получит её на весь TTL
+_CACHEABLE_STATUSES = {"ok", "empty"}
+# Предпочтения, из которых строится ключ кэша; остальные в общий результат не попадают
+_KEY_PREFERENCES = ("risk_level", "include_wrappers")
+_DEFAULT_RESULT_LIMIT = StrategyRequest.model_fields["result_limit"].default
+
+AgentRunner = Callable[..., Dict[str, Any]]
+
+
+def _default_runner(token: str, user_preferences: Optional[Dict[str, Any]] = None, **options: Any) -> Dict[str, Any]:
+    from src.app import run_agent
+
+    return run_agent(token, user_preferences, **options)
+
+
+def _parse_iso(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _key_preferences(request: Dict[str, Any]) -> Dict[str, Any]:
+    preferences = request.get("preferences") or {}
+    return {name: preferences[name] for name in _KEY_PREFERENCES if preferences.get(name) is not None}
+
+
+class RefreshConsumer:
+    """Drains the refresh queue and keeps throughput and latency counters."""
+
+    def __init__(
+        self,
+        cache: StrategyCache,
+        *,
+        runner: AgentRunner = _default_runner,
+        concurrency: int = REFRESH_CONCURRENCY,
+        batch_size: int = REFRESH_BATCH_SIZE,
+        pop_timeout: int = REFRESH_POP_TIMEOUT_SECONDS,
+        job_timeout: float = REFRESH_JOB_TIMEOUT_SECONDS,
+        lease_seconds: int = REFRESH_LEASE_SECONDS,
+    ) -> None:
+        self._cache = cache
+        self._runner = runner
+        self._batch_size = max(1, batch_size)
+        self._pop_timeout = pop_timeout
+        self._job_timeout = job_timeout
+        self._lease_seconds = lease_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="strategy-refresh")
+        self._concurrency = max(1, concurrency)
+        self._slots = asyncio.Semaphore(self._concurrency)
+        self._started = time.monotonic()
+        self._processed = 0
+        self._failed = 0
+        self._invalid = 0
+        self._batches = 0
+        self._queue_depth = 0
+        self._job_seconds: Optional[float] = None
+        self._wait_seconds: Optional[float] = None
+        self._last_batch: Dict[str, Any] = {}
+
+    def _observe(self, name: str, value: float) -> None:
+        current = getattr(self, name)
+        setattr(self, name, value if current is None else current + _EWMA_ALPHA * (value - current))
+
+    def _release_slot(self, loop: asyncio.AbstractEventLoop) -> None:
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._slots.release)
+
+    async def _run_job(self, key: str, payload: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], float]:
+        """Run the agent for one key; return the cacheable result (or ``None``) and its run time."""
+        request = payload["request"]
+        enqueued_at = _parse_iso(payload.get("enqueued_at"))
+        if enqueued_at is not None:
+            self._observe("_wait_seconds", max(0.0, (datetime.now(timezone.utc) - enqueued_at).total_seconds()))
+
+        # Слот берём до отправки в пул: таймаут и время расчёта не включают ожидание свободного потока
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+
+        def run() -> Tuple[Any, float]:
+            begun = time.monotonic()
+            result = self._runner(
+                request["token"],
+                _key_preferences(request),
+                result_limit=_DEFAULT_RESULT_LIMIT,
+                force_refresh=bool(request.get("force_refresh")),
+                debug=False,
+            )
+            return result, time.monotonic() - begun
+
+        future = self._pool.submit(run)
+        # Отпускаем слот, только когда поток действительно освободился (в том числе после таймаута)
+        future.add_done_callback(lambda _: self._release_slot(loop))
+        try:
+            result, seconds = await asyncio.wait_for(asyncio.wrap_future(future), self._job_timeout)
+        except Exception as exc:  # noqa: BLE001 - one failed token must not drop the batch
+            logger.warning("Strategy refresh for %s failed: %r", key, exc)
+            self._failed += 1
+            return None, time.monotonic() - started
+        self._observe("_job_seconds", seconds)
+
+        if not isinstance(result, dict) or result.get("status") not in _CACHEABLE_STATUSES:
+            self._failed += 1
+            return None, seconds
+        self._processed += 1
+        return result, seconds
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Process one batch (waiting up to ``pop_timeout`` for it) and return the stats."""
+        batch = await self._cache.claim_refresh_requests(
+            self._batch_size, timeout=self._pop_timeout, lease_seconds=self._lease_seconds
+        )
+        if batch:
+            started = time.monotonic()
+            jobs: Dict[str, Dict[str, Any]] = {}
+            for payload in batch:
+                request = payload.get("request")
+                if isinstance(request, dict) and request.get("token"):
+                    jobs[payload["key"]] = payload
+                else:
+                    self._invalid += 1
+            keys = list(jobs)
+            results = await asyncio.gather(*(self._run_job(key, jobs[key]) for key in keys))
+            fresh = {key: result for key, (result, _) in zip(keys, results) if result is not None}
+            # Время расчёта уходит в кэш для XFetch-обновления у читателей
+            job_seconds = {key: spent for key, (result, spent) in zip(keys, results) if result is not None}
+            await self._cache.set_many(fresh, compute_seconds=job_seconds)
+            # Неудачные ключи тоже отпускаем: следующий запрос клиента поставит их снова
+            await self._cache.ack_refresh_requests([payload["key"] for payload in batch])
+            elapsed = time.monotonic() - started
+            self._batches += 1
+            self._last_batch = {
+                "claimed": len(batch),
+                "stored": len(fresh),
+                "seconds": round(elapsed, 3),
+            }
+
+        self._queue_depth = await self._cache.refresh_queue_length()
+        stats = self.stats()
+        await self._cache.set_refresh_stats(stats)
+        return stats
+
+    async def run_forever(self) -> None:
+        while True:
+            batches = self._batches
+            try:
+                stats = await self.run_once()
+                if stats["batches"] != batches:
+                    logger.info("Strategy refresh batch done", extra={"stats": stats})
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - keep consuming after Redis hiccups
+                logger.exception("Strategy refresh loop failed: %s", exc)
+                await asyncio.sleep(1)
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        return {
+            "queue_depth": self._queue_depth,
+            "concurrency": self._concurrency,
+            "processed": self._processed,
+            "failed": self._failed,
+            "invalid": self._invalid,
+            "batches": self._batches,
+            "throughput_per_minute": round(self._processed * 60.0 / uptime, 3),
+            "avg_job_seconds": round(self._job_seconds, 3) if self._job_seconds is not None else None,
+            "avg_queue_wait_seconds": round(self._wait_seconds, 3) if self._wait_seconds is not None else None,
+            "last_batch": self._last_batch,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
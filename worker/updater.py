@@ -1,20 +1,39 @@
-"""Background worker that periodically refreshes aggregated strategies."""
+"""Background worker: periodic strategy collection, strategy cache warm-up and the refresh queue consumer."""
 
 from __future__ import annotations
 
 import asyncio
 import logging
 import os
-from typing import Dict
+from typing import Any, Dict
 
+from api.cache import close_redis, get_cache
+from collector.jobs import COLLECTION_JOBS
 from collector.pipeline import collect_and_store
+from src.protocols import PROTOCOL_DIRECTORY
+from worker.materialize import materialize_forever
+from worker.refresh import RefreshConsumer
 
 REFRESH_INTERVAL_SECONDS = int(os.getenv("AGGREGATOR_UPDATE_INTERVAL", str(5 * 60)))  # Обновляем каждые 5 минут
 INITIAL_DELAY_SECONDS = int(os.getenv("AGGREGATOR_INITIAL_DELAY", "0"))
 
 
-async def _run_cycle() -> Dict[str, int]:
-    return await asyncio.to_thread(collect_and_store)
+async def _run_cycle() -> Dict[str, Any]:
+    # Та же блокировка, что у /refresh: если сбор уже идёт, этот цикл пропускаем
+    job_id, created = await asyncio.to_thread(COLLECTION_JOBS.submit)
+    if not created:
+        return {"job_id": job_id, "status": "attached"}
+    return await asyncio.to_thread(COLLECTION_JOBS.run, job_id, collect_and_store)
+
+
+async def _collect_forever() -> None:
+    while True:
+        try:
+            stats = await _run_cycle()
+            logging.info("Aggregator refresh completed", extra={"stats": stats})
+        except Exception as exc:  # noqa: BLE001 - log and continue loop
+            logging.exception("Aggregator refresh failed: %s", exc)
+        await asyncio.sleep(max(30, REFRESH_INTERVAL_SECONDS))
 
 
 async def main() -> None:
@@ -27,13 +46,15 @@ async def main() -> None:
         logging.info("Initial delay %s seconds before first collection", INITIAL_DELAY_SECONDS)
         await asyncio.sleep(INITIAL_DELAY_SECONDS)
 
-    while True:
+    # Ссылки и логотипы протоколов обновляются в фоне, поиски по ним не ходят в сеть
+    PROTOCOL_DIRECTORY.start()
+    async with get_cache() as cache:
+        consumer = RefreshConsumer(cache)
         try:
-            stats = await _run_cycle()
-            logging.info("Aggregator refresh completed", extra={"stats": stats})
-        except Exception as exc:  # noqa: BLE001 - log and continue loop
-            logging.exception("Aggregator refresh failed: %s", exc)
-        await asyncio.sleep(max(30, REFRESH_INTERVAL_SECONDS))
+            await asyncio.gather(_collect_forever(), materialize_forever(cache), consumer.run_forever())
+        finally:
+            consumer.close()
+            await close_redis()
 
 
 if __name__ == "__main__":